@@ -0,0 +1,69 @@
+"""Compare copying synthetic trees -- many small files and a few large ones --
+with :func:`copy_file` against :func:`copy_tree` with one worker and with
+several, and with different chunk sizes, reporting files and megabytes
+copied per second.
+
+Usage: benchmark-copy-tree.py [backend]
+"""
+import os, sys
+import shutil
+import tempfile
+import time
+
+import winshell
+
+BACKEND = sys.argv[1] if len(sys.argv) > 1 else None
+
+TREES = [
+    ("many small", 2000, 4 * 1024),
+    ("few large", 8, 64 * 1024 * 1024),
+]
+
+def make_tree(dirpath, n_files, file_size):
+    block = os.urandom(min(file_size, 1024 * 1024))
+    for i in range(n_files):
+        folder = os.path.join(dirpath, "folder%02d" % (i % 20))
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(os.path.join(folder, "file%05d.dat" % i), "wb") as f:
+            for _ in range(max(1, file_size // len(block))):
+                f.write(block)
+
+def with_copy_file(source, target):
+    return winshell.copy_file(source, target, allow_undo=False, no_confirm=True, silent=True, backend=BACKEND)
+
+def with_copy_tree(workers, chunk_size=winshell.COPY_CHUNK_SIZE):
+    def function(source, target):
+        return winshell.copy_tree(source, target, workers=workers, chunk_size=chunk_size)
+    function.__name__ = "copy_tree %s workers, %dKB" % (workers or "default", chunk_size // 1024)
+    return function
+
+def main():
+    functions = [
+        with_copy_file,
+        with_copy_tree(1),
+        with_copy_tree(None),
+        with_copy_tree(None, 64 * 1024),
+        with_copy_tree(None, 64 * 1024 * 1024),
+    ]
+    for name, n_files, file_size in TREES:
+        source = tempfile.mkdtemp()
+        try:
+            make_tree(source, n_files, file_size)
+            print("%s: %d files of %dKB" % (name, n_files, file_size // 1024))
+            for function in functions:
+                target = tempfile.mkdtemp()
+                try:
+                    t0 = time.time()
+                    function(source, os.path.join(target, "tree"))
+                    elapsed = time.time() - t0
+                    print("  %-32s %10.1f files/sec %10.1f MB/sec" % (
+                        function.__name__, n_files / elapsed, n_files * file_size / elapsed / 1024 / 1024
+                    ))
+                finally:
+                    shutil.rmtree(target)
+        finally:
+            shutil.rmtree(source)
+
+if __name__ == '__main__':
+    main()
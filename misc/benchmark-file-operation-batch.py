@@ -0,0 +1,51 @@
+"""Compare moving many files one at a time with :func:`move_file` against
+queueing the same moves on a :class:`FileOperationBatch`, counting the shell
+operations made and the files moved per second.
+
+Usage: benchmark-file-operation-batch.py [n_files]
+"""
+import os, sys
+import shutil
+import tempfile
+import time
+
+import winshell
+
+N_FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+def make_files(dirpath, n_files):
+    filepaths = []
+    for i in range(n_files):
+        filepath = os.path.join(dirpath, "file%05d.txt" % i)
+        with open(filepath, "wb") as f:
+            f.write(b"x")
+        filepaths.append(filepath)
+    return filepaths
+
+def one_at_a_time(filepaths, target_dirpath):
+    for filepath in filepaths:
+        winshell.move_file(filepath, target_dirpath, allow_undo=False, no_confirm=True, silent=True)
+    return len(filepaths)
+
+def batched(filepaths, target_dirpath):
+    with winshell.FileOperationBatch() as batch:
+        for filepath in filepaths:
+            batch.move_file(filepath, target_dirpath, allow_undo=False, no_confirm=True, silent=True)
+    return batch.n_calls
+
+def main():
+    for function in (one_at_a_time, batched):
+        source_dirpath = tempfile.mkdtemp()
+        target_dirpath = tempfile.mkdtemp()
+        try:
+            filepaths = make_files(source_dirpath, N_FILES)
+            t0 = time.time()
+            n_calls = function(filepaths, target_dirpath)
+            elapsed = time.time() - t0
+            print("%-14s %6d calls %10.1f files/sec" % (function.__name__, n_calls, N_FILES / elapsed))
+        finally:
+            shutil.rmtree(source_dirpath)
+            shutil.rmtree(target_dirpath)
+
+if __name__ == '__main__':
+    main()
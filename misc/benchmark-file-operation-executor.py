@@ -0,0 +1,73 @@
+"""Compare copying files one after another with :func:`copy_file` against
+running the same copies side by side on a :class:`FileOperationExecutor`,
+and through :data:`aio`, reporting the megabytes copied per second.
+
+Usage: benchmark-file-operation-executor.py [n_files [mb_per_file [backend]]]
+"""
+import os, sys
+import asyncio
+import shutil
+import tempfile
+import time
+
+import winshell
+
+N_FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+MB_PER_FILE = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+BACKEND = sys.argv[3] if len(sys.argv) > 3 else None
+
+def make_files(dirpath, n_files, mb_per_file):
+    filepaths = []
+    block = os.urandom(1024 * 1024)
+    for i in range(n_files):
+        filepath = os.path.join(dirpath, "file%03d.dat" % i)
+        with open(filepath, "wb") as f:
+            for _ in range(mb_per_file):
+                f.write(block)
+        filepaths.append(filepath)
+    return filepaths
+
+def sequential(filepaths, target_dirpath):
+    for filepath in filepaths:
+        winshell.copy_file(filepath, target_dirpath, allow_undo=False, no_confirm=True, silent=True, backend=BACKEND)
+
+def executor(filepaths, target_dirpath):
+    with winshell.FileOperationExecutor(backend=BACKEND) as executor:
+        results = [
+            executor.copy_file(filepath, target_dirpath, allow_undo=False, no_confirm=True, silent=True)
+            for filepath in filepaths
+        ]
+        for future in results:
+            future.result()
+
+def aio(filepaths, target_dirpath):
+    winshell.aio.executor = winshell.FileOperationExecutor(backend=BACKEND)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(asyncio.gather(*[
+            winshell.aio.copy_file(filepath, target_dirpath, allow_undo=False, no_confirm=True, silent=True)
+            for filepath in filepaths
+        ]))
+    finally:
+        winshell.aio.executor.shutdown()
+        loop.close()
+
+def main():
+    source_dirpath = tempfile.mkdtemp()
+    try:
+        filepaths = make_files(source_dirpath, N_FILES, MB_PER_FILE)
+        for function in (sequential, executor, aio):
+            target_dirpath = tempfile.mkdtemp()
+            try:
+                t0 = time.time()
+                function(filepaths, target_dirpath)
+                elapsed = time.time() - t0
+                print("%-10s %10.1f MB/sec" % (function.__name__, N_FILES * MB_PER_FILE / elapsed))
+            finally:
+                shutil.rmtree(target_dirpath)
+    finally:
+        shutil.rmtree(source_dirpath)
+
+if __name__ == '__main__':
+    main()
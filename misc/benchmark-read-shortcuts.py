@@ -0,0 +1,61 @@
+"""Compare reading a folder of shortcuts one at a time, each through its
+own :class:`Shortcut`, with :func:`read_shortcuts`, which reads every
+file into the same buffer and decodes only the fields asked for. Reports
+throughput and, from :mod:`tracemalloc`, the most memory allocated at
+any one time.
+
+Usage: benchmark-read-shortcuts.py [n_shortcuts]
+"""
+import os, sys
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import winshell
+
+N_SHORTCUTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+FIELDS = ("path", "arguments", "working_directory")
+
+def make_shortcuts(dirpath, n_shortcuts):
+    filepaths = []
+    for i in range(n_shortcuts):
+        link = winshell.ShellLink()
+        link.path = "c:\\Program Files\\App%d\\app%d.exe" % (i, i)
+        link.arguments = "--instance %d" % i
+        link.working_directory = "c:\\Program Files\\App%d" % i
+        link.description = "Application %d" % i
+        filepath = os.path.join(dirpath, "app%05d.lnk" % i)
+        link.save(filepath)
+        filepaths.append(filepath)
+    return filepaths
+
+def per_file(filepaths):
+    for filepath in filepaths:
+        shortcut = winshell.Shortcut(filepath, backend="lnk")
+        [getattr(shortcut, field) for field in FIELDS]
+
+def batched(filepaths):
+    for filepath, values in winshell.read_shortcuts(filepaths, FIELDS):
+        pass
+
+def main():
+    dirpath = tempfile.mkdtemp()
+    try:
+        filepaths = make_shortcuts(dirpath, N_SHORTCUTS)
+        for function in (per_file, batched):
+            t0 = time.time()
+            function(filepaths)
+            elapsed = time.time() - t0
+            tracemalloc.start()
+            function(filepaths)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print("%-10s %10.1f shortcuts/sec %10d bytes allocated at peak" % (
+                function.__name__, N_SHORTCUTS / elapsed, peak
+            ))
+    finally:
+        shutil.rmtree(dirpath)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Compare walking a tree of shortcuts and reading each one in turn, as the
+walk_program_tree cookbook example used to, with :func:`scan_shortcuts`
+with one worker and with its default pool. A synthetic tree of 50,000
+shortcuts, spread over nested folders as a large Start Menu would be,
+is built in a temporary directory.
+
+Usage: benchmark-scan-shortcuts.py [n_shortcuts]
+"""
+import os, sys
+import shutil
+import tempfile
+import time
+
+import winshell
+
+N_SHORTCUTS = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+def build_tree(root, n_shortcuts):
+    for i in range(n_shortcuts):
+        dirpath = os.path.join(root, "Vendor%03d" % (i % 500), "Product%02d" % (i % 7))
+        if not os.path.isdir(dirpath):
+            os.makedirs(dirpath)
+        link = winshell.ShellLink()
+        link.path = "c:\\Program Files\\Vendor%03d\\app%d.exe" % (i % 500, i)
+        link.arguments = "--instance %d" % i
+        link.working_directory = "c:\\Program Files\\Vendor%03d" % (i % 500)
+        link.save(os.path.join(dirpath, "app%05d.lnk" % i))
+
+def one_at_a_time(root):
+    n_shortcuts = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(".lnk"):
+                shortcut = winshell.Shortcut(os.path.join(dirpath, filename), backend="lnk")
+                shortcut.path, shortcut.arguments, shortcut.working_directory, shortcut.icon_location
+                n_shortcuts += 1
+    return n_shortcuts
+
+def scanned(workers):
+    def function(root):
+        return sum(1 for record in winshell.scan_shortcuts(root, workers=workers))
+    function.__name__ = "scan_shortcuts, %s workers" % (workers or "default")
+    return function
+
+def main():
+    root = tempfile.mkdtemp()
+    try:
+        build_tree(root, N_SHORTCUTS)
+        for function in (one_at_a_time, scanned(1), scanned(None)):
+            t0 = time.time()
+            n_shortcuts = function(root)
+            elapsed = time.time() - t0
+            print("%-30s %6d shortcuts %10.1f shortcuts/sec" % (function.__name__, n_shortcuts, n_shortcuts / elapsed))
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Compare reading shortcuts through the shell's COM ShellLink object with
+reading them directly through :class:`ShellLink`, the "lnk" backend of
+:class:`Shortcut`. A folder of synthetic .lnk files is written and every
+attribute of each is read back, as :meth:`Shortcut.dumped` would.
+
+The COM backend is only available on Windows; elsewhere just the "lnk"
+backend is timed.
+
+Usage: benchmark-shortcut-backends.py [n_shortcuts]
+"""
+import os, sys
+import shutil
+import tempfile
+import time
+
+import winshell
+
+N_SHORTCUTS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+def make_shortcuts(dirpath, n_shortcuts):
+    filepaths = []
+    for i in range(n_shortcuts):
+        link = winshell.ShellLink()
+        link.path = "c:\\Program Files\\App%d\\app%d.exe" % (i, i)
+        link.arguments = "--instance %d" % i
+        link.working_directory = "c:\\Program Files\\App%d" % i
+        link.description = "Application %d" % i
+        filepath = os.path.join(dirpath, "app%05d.lnk" % i)
+        link.save(filepath)
+        filepaths.append(filepath)
+    return filepaths
+
+def read_all(filepaths, backend):
+    for filepath in filepaths:
+        shortcut = winshell.Shortcut(filepath, backend=backend)
+        for attribute in winshell.SHORTCUT_ATTRIBUTES:
+            getattr(shortcut, attribute)
+
+def main():
+    backends = ["com", "lnk"] if sys.platform == "win32" else ["lnk"]
+    dirpath = tempfile.mkdtemp()
+    try:
+        filepaths = make_shortcuts(dirpath, N_SHORTCUTS)
+        for backend in backends:
+            t0 = time.time()
+            read_all(filepaths, backend)
+            elapsed = time.time() - t0
+            print("%-4s %10.1f shortcuts/sec" % (backend, N_SHORTCUTS / elapsed))
+    finally:
+        shutil.rmtree(dirpath)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Time :func:`sync_shortcuts` creating a folder of shortcuts from a manifest
+and then running again with nothing to change, counting the files written
+and checking that the second run leaves every file untouched.
+
+Usage: benchmark-sync-shortcuts.py [n_shortcuts]
+"""
+import os, sys
+import shutil
+import tempfile
+import time
+
+import winshell
+
+N_SHORTCUTS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+def make_manifest(n_shortcuts):
+    return dict(
+        ("App%04d.lnk" % i, {
+            "path" : "c:\\Program Files\\App%d\\app%d.exe" % (i, i),
+            "arguments" : "--instance %d" % i,
+            "working_directory" : "c:\\Program Files\\App%d" % i,
+        })
+        for i in range(n_shortcuts)
+    )
+
+def file_states(dirpath):
+    return dict(
+        (name, (stat.st_ino, stat.st_mtime, stat.st_size))
+        for name, stat in ((name, os.stat(os.path.join(dirpath, name))) for name in os.listdir(dirpath))
+    )
+
+def main():
+    manifest = make_manifest(N_SHORTCUTS)
+    dirpath = tempfile.mkdtemp()
+    try:
+        for run in ("first run", "no-op run"):
+            before = file_states(dirpath)
+            t0 = time.time()
+            report = winshell.sync_shortcuts(manifest, dirpath)
+            elapsed = time.time() - t0
+            after = file_states(dirpath)
+            n_touched = sum(1 for name in after if before.get(name) != after[name])
+            print("%-10s %8.3fs %5d written %5d unchanged %5d files touched" % (
+                run, elapsed, len(report.created) + len(report.updated), len(report.unchanged), n_touched
+            ))
+    finally:
+        shutil.rmtree(dirpath)
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,20 @@
 # -*- coding: UTF8 -*-
 import os, sys
+import binascii
 try:
     import ConfigParser
 except ImportError:
     import configparser as ConfigParser
+import csv
+import datetime
 import filecmp
+import hashlib
+import io
+import json
+import mmap
 import operator
 import shutil
+import struct
 import tempfile
 import time
 import unittest
@@ -16,13 +24,22 @@ try:
 except ImportError:
     from io import StringIO
 
-import pythoncom
-from win32com.shell import shell, shellcon
-
 import winshell
+try:
+    import pythoncom
+    import win32con
+    from win32com.shell import shell, shellcon
+except ImportError:
+    pythoncom = shell = None
+    win32con, shellcon = winshell.win32con, winshell.shellcon
 
 import test_base
-if sys.version_info >= (2, 5):
+#
+# Tests which go through the shell need pywin32 and so, in practice, Windows
+#
+needs_shell = unittest.skipIf(shell is None, "needs pywin32")
+
+if sys.version_info >= (2, 5) and shell is not None:
     from test_winshell_25plus import *
 
 try:
@@ -47,6 +64,7 @@ def get_config(section, item, function=ConfigParser.ConfigParser.get):
 go_slow = bool(int(get_config("general", "go_slow")))
 
 
+@needs_shell
 class TestSpecialFolders(test_base.TestCase):
     #
     # It's genuinely difficult to test the special-folders functionality
@@ -103,6 +121,7 @@ class TestSpecialFolders(test_base.TestCase):
         self.assert_folder_exists("sendto", winshell.sendto())
 
 
+@needs_shell
 class TestFolderSupport(test_base.TestCase):
 
     def test_get_path(self):
@@ -140,6 +159,7 @@ class TestFolderSupport(test_base.TestCase):
         self.assertRaises(winshell.x_winshell, _get_nonexistent_folder)
 
 
+@needs_shell
 class TestFileOperations(test_base.TestCase):
     #
     # It's also not easy to detect the more user-interfacey aspects of the
@@ -200,6 +220,13 @@ class TestFileOperations(test_base.TestCase):
         self.assertTrue(os.path.exists(to_filepath))
         self.assertTrue(self.files_are_equal(from_filepath, to_filepath))
 
+    def test_copy_result(self):
+        from_filepath, to_filepath = self.tempfiles(create_from=True, create_to=False)
+        progress = []
+        result = winshell.copy_file(from_filepath, to_filepath, progress=lambda *args: progress.append(args[:2]))
+        self.assertEqual((result.n_files, result.n_bytes, result.n_renamed), (1, 32, 0))
+        self.assertEqual(progress, [(from_filepath, to_filepath)])
+
     def test_copy_with_rename(self):
         from_filepath, to_filepath = self.tempfiles(create_from=True, create_to=True)
         winshell.copy_file(from_filepath, to_filepath, rename_on_collision=True)
@@ -316,6 +343,483 @@ class TestFileOperations(test_base.TestCase):
         self.assertFalse(os.path.exists(from_filepath))
 
 
+class TestPythonFileOperations(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.from_path = os.path.join(self.temppath, "from")
+        self.to_path = os.path.join(self.temppath, "to")
+        os.makedirs(os.path.join(self.from_path, "folder", "sub"))
+        os.mkdir(self.to_path)
+        for name, data in (("a.txt", "a"), ("b.txt", "b"), ("c.dat", "c"), (os.path.join("folder", "sub", "d.txt"), "d")):
+            self.write(os.path.join(self.from_path, name), data)
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Support functions
+    #
+    def write(self, filepath, data):
+        f = open(filepath, "wb")
+        try:
+            f.write(b(data))
+        finally:
+            f.close()
+
+    def read(self, filepath):
+        f = open(filepath, "rb")
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def source(self, *names):
+        return os.path.join(self.from_path, *names)
+
+    def target(self, *names):
+        return os.path.join(self.to_path, *names)
+
+    def copy(self, source_path, target_path, **kwargs):
+        return winshell.copy_file(source_path, target_path, backend="python", **kwargs)
+
+    def move(self, source_path, target_path, **kwargs):
+        return winshell.move_file(source_path, target_path, backend="python", **kwargs)
+
+    #
+    # Tests
+    #
+    def test_copy(self):
+        self.assertEqual(self.copy(self.source("a.txt"), self.target("x.txt")), {})
+        self.assertEqual(self.read(self.target("x.txt")), b("a"))
+        self.copy(self.source("a.txt"), self.to_path)
+        self.assertEqual(self.read(self.target("a.txt")), b("a"))
+        self.assertTrue(os.path.exists(self.source("a.txt")))
+
+    def test_copy_renamed_on_collision(self):
+        self.copy(self.source("a.txt"), self.to_path)
+        self.assertEqual(self.copy(self.source("a.txt"), self.to_path), {self.target("a.txt"): self.target("a - Copy.txt")})
+        self.assertEqual(self.copy(self.source("a.txt"), self.to_path), {self.target("a.txt"): self.target("a - Copy (2).txt")})
+
+    def test_move_renamed_on_collision(self):
+        self.write(self.target("a.txt"), "existing")
+        self.assertEqual(self.move(self.source("a.txt"), self.to_path), {self.target("a.txt"): self.target("a (2).txt")})
+        self.assertEqual(self.read(self.target("a (2).txt")), b("a"))
+        self.assertFalse(os.path.exists(self.source("a.txt")))
+
+    def test_collision(self):
+        self.write(self.target("a.txt"), "existing")
+        self.assertRaises(winshell.x_winshell, self.copy, self.source("a.txt"), self.to_path, rename_on_collision=False)
+        self.assertEqual(self.read(self.target("a.txt")), b("existing"))
+        self.copy(self.source("a.txt"), self.to_path, rename_on_collision=False, no_confirm=True)
+        self.assertEqual(self.read(self.target("a.txt")), b("a"))
+
+    def test_wildcard(self):
+        self.copy(self.source("*.txt"), self.to_path)
+        self.assertEqual(sorted(os.listdir(self.to_path)), ["a.txt", "b.txt"])
+        self.copy(self.source("*.*"), self.target("all"))
+        self.assertEqual(sorted(os.listdir(self.target("all"))), ["a.txt", "b.txt", "c.dat", "folder"])
+
+    def test_folders(self):
+        self.copy(self.source("folder"), self.target("copied"))
+        self.assertEqual(self.read(self.target("copied", "sub", "d.txt")), b("d"))
+        self.copy(self.source("folder"), self.to_path)
+        self.assertEqual(self.read(self.target("folder", "sub", "d.txt")), b("d"))
+        self.move(self.source("folder"), self.target("moved"))
+        self.assertEqual(self.read(self.target("moved", "sub", "d.txt")), b("d"))
+        self.assertFalse(os.path.exists(self.source("folder")))
+
+    def test_multiple_targets(self):
+        self.move([self.source("a.txt"), self.source("b.txt")], [self.target("1", "x.txt"), self.target("y.txt")])
+        self.assertEqual(self.read(self.target("1", "x.txt")), b("a"))
+        self.assertEqual(self.read(self.target("y.txt")), b("b"))
+
+    def test_rename(self):
+        winshell.rename_file(self.source("a.txt"), self.source("z.txt"), backend="python")
+        self.assertEqual(self.read(self.source("z.txt")), b("a"))
+        self.assertRaises(winshell.x_winshell, winshell.rename_file, self.source("b.txt"), self.target("b.txt"), backend="python")
+
+    def test_delete(self):
+        self.assertRaises(winshell.x_winshell, winshell.delete_file, self.source("a.txt"), backend="python")
+        winshell.delete_file([self.source("a.txt"), self.source("folder")], allow_undo=False, backend="python")
+        self.assertEqual(sorted(os.listdir(self.from_path)), ["b.txt", "c.dat"])
+        self.assertRaises(winshell.x_winshell, winshell.delete_file, self.source("a.txt"), allow_undo=False, backend="python")
+
+    def test_default_backend(self):
+        original_backend = winshell.file_operation_backend
+        winshell.file_operation_backend = "python"
+        try:
+            winshell.copy_file(self.source("a.txt"), self.to_path)
+        finally:
+            winshell.file_operation_backend = original_backend
+        self.assertTrue(os.path.exists(self.target("a.txt")))
+        self.assertRaises(winshell.x_winshell, winshell.copy_file, self.source("a.txt"), self.to_path, backend="nonesuch")
+
+    def test_result(self):
+        result = self.copy(self.source("*.*"), self.target("all"))
+        self.assertTrue(isinstance(result, winshell.FileOperationResult))
+        self.assertEqual((result.n_files, result.n_bytes, result.n_renamed, result.n_aborted), (4, 4, 0, 0))
+        self.assertTrue(result.elapsed >= 0)
+        self.assertTrue(result.throughput >= 0)
+        result = self.copy([self.source("a.txt"), self.source("b.txt")], self.target("all"))
+        self.assertEqual((result.n_files, result.n_renamed), (2, 2))
+
+    def test_progress(self):
+        progress = []
+        def record(source, target, result):
+            progress.append((source, target, result.n_files))
+        self.copy([self.source("a.txt"), self.source("folder")], self.to_path, progress=record)
+        winshell.delete_file(self.target("a.txt"), allow_undo=False, backend="python", progress=record)
+        self.assertEqual(progress, [
+            (self.source("a.txt"), self.target("a.txt"), 1),
+            (self.source("folder"), self.target("folder"), 2),
+            (self.target("a.txt"), None, 1),
+        ])
+
+    def test_folder_counted(self):
+        #
+        # A folder renamed in one piece counts the same as one copied or deleted
+        #
+        expected = winshell._tree_totals(self.source("folder"))
+        result = self.move(self.source("folder"), self.target("moved"))
+        self.assertEqual((result.n_files, result.n_bytes), expected)
+        result = self.copy(self.target("moved"), self.target("copied"))
+        self.assertEqual((result.n_files, result.n_bytes), expected)
+        result = winshell.delete_file(self.target("copied"), allow_undo=False, backend="python")
+        self.assertEqual((result.n_files, result.n_bytes), expected)
+
+    def test_tree_totals(self):
+        self.assertEqual(winshell._tree_totals(self.from_path), (4, 4))
+        self.assertEqual(winshell._tree_totals(self.source("a.txt")), (1, 1))
+
+    def test_aborted(self):
+        sources = [self.source("a.txt"), self.source("missing.txt"), self.source("b.txt")]
+        try:
+            self.copy(sources, [self.target("a.txt"), self.target("m.txt"), self.target("b.txt")])
+        except winshell.x_winshell:
+            result = sys.exc_info()[1].result
+        else:
+            self.fail("No exception raised")
+        self.assertEqual((result.n_files, result.n_aborted), (1, 2))
+
+    def test_copy_tree(self):
+        result = winshell.copy_tree(self.from_path, self.target("tree"), workers=2)
+        self.assertEqual((result.n_files, result.n_bytes, result.n_renamed), (4, 4, 0))
+        self.assertEqual(self.read(self.target("tree", "folder", "sub", "d.txt")), b("d"))
+        self.assertEqual(sorted(os.listdir(self.target("tree"))), ["a.txt", "b.txt", "c.dat", "folder"])
+
+    def test_copy_tree_collision(self):
+        winshell.copy_tree(self.from_path, self.to_path)
+        result = winshell.copy_tree(self.from_path, self.to_path)
+        self.assertEqual(dict(result), {self.target("from"): self.target("from - Copy")})
+        self.assertEqual(self.read(self.target("from - Copy", "a.txt")), b("a"))
+        self.write(self.source("a.txt"), "changed")
+        winshell.copy_tree(self.from_path, self.to_path, rename_on_collision=False, no_confirm=True)
+        self.assertEqual(self.read(self.target("from", "a.txt")), b("changed"))
+        self.assertRaises(winshell.x_winshell, winshell.copy_tree, self.from_path, self.to_path, rename_on_collision=False)
+
+    def test_copy_tree_largest_first(self):
+        self.write(self.source("folder", "big.txt"), "x" * 100)
+        self.write(self.source("bigger.txt"), "x" * 1000)
+        copied = []
+        winshell.copy_tree(self.from_path, self.target("tree"), workers=1, chunk_size=7, progress=lambda source, target, result: copied.append(target))
+        self.assertEqual(copied[:2], [self.target("tree", "bigger.txt"), self.target("tree", "folder", "big.txt")])
+        self.assertEqual(self.read(self.target("tree", "bigger.txt")), b("x" * 1000))
+
+    def test_copy_tree_file_to_new_folder(self):
+        result = winshell.copy_tree(self.source("a.txt"), self.target("new", "b.txt"))
+        self.assertEqual((result.n_files, result.n_bytes), (1, 1))
+        self.assertEqual(self.read(self.target("new", "b.txt")), b("a"))
+
+    @unittest.skipUnless(hasattr(os, "symlink") and sys.platform != "win32", "needs unprivileged symlinks")
+    def test_copy_tree_linked_folders(self):
+        elsewhere = os.path.join(self.temppath, "elsewhere")
+        os.mkdir(elsewhere)
+        self.write(os.path.join(elsewhere, "e.txt"), "e")
+        os.symlink(elsewhere, self.source("linked"))
+        os.symlink(self.from_path, self.source("folder", "loop"))
+        result = winshell.copy_tree(self.from_path, self.target("tree"))
+        self.assertEqual(result.n_files, 5)
+        self.assertFalse(os.path.islink(self.target("tree", "linked")))
+        self.assertEqual(self.read(self.target("tree", "linked", "e.txt")), b("e"))
+        self.assertTrue(os.path.islink(self.target("tree", "folder", "loop")))
+
+    def test_copy_tree_timestamps(self):
+        timestamp = time.time() - 86400
+        os.utime(self.source("a.txt"), (timestamp, timestamp))
+        os.utime(self.source("folder"), (timestamp, timestamp))
+        winshell.copy_tree(self.from_path, self.target("tree"))
+        self.assertAlmostEqual(os.path.getmtime(self.target("tree", "a.txt")), timestamp, places=2)
+        self.assertAlmostEqual(os.path.getmtime(self.target("tree", "folder")), timestamp, places=2)
+
+
+class TestFileOperationBatch(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.calls = []
+        self.original_file_operation = winshell._file_operation
+        winshell._file_operation = self.file_operation
+
+    def tearDown(self):
+        winshell._file_operation = self.original_file_operation
+        shutil.rmtree(self.temppath)
+
+    #
+    # Support functions
+    #
+    def file_operation(self, operation, source_path, target_path, *args):
+        self.calls.append((operation, source_path, target_path))
+        return {}
+
+    def counted_file_operation(self, operation, source_path, target_path, *args):
+        result = winshell.FileOperationResult(operation)
+        if target_path is not None:
+            result[target_path] = target_path + " (2)"
+        result._done(source_path, target_path, 1, 10)
+        return result
+
+    def path(self, *names):
+        return os.path.join(self.temppath, *names)
+
+    #
+    # Tests
+    #
+    def test_runs_coalesced(self):
+        with winshell.FileOperationBatch() as batch:
+            batch.copy_file(self.path("a"), self.path("b"))
+            batch.copy_file([self.path("c"), self.path("d")], [self.path("e"), self.path("f")])
+            batch.delete_file(self.path("a"))
+            batch.delete_file(self.path("c"), allow_undo=False)
+            batch.rename_file(self.path("b"), self.path("g"))
+            batch.move_file(self.path("e"), self.path("h"))
+            self.assertEqual(self.calls, [])
+        self.assertEqual(batch.n_calls, 5)
+        self.assertEqual(self.calls, [
+            (shellcon.FO_COPY, [self.path("a"), self.path("c"), self.path("d")], [self.path("b"), self.path("e"), self.path("f")]),
+            (shellcon.FO_DELETE, self.path("a"), None),
+            (shellcon.FO_DELETE, self.path("c"), None),
+            (shellcon.FO_RENAME, self.path("b"), self.path("g")),
+            (shellcon.FO_MOVE, self.path("e"), self.path("h")),
+        ])
+
+    def test_renames_alone(self):
+        os.mkdir(self.path("folder"))
+        with winshell.FileOperationBatch() as batch:
+            batch.rename_file(self.path("a"), self.path("b"))
+            batch.rename_file(self.path("c"), self.path("folder"))
+        self.assertEqual(self.calls, [
+            (shellcon.FO_RENAME, self.path("a"), self.path("b")),
+            (shellcon.FO_RENAME, self.path("c"), self.path("folder")),
+        ])
+
+    def test_target_folder(self):
+        with winshell.FileOperationBatch() as batch:
+            batch.copy_file([self.path("a"), self.path("b")], self.temppath)
+        self.assertEqual(self.calls, [
+            (shellcon.FO_COPY, [self.path("a"), self.path("b")], [self.path("a"), self.path("b")]),
+        ])
+
+    def test_wildcards_alone(self):
+        with winshell.FileOperationBatch() as batch:
+            batch.copy_file(self.path("a"), self.path("x"))
+            batch.copy_file(self.path("*.txt"), self.path("y"))
+            batch.copy_file(self.path("b"), self.path("z"))
+        self.assertEqual([source for _, source, _ in self.calls], [self.path("a"), self.path("*.txt"), self.path("b")])
+
+    def test_flushed_by_size(self):
+        batch = winshell.FileOperationBatch(max_files=3, max_chars=len(self.path("a")) * 2 + 2)
+        for name in "abcde":
+            batch.delete_file(self.path(name))
+        self.assertEqual(self.calls, [
+            (shellcon.FO_DELETE, [self.path("a"), self.path("b")], None),
+            (shellcon.FO_DELETE, self.path("c"), None),
+        ])
+        batch.flush()
+        self.assertEqual(batch.n_calls, 3)
+
+    def test_flushed_by_time(self):
+        batch = winshell.FileOperationBatch(max_delay=0.1)
+        batch.delete_file(self.path("a"))
+        time.sleep(0.2)
+        batch.delete_file(self.path("b"))
+        self.assertEqual(self.calls, [(shellcon.FO_DELETE, [self.path("a"), self.path("b")], None)])
+
+    def test_results_gathered(self):
+        winshell._file_operation = self.counted_file_operation
+        with winshell.FileOperationBatch() as batch:
+            batch.copy_file(self.path("a"), self.path("b"))
+            batch.delete_file(self.path("a"))
+        self.assertEqual((batch.mapping.n_files, batch.mapping.n_bytes), (2, 20))
+        self.assertEqual(batch.mapping, {self.path("b"): self.path("b (2)")})
+
+    def test_failed_run_kept(self):
+        def file_operation(operation, source_path, target_path, *args):
+            if operation == shellcon.FO_DELETE:
+                raise winshell.x_winshell("failed")
+            return self.counted_file_operation(operation, source_path, target_path)
+        winshell._file_operation = file_operation
+        batch = winshell.FileOperationBatch()
+        batch.copy_file(self.path("a"), self.path("b"))
+        batch.delete_file(self.path("a"))
+        batch.move_file(self.path("b"), self.path("c"))
+        self.assertRaises(winshell.x_winshell, batch.flush)
+        self.assertEqual(batch.mapping, {self.path("b"): self.path("b (2)")})
+        self.assertEqual(batch.n_calls, 1)
+        winshell._file_operation = self.file_operation
+        batch.flush()
+        self.assertEqual(self.calls, [
+            (shellcon.FO_DELETE, self.path("a"), None),
+            (shellcon.FO_MOVE, self.path("b"), self.path("c")),
+        ])
+
+    def test_discarded_on_exception(self):
+        try:
+            with winshell.FileOperationBatch() as batch:
+                batch.delete_file(self.path("a"))
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(self.calls, [])
+
+
+class TestFileOperationExecutor(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.running = 0
+        self.most_running = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Support functions
+    #
+    def path(self, *names):
+        return os.path.join(self.temppath, *names)
+
+    def make_file(self, name, content=b("content")):
+        f = open(self.path(name), "wb")
+        try:
+            f.write(content)
+        finally:
+            f.close()
+        return self.path(name)
+
+    def slow_file_operation(self, *args):
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        time.sleep(0.05)
+        self.running -= 1
+        return {}
+
+    #
+    # Tests
+    #
+    def test_copy_file(self):
+        sources = [self.make_file("%d.txt" % i) for i in range(5)]
+        with winshell.FileOperationExecutor(max_workers=3, backend="python") as executor:
+            results = [executor.copy_file(source, source + ".copy") for source in sources]
+            for future in results:
+                future.result()
+        for source in sources:
+            self.assertTrue(filecmp.cmp(source, source + ".copy", shallow=False))
+
+    def test_operations(self):
+        source = self.make_file("a.txt")
+        with winshell.FileOperationExecutor(backend="python") as executor:
+            executor.move_file(source, self.path("b.txt")).result()
+            executor.rename_file(self.path("b.txt"), self.path("c.txt")).result()
+            executor.delete_file(self.path("c.txt"), allow_undo=False).result()
+        self.assertEqual(os.listdir(self.temppath), [])
+
+    def test_errors_raised_by_result(self):
+        with winshell.FileOperationExecutor(backend="python") as executor:
+            future = executor.copy_file(self.path("missing.txt"), self.path("b.txt"))
+            self.assertRaises(winshell.x_winshell, future.result)
+
+    def test_per_volume(self):
+        original_file_operation = winshell._file_operation
+        winshell._file_operation = self.slow_file_operation
+        try:
+            with winshell.FileOperationExecutor(max_workers=4, per_volume=1) as executor:
+                for i in range(4):
+                    executor.copy_file(self.path("%d" % i), self.path("%d.copy" % i))
+        finally:
+            winshell._file_operation = original_file_operation
+        self.assertEqual(self.most_running, 1)
+
+    def test_no_head_of_line_blocking(self):
+        started = []
+        def file_operation(operation, source_path, *args):
+            started.append(os.path.basename(source_path))
+            time.sleep(0.05)
+            return {}
+        def volumes_of(*paths):
+            return set(os.path.basename(path)[0] for path in paths if path)
+        original_file_operation, original_volumes_of = winshell._file_operation, winshell._volumes_of
+        winshell._file_operation, winshell._volumes_of = file_operation, volumes_of
+        try:
+            with winshell.FileOperationExecutor(max_workers=2, per_volume=1) as executor:
+                results = [executor.copy_file(self.path(name), self.path(name)) for name in ("a1", "a2", "a3", "b1")]
+        finally:
+            winshell._file_operation, winshell._volumes_of = original_file_operation, original_volumes_of
+        self.assertEqual([future.result() for future in results], [{}] * 4)
+        self.assertEqual(sorted(started[:2]), ["a1", "b1"])
+        self.assertEqual(started[2:], ["a2", "a3"])
+
+    def test_com_paired(self):
+        calls = []
+        class FakePythoncom(object):
+            def CoInitialize(self):
+                calls.append("init")
+            def CoUninitialize(self):
+                calls.append("uninit")
+        def fail():
+            raise RuntimeError
+        original_pythoncom, winshell.pythoncom = winshell.pythoncom, FakePythoncom()
+        try:
+            with winshell.FileOperationExecutor(max_workers=1) as executor:
+                executor.submit(len, "").result()
+                self.assertRaises(RuntimeError, executor.submit(fail).result)
+        finally:
+            winshell.pythoncom = original_pythoncom
+        self.assertEqual(calls, ["init", "uninit"] * 2)
+
+    def test_volumes_of(self):
+        self.assertEqual(winshell._volumes_of(r"c:\a", [r"D:\b", r"c:\c"], None), set(["c:", "d:"]) if os.name == "nt" else set([""]))
+
+    def test_aio(self):
+        import asyncio
+        source = self.make_file("a.txt")
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        original_executor = winshell.aio.executor
+        winshell.aio.executor = winshell.FileOperationExecutor(max_workers=2, backend="python")
+        try:
+            loop.run_until_complete(asyncio.gather(
+                winshell.aio.copy_file(source, self.path("b.txt")),
+                winshell.aio.copy_file(source, self.path("c.txt")),
+            ))
+        finally:
+            winshell.aio.executor.shutdown()
+            winshell.aio.executor = original_executor
+            asyncio.set_event_loop(None)
+            loop.close()
+        self.assertEqual(sorted(os.listdir(self.temppath)), ["a.txt", "b.txt", "c.txt"])
+
+
+@needs_shell
 class TestShortcuts(test_base.TestCase):
 
     #
@@ -409,6 +913,1339 @@ class TestShortcuts(test_base.TestCase):
             sys.stdout = _stdout
 
 
+@needs_shell
+class TestShellLink(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.targetpath = sys.executable
+        self.lnkpath = os.path.join(self.temppath, "python.lnk")
+        self.description = time.asctime()
+
+        sh = pythoncom.CoCreateInstance(
+            shell.CLSID_ShellLink,
+            None,
+            pythoncom.CLSCTX_INPROC_SERVER,
+            shell.IID_IShellLink
+        )
+        sh.SetPath(self.targetpath)
+        sh.SetDescription(self.description)
+        sh.SetArguments("-c pass")
+        sh.SetWorkingDirectory(self.temppath)
+        sh.SetIconLocation(self.targetpath, 1)
+        sh.SetShowCmd(win32con.SW_SHOWMAXIMIZED)
+        persist = sh.QueryInterface(pythoncom.IID_IPersistFile)
+        persist.Save(self.lnkpath, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Support functions
+    #
+    def fixture(self, **strings):
+        #
+        # Build a link by hand, independently of ShellLink.to_bytes,
+        # with just a header and unicode string data.
+        #
+        flags = winshell.LNK_IS_UNICODE
+        data = []
+        for flag, attribute in winshell._LNK_STRINGS:
+            if attribute in strings:
+                flags |= flag
+                value = strings[attribute]
+                data.append(struct.pack("<H", len(value)) + value.encode("utf-16-le"))
+        header = struct.pack(
+            "<I16sIIQQQIiIHHII",
+            0x4C, winshell.LNK_CLSID, flags, 0, 0, 0, 0, 0, 2, 7, 0x0341, 0, 0, 0
+        )
+        return header + b("").join(data) + b("\0\0\0\0")
+
+    #
+    # Tests
+    #
+    def test_read_matches_com(self):
+        com = winshell.Shortcut(self.lnkpath, backend="com")
+        lnk = winshell.Shortcut(self.lnkpath, backend="lnk")
+        for attribute in ("path", "arguments", "description", "icon_location", "hotkey", "show_cmd", "working_directory"):
+            self.assertEqual(getattr(com, attribute), getattr(lnk, attribute))
+
+    def test_round_trip(self):
+        f = open(self.lnkpath, "rb")
+        try:
+            data = f.read()
+        finally:
+            f.close()
+        self.assertEqual(winshell.ShellLink.from_bytes(data).to_bytes(), data)
+
+    def test_write_read_by_com(self):
+        lnkpath = os.path.join(self.temppath, "written.lnk")
+        link = winshell.ShellLink()
+        link.path = self.targetpath
+        link.arguments = "-c pass"
+        link.description = self.description
+        link.save(lnkpath)
+        shortcut = winshell.Shortcut(lnkpath, backend="com")
+        self.assertEqualCI(shortcut.path, self.targetpath)
+        self.assertEqual(shortcut.arguments, "-c pass")
+        self.assertEqual(shortcut.description, self.description)
+
+    def test_fixture(self):
+        link = winshell.ShellLink.from_bytes(self.fixture(
+            description="Description",
+            working_directory="c:\\temp",
+            arguments="-x",
+            icon_path="c:\\icons.dll"
+        ))
+        self.assertEqual(link.path, "")
+        self.assertEqual(link.description, "Description")
+        self.assertEqual(link.working_directory, "c:\\temp")
+        self.assertEqual(link.arguments, "-x")
+        self.assertEqual(link.icon_location, ("c:\\icons.dll", 2))
+        self.assertEqual(link.show_cmd, 7)
+        self.assertEqual(link.hotkey, 0x0341)
+
+    def test_fixture_round_trip(self):
+        data = self.fixture(description="Description", arguments="-x")
+        self.assertEqual(winshell.ShellLink.from_bytes(data).to_bytes(), data)
+
+    def test_unc_path(self):
+        link = winshell.ShellLink()
+        link.path = "\\\\server\\share\\folder\\file.txt"
+        self.assertEqual(winshell.ShellLink.from_bytes(link.to_bytes()).path, link.path)
+
+    def test_not_a_link(self):
+        self.assertRaises(winshell.x_shortcut, winshell.ShellLink.from_bytes, b("x") * 100)
+
+    def test_truncated(self):
+        f = open(self.lnkpath, "rb")
+        try:
+            data = f.read()
+        finally:
+            f.close()
+        self.assertRaises(winshell.x_shortcut, winshell.ShellLink.from_bytes, data[:80])
+
+
+class TestRealShortcuts(test_base.TestCase):
+    #
+    # Links written by Windows itself, checked in as bytes (see
+    # test_data/lnk/README.txt) so that the pure-Python parser is
+    # tested against real data on any platform.
+    #
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.dirpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "lnk")
+
+    #
+    # Support functions
+    #
+    def data(self, name):
+        f = open(os.path.join(self.dirpath, name), "rb")
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def link(self, name):
+        return winshell.ShellLink.from_bytes(self.data(name))
+
+    #
+    # Tests
+    #
+    def test_id_list_only(self):
+        link = self.link("idlist-internet.lnk")
+        self.assertEqual(link.link_info, None)
+        self.assertEqual(winshell._path_from_id_list(link.id_list), "")
+        self.assertEqual((link.path, link.arguments, link.working_directory), ("", "", ""))
+
+    def test_id_list(self):
+        link = self.link("linkinfo-local-calc.lnk")
+        self.assertEqual(winshell._path_from_id_list(link.id_list), "C:\\Windows\\System32\\calc.exe")
+
+    def test_link_info_local(self):
+        link = self.link("linkinfo-local-calc.lnk")
+        self.assertEqual(winshell._path_from_link_info(link.link_info), "C:\\Windows\\System32\\calc.exe")
+        self.assertEqual(link.path, "C:\\Windows\\System32\\calc.exe")
+        self.assertEqual(link.arguments, "")
+        self.assertEqual(link.working_directory, "C:\\Windows\\System32")
+        self.assertEqual(link.relative_path, "..\\..\\..\\Windows\\System32\\calc.exe")
+
+    def test_link_info_known_folder(self):
+        link = self.link("linkinfo-known-folder-desktop.lnk")
+        self.assertEqual(winshell._path_from_link_info(link.link_info), "C:\\Users\\nfury\\Desktop")
+        self.assertEqual(link.path, "C:\\Users\\nfury\\Desktop")
+        self.assertEqual((link.arguments, link.working_directory), ("", ""))
+
+    def test_link_info_network(self):
+        #
+        # No Windows-written network link is to hand, so build a LinkInfo
+        # with a CommonNetworkRelativeLink by hand from the specification
+        #
+        net_name = b("\\\\server\\share\0")
+        suffix = b("folder\\file.txt\0")
+        network = struct.pack("<5I", 0x14 + len(net_name), 0, 0x14, 0, 0) + net_name
+        header = struct.pack("<7I", 0x1C + len(network) + len(suffix), 0x1C, 0x2, 0, 0, 0x1C, 0x1C + len(network))
+        self.assertEqual(winshell._path_from_link_info(header + network + suffix), "\\\\server\\share\\folder\\file.txt")
+
+    def test_environment_strings(self):
+        link = self.link("env-strings-getting-started.lnk")
+        block = link.extra_data_block(winshell.LNK_ENVIRONMENT_VARIABLE_DATA_BLOCK)
+        self.assertEqual(winshell._unicode_string_at(block, 268), "%SystemRoot%\\system32\\GettingStarted.exe")
+        self.assertEqual(link.path, "C:\\Windows\\System32\\GettingStarted.exe")
+        self.assertEqual(
+            link.arguments,
+            "{DE3895CB-077B-4C38-B6E3-F3DE1E0D84FC} %systemroot%\\system32\\control.exe /name Microsoft.Display"
+        )
+        self.assertEqual(link.working_directory, "")
+        self.assertEqual(link.icon_location, ("%systemroot%\\system32\\display.dll", -1))
+
+    def test_round_trip(self):
+        for name in sorted(os.listdir(self.dirpath)):
+            if name.endswith(".lnk"):
+                data = self.data(name)
+                self.assertEqual(winshell.ShellLink.from_bytes(data).to_bytes(), data)
+
+    def test_round_trip_empty_string(self):
+        #
+        # Set HasName on a real link and give it a zero-length description
+        #
+        data = self.data("linkinfo-local-calc.lnk")
+        layout = winshell._lnk_layout(data)
+        flags, = struct.unpack_from("<I", data, 0x14)
+        offset = layout.link_info[1]
+        data = data[:0x14] + struct.pack("<I", flags | winshell.LNK_HAS_NAME) + data[0x18:offset] + b("\0\0") + data[offset:]
+        link = winshell.ShellLink.from_bytes(data)
+        self.assertEqual(link.description, "")
+        self.assertEqual(link.to_bytes(), data)
+
+    def test_round_trip_id_list_only(self):
+        #
+        # Strip the link info from a real filesystem link, leaving its id list
+        #
+        data = self.data("linkinfo-local-calc.lnk")
+        start, end = winshell._lnk_layout(data).link_info
+        flags, = struct.unpack_from("<I", data, 0x14)
+        data = data[:0x14] + struct.pack("<I", flags & ~winshell.LNK_HAS_LINK_INFO) + data[0x18:start] + data[end:]
+        link = winshell.ShellLink.from_bytes(data)
+        self.assertEqual(link.link_info, None)
+        self.assertEqual(link.path, "C:\\Windows\\System32\\calc.exe")
+        self.assertEqual(link.to_bytes(), data)
+
+    def test_read_shortcuts(self):
+        filepaths = [os.path.join(self.dirpath, name) for name in sorted(os.listdir(self.dirpath)) if name.endswith(".lnk")]
+        for filepath, values in winshell.read_shortcuts(filepaths):
+            link = winshell.ShellLink.from_file(filepath)
+            for attribute in winshell.SHORTCUT_ATTRIBUTES:
+                self.assertEqual(values[attribute], getattr(link, attribute))
+
+
+class TestReadShortcuts(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.lnkpaths = []
+        for n, description in enumerate(["Long " * 2000, "Short", "Medium " * 100]):
+            lnkpath = os.path.join(self.temppath, "link%d.lnk" % n)
+            link = winshell.ShellLink()
+            link.path = os.path.join(self.temppath, "target%d.exe" % n)
+            link.description = description
+            link.arguments = "-n %d" % n
+            link.save(lnkpath)
+            self.lnkpaths.append(lnkpath)
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Support functions
+    #
+    def contents(self, filepath):
+        f = open(filepath, "rb")
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    #
+    # Tests
+    #
+    def test_from_memoryview(self):
+        data = self.contents(self.lnkpaths[1])
+        link = winshell.ShellLink.from_bytes(memoryview(data))
+        self.assertEqual(link.description, "Short")
+        self.assertEqual(link.to_bytes(), data)
+
+    def test_from_mmap(self):
+        f = open(self.lnkpaths[0], "rb")
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                link = winshell.ShellLink.from_bytes(data)
+            finally:
+                data.close()
+        finally:
+            f.close()
+        self.assertEqual(link.to_bytes(), self.contents(self.lnkpaths[0]))
+
+    def test_read_shortcuts(self):
+        results = list(winshell.read_shortcuts(self.lnkpaths, buffer_size=1024))
+        self.assertEqual([lnkpath for lnkpath, values in results], self.lnkpaths)
+        for lnkpath, values in results:
+            link = winshell.ShellLink.from_file(lnkpath)
+            for attribute in winshell.SHORTCUT_ATTRIBUTES:
+                self.assertEqual(values[attribute], getattr(link, attribute))
+
+    def test_fields(self):
+        for lnkpath, values in winshell.read_shortcuts(self.lnkpaths, ["arguments"]):
+            self.assertEqual(list(values), ["arguments"])
+
+    def test_unknown_field(self):
+        self.assertRaises(winshell.x_shortcut, list, winshell.read_shortcuts(self.lnkpaths, ["xxx"]))
+
+    def test_invalid_skipped(self):
+        invalid = os.path.join(self.temppath, "invalid.lnk")
+        f = open(invalid, "wb")
+        try:
+            f.write(b("x") * 100)
+        finally:
+            f.close()
+        missing = os.path.join(self.temppath, "missing.lnk")
+        results = winshell.read_shortcuts([invalid, missing] + self.lnkpaths)
+        self.assertEqual([lnkpath for lnkpath, values in results], self.lnkpaths)
+
+
+class TestLazyShortcut(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.lnkpath = os.path.join(self.temppath, "python.lnk")
+        link = winshell.ShellLink()
+        link.path = sys.executable
+        link.description = "Python"
+        link.save(self.lnkpath)
+        #
+        # Backdate the link so that any rewrite shows up in its mtime
+        #
+        os.utime(self.lnkpath, (1000000000, 1000000000))
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Tests
+    #
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(winshell.Shortcut(self.lnkpath, backend="lnk"), "__dict__"))
+
+    @needs_shell
+    def test_com_fields_fetched_once(self):
+        calls = []
+        class FakeShellLink(object):
+            def __getattr__(self, name):
+                def method(*args):
+                    calls.append(name)
+                    return ("icon.ico", 0) if name == "GetIconLocation" else ("", None) if name == "GetPath" else name
+                return method
+        def com_shell_link():
+            link = object.__new__(winshell._ComShellLink)
+            link._shell_link, link._fields = FakeShellLink(), None
+            return link
+        original_backend = winshell.shortcut_backends["com"]
+        winshell.shortcut_backends["com"] = com_shell_link
+        try:
+            shortcut = winshell.Shortcut()
+            shortcut.dumped()
+            n_calls = len(calls)
+            self.assertEqual(n_calls, len(winshell._ComShellLink._accessors))
+            self.assertEqual((shortcut.arguments, shortcut.description), ("GetArguments", "GetDescription"))
+            self.assertEqual(len(calls), n_calls)
+            shortcut.description = "changed"
+            self.assertEqual(calls[n_calls:], ["SetDescription", "GetDescription"])
+        finally:
+            winshell.shortcut_backends["com"] = original_backend
+
+    def test_shell_link_only_for_com(self):
+        self.assertRaises(AttributeError, getattr, winshell.Shortcut(self.lnkpath, backend="lnk"), "_shell_link")
+
+    def test_factory_backend(self):
+        shortcut = winshell.shortcut(self.lnkpath, backend="lnk")
+        self.assertEqual(shortcut.backend, "lnk")
+        self.assertEqual(shortcut.description, "Python")
+        self.assertEqual(winshell.shortcut(sys.executable, backend="lnk").backend, "lnk")
+        self.assertEqual(winshell.shortcut(backend="lnk").backend, "lnk")
+
+    def test_not_read_until_used(self):
+        shortcut = winshell.Shortcut(self.lnkpath, backend="lnk")
+        self.assertTrue(shortcut._link is None)
+        self.assertEqual(shortcut.description, "Python")
+        self.assertFalse(shortcut._link is None)
+
+    def test_unchanged_not_written(self):
+        shortcut = winshell.Shortcut(self.lnkpath, backend="lnk")
+        shortcut.description = "Python"
+        shortcut.write()
+        self.assertEqual(os.stat(self.lnkpath).st_mtime, 1000000000)
+
+    def test_changed_written(self):
+        shortcut = winshell.Shortcut(self.lnkpath, backend="lnk")
+        shortcut.description = "Python interpreter"
+        shortcut.write()
+        self.assertNotEqual(os.stat(self.lnkpath).st_mtime, 1000000000)
+        self.assertEqual(winshell.Shortcut(self.lnkpath, backend="lnk").description, "Python interpreter")
+
+    def test_written_elsewhere(self):
+        lnkpath = os.path.join(self.temppath, "copy.lnk")
+        winshell.Shortcut(self.lnkpath, backend="lnk").write(lnkpath)
+        self.assertTrue(os.path.exists(lnkpath))
+
+
+class TestScanShortcuts(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.lnkpaths = set()
+        for i in range(3):
+            dirpath = os.path.join(self.temppath, *["sub%d" % j for j in range(i)])
+            if not os.path.exists(dirpath):
+                os.makedirs(dirpath)
+            for n in range(5):
+                lnkpath = os.path.join(dirpath, "link%d.lnk" % n)
+                link = winshell.ShellLink()
+                link.path = os.path.join(dirpath, "target%d.exe" % n)
+                link.arguments = "-n %d" % n
+                link.save(lnkpath)
+                self.lnkpaths.add(lnkpath)
+        open(os.path.join(self.temppath, "not-a-link.txt"), "w").close()
+        f = open(os.path.join(self.temppath, "corrupt.lnk"), "wb")
+        try:
+            f.write(b("corrupt"))
+        finally:
+            f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Tests
+    #
+    def test_serial(self):
+        records = list(winshell.scan_shortcuts(self.temppath, workers=1))
+        self.assertEqual(set(r.lnk_filepath for r in records), self.lnkpaths)
+
+    def test_parallel(self):
+        records = list(winshell.scan_shortcuts([self.temppath], workers=4))
+        self.assertEqual(set(r.lnk_filepath for r in records), self.lnkpaths)
+
+    def test_record(self):
+        for record in winshell.scan_shortcuts(self.temppath):
+            dirpath = os.path.dirname(record.lnk_filepath)
+            n = os.path.basename(record.lnk_filepath)[len("link"):-len(".lnk")]
+            self.assertEqual(record.root, self.temppath)
+            self.assertEqual(record.path, os.path.join(dirpath, "target%s.exe" % n))
+            self.assertEqual(record.arguments, "-n %s" % n)
+            self.assertEqual(record.mtime, os.stat(record.lnk_filepath).st_mtime)
+
+
+class TestExportShortcuts(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.expected = {}
+        for n in range(10):
+            lnkpath = os.path.join(self.temppath, "link%d.lnk" % n)
+            link = winshell.ShellLink()
+            link.path = os.path.join(self.temppath, "target%d.exe" % n)
+            link.arguments = "-n %d" % n
+            link.icon_location = link.path, n
+            link.save(lnkpath)
+            self.expected[lnkpath] = link
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Tests
+    #
+    def test_jsonl(self):
+        out = StringIO()
+        self.assertEqual(winshell.export_shortcuts(self.temppath, "jsonl", out, buffer_size=100), 10)
+        out.seek(0)
+        records = [json.loads(line) for line in out]
+        self.assertEqual(set(r["lnk_filepath"] for r in records), set(self.expected))
+        for record in records:
+            link = self.expected[record["lnk_filepath"]]
+            self.assertEqual(record["path"], link.path)
+            self.assertEqual(record["arguments"], link.arguments)
+            self.assertEqual(tuple(record["icon_location"]), link.icon_location)
+
+    def test_csv(self):
+        out = StringIO()
+        winshell.export_shortcuts(self.temppath, "csv", out, fields=["lnk_filepath", "path"])
+        out.seek(0)
+        rows = list(csv.reader(out))
+        self.assertEqual(rows[0], ["lnk_filepath", "path"])
+        self.assertEqual(dict(rows[1:]), dict((k, v.path) for (k, v) in self.expected.items()))
+
+    def test_fields(self):
+        out = StringIO()
+        winshell.export_shortcuts(self.temppath, out=out, fields=["arguments"])
+        out.seek(0)
+        for line in out:
+            self.assertEqual(list(json.loads(line)), ["arguments"])
+
+    def test_unknown_format(self):
+        self.assertRaises(winshell.x_shortcut, winshell.export_shortcuts, self.temppath, "xml", StringIO())
+
+
+class TestBrokenShortcuts(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.links = os.path.join(self.temppath, "links")
+        self.targets = os.path.join(self.temppath, "targets")
+        os.mkdir(self.links)
+        os.mkdir(self.targets)
+        self.broken = set()
+        for i in range(20):
+            target = os.path.join(self.targets, "target%d.txt" % i)
+            lnkpath = self.make_link("link%d.lnk" % i, target)
+            if i % 3:
+                open(target, "w").close()
+            else:
+                self.broken.add(lnkpath)
+        self.broken.add(self.make_link("no-folder.lnk", os.path.join(self.temppath, "missing", "target.txt")))
+        self.make_link("folder.lnk", self.targets)
+        self.make_link("no-target.lnk", "")
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Support functions
+    #
+    def make_link(self, name, target):
+        lnkpath = os.path.join(self.links, name)
+        link = winshell.ShellLink()
+        link.path = target
+        link.save(lnkpath)
+        return lnkpath
+
+    #
+    # Tests
+    #
+    def test_find_broken(self):
+        broken = winshell.find_broken_shortcuts(self.links)
+        self.assertEqual(set(record.lnk_filepath for record in broken), self.broken)
+
+    def test_small_batches(self):
+        broken = winshell.find_broken_shortcuts([self.links], workers=2, batch_size=3)
+        self.assertEqual(set(record.lnk_filepath for record in broken), self.broken)
+
+    def test_folder_listed_once(self):
+        listed = []
+        _folder_listing = winshell._folder_listing
+
+        def counting_listing(dirpath):
+            listed.append(dirpath)
+            return _folder_listing(dirpath)
+
+        winshell._folder_listing = counting_listing
+        try:
+            list(winshell.find_broken_shortcuts(self.links, batch_size=3))
+        finally:
+            winshell._folder_listing = _folder_listing
+        self.assertEqual(len(listed), len(set(listed)))
+
+
+class TestShortcutIndex(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.root = os.path.join(self.temppath, "links")
+        os.mkdir(self.root)
+        self.index_filepath = os.path.join(self.temppath, "index.db")
+        self.target1 = os.path.join(self.temppath, "target1.exe")
+        self.target2 = os.path.join(self.temppath, "target2.exe")
+        self.lnkpath1 = self.make_link("a.lnk", self.target1)
+        self.lnkpath2 = self.make_link("b.lnk", self.target1)
+        self.lnkpath3 = self.make_link("c.lnk", self.target2)
+        self.index = winshell.ShortcutIndex(self.index_filepath, [self.root])
+        self.index.refresh()
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.temppath)
+
+    #
+    # Support functions
+    #
+    def make_link(self, name, target):
+        lnkpath = os.path.join(self.root, name)
+        link = winshell.ShellLink()
+        link.path = target
+        link.save(lnkpath)
+        return lnkpath
+
+    #
+    # Tests
+    #
+    def test_shortcuts_to(self):
+        self.assertEqual(self.index.shortcuts_to(self.target1), sorted([self.lnkpath1, self.lnkpath2]))
+        self.assertEqual(self.index.shortcuts_to(self.target2.upper()), [self.lnkpath3])
+
+    def test_unchanged_refresh(self):
+        self.assertEqual(self.index.refresh(), ([], []))
+
+    def test_changed_refresh(self):
+        self.make_link("a.lnk", self.target2 + ".changed")
+        os.utime(self.lnkpath1, (1000000000, 1000000000))
+        os.remove(self.lnkpath3)
+        self.assertEqual(self.index.refresh(), ([self.lnkpath1], [self.lnkpath3]))
+        self.assertEqual(self.index.shortcuts_to(self.target2), [])
+        self.assertEqual(self.index[self.lnkpath1].path, self.target2 + ".changed")
+
+    def test_persisted(self):
+        self.index.close()
+        self.index = winshell.ShortcutIndex(self.index_filepath, [self.root])
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.refresh(), ([], []))
+
+    def test_nested_roots(self):
+        index = winshell.ShortcutIndex(roots=[self.root, self.temppath])
+        try:
+            self.assertEqual(index.roots, [self.temppath])
+        finally:
+            index.close()
+
+
+class TestSyncShortcuts(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.manifest = {
+            "Python": dict(path=sys.executable, arguments="-i", show_cmd="max"),
+            "Temp.lnk": dict(path=self.temppath, description="Temp folder"),
+        }
+        self.python_lnk = os.path.join(self.temppath, "Python.lnk")
+        self.temp_lnk = os.path.join(self.temppath, "Temp.lnk")
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Tests
+    #
+    def test_create(self):
+        report = winshell.sync_shortcuts(self.manifest, self.temppath)
+        self.assertEqual(report.created, [self.python_lnk, self.temp_lnk])
+        shortcut = winshell.Shortcut(self.python_lnk, backend="lnk")
+        self.assertEqual(shortcut.arguments, "-i")
+        self.assertEqual(shortcut.show_cmd, "max")
+
+    def test_no_op(self):
+        winshell.sync_shortcuts(self.manifest, self.temppath)
+        os.utime(self.python_lnk, (1000000000, 1000000000))
+        report = winshell.sync_shortcuts(self.manifest, self.temppath)
+        self.assertEqual(report, ([], [], [], [self.python_lnk, self.temp_lnk]))
+        self.assertEqual(os.stat(self.python_lnk).st_mtime, 1000000000)
+
+    def test_update(self):
+        winshell.sync_shortcuts(self.manifest, self.temppath)
+        self.manifest["Python"]["arguments"] = "-O"
+        report = winshell.sync_shortcuts(self.manifest, self.temppath)
+        self.assertEqual(report.updated, [self.python_lnk])
+        self.assertEqual(report.unchanged, [self.temp_lnk])
+        self.assertEqual(winshell.Shortcut(self.python_lnk, backend="lnk").arguments, "-O")
+
+    def test_prune(self):
+        extra_lnk = os.path.join(self.temppath, "Extra.lnk")
+        winshell.ShellLink().save(extra_lnk)
+        other_filepath = os.path.join(self.temppath, "other.txt")
+        open(other_filepath, "w").close()
+        report = winshell.sync_shortcuts(self.manifest, self.temppath, prune=True)
+        self.assertEqual(report.deleted, [extra_lnk])
+        self.assertFalse(os.path.exists(extra_lnk))
+        self.assertTrue(os.path.exists(other_filepath))
+
+    def test_no_prune(self):
+        extra_lnk = os.path.join(self.temppath, "Extra.lnk")
+        winshell.ShellLink().save(extra_lnk)
+        report = winshell.sync_shortcuts(self.manifest, self.temppath)
+        self.assertEqual(report.deleted, [])
+        self.assertTrue(os.path.exists(extra_lnk))
+
+
+class TestCreateShortcuts(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.specs = dict(
+            (os.path.join(self.temppath, "sub%d" % (n % 3), "link%d.lnk" % n), dict(path=sys.executable, arguments="-n %d" % n))
+            for n in range(20)
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Support functions
+    #
+    def actions(self, results):
+        return dict((r.lnk_filepath, r.action) for r in results)
+
+    #
+    # Tests
+    #
+    def test_create(self):
+        actions = self.actions(winshell.create_shortcuts(self.specs, workers=4))
+        self.assertEqual(actions, dict((k, "created") for k in self.specs))
+        for lnkpath, spec in self.specs.items():
+            self.assertEqual(winshell.Shortcut(lnkpath, backend="lnk").arguments, spec["arguments"])
+
+    def test_unchanged(self):
+        list(winshell.create_shortcuts(self.specs))
+        actions = self.actions(winshell.create_shortcuts(self.specs))
+        self.assertEqual(actions, dict((k, "unchanged") for k in self.specs))
+
+    def test_updated(self):
+        list(winshell.create_shortcuts(self.specs))
+        lnkpath = sorted(self.specs)[0]
+        self.specs[lnkpath]["arguments"] = "-O"
+        actions = self.actions(winshell.create_shortcuts(self.specs))
+        self.assertEqual(actions.pop(lnkpath), "updated")
+        self.assertEqual(set(actions.values()), set(["unchanged"]))
+
+    def test_failure_reported(self):
+        bad = os.path.join(self.temppath, "bad.lnk")
+        self.specs[bad] = dict(show_cmd="no-such-state")
+        results = dict((r.lnk_filepath, r) for r in winshell.create_shortcuts(self.specs))
+        self.assertEqual(results[bad].action, "failed")
+        self.assertTrue(results[bad].error is not None)
+        self.assertFalse(os.path.exists(bad))
+        self.assertEqual(len([r for r in results.values() if r.action == "created"]), 20)
+
+
+#
+# The deterministic serialisation of the link built in
+# TestDeterministicShortcuts.setUp. If this changes, every link written
+# deterministically by an earlier version will be seen as changed.
+#
+GOLDEN_LNK = (
+    "4c0000000114020000000000c000000000000046f6000000000000000000000000000000000000000000000000000000"
+    "000000000000000001000000030000004106000000000000000000008f00000024000000010000002400000035000000"
+    "0000000052000000530000008d0000001100000003000000000000001000000000433a5c50726f6772616d2046696c65"
+    "735c4170705c6170702e657865000043003a005c00500072006f006700720061006d002000460069006c00650073005c"
+    "004100700070005c006100700070002e00650078006500000000000300410070007000140043003a005c00500072006f"
+    "006700720061006d002000460069006c00650073005c0041007000700006002d002d0066006c00610067001c0043003a"
+    "005c00500072006f006700720061006d002000460069006c00650073005c004100700070005c006100700070002e0065"
+    "007800650000000000"
+)
+
+class TestDeterministicShortcuts(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.link = winshell.ShellLink()
+        self.link.path = "C:\\Program Files\\App\\app.exe"
+        self.link.arguments = "--flag"
+        self.link.description = "App"
+        self.link.working_directory = "C:\\Program Files\\App"
+        self.link.icon_location = ("C:\\Program Files\\App\\app.exe", 1)
+        self.link.show_cmd = win32con.SW_SHOWMAXIMIZED
+        self.link.hotkey = 0x0641
+        self.golden = binascii.unhexlify(b("").join(b(s) for s in GOLDEN_LNK))
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Support functions
+    #
+    def extra_data_block(self, signature, size=0x20):
+        return struct.pack("<II", size, signature) + b("\0") * (size - 8)
+
+    #
+    # Tests
+    #
+    def test_golden(self):
+        self.assertEqual(self.link.to_bytes(deterministic=True), self.golden)
+
+    def test_volatile_parts_ignored(self):
+        link = winshell.ShellLink.from_bytes(self.link.to_bytes())
+        link.creation_time = link.access_time = link.write_time = 129000000000000000
+        link.file_size = 12345
+        link.file_attributes = 0x20
+        link.id_list = b("\x14\x00") + b("\x1f") * 18 + b("\0\0")
+        link.extra_data.append(self.extra_data_block(winshell.LNK_TRACKER_DATA_BLOCK, 0x60))
+        link.extra_data.append(self.extra_data_block(winshell.LNK_PROPERTY_STORE_DATA_BLOCK))
+        self.assertNotEqual(link.to_bytes(), self.golden)
+        self.assertEqual(link.to_bytes(deterministic=True), self.golden)
+
+    def test_save_remember(self):
+        first = os.path.join(self.temppath, "first.lnk")
+        second = os.path.join(self.temppath, "second.lnk")
+        self.assertRaises(winshell.x_shortcut, self.link.save)
+        self.link.save(first)
+        self.link.save(second, remember=False)
+        os.remove(first)
+        self.link.save()
+        self.assertEqual(self.link.lnk_filepath, first)
+        self.assertTrue(os.path.exists(first))
+        self.assertEqual(winshell.ShellLink.from_file(second).lnk_filepath, second)
+
+    def property_store(self, *storages):
+        output = []
+        for format_id, values in storages:
+            body = b("").join(struct.pack("<II", 9 + len(data), pid) + b("\0") + data for pid, data in values) + b("\0\0\0\0")
+            output.append(struct.pack("<II16s", 24 + len(body), 0x53505331, format_id) + body)
+        body = b("").join(output) + b("\0\0\0\0")
+        return struct.pack("<II", 8 + len(body), winshell.LNK_PROPERTY_STORE_DATA_BLOCK) + body
+
+    def test_property_store_kept(self):
+        app_id = (binascii.unhexlify(b("9f4eca9f7a5a4d4a9a6e4e5a9b1d8c7f")), [(5, b("\x1f\0app.id"))])
+        other = (b("\x01") * 16, [(3, b("three")), (2, b("two"))])
+        self.link.extra_data = [self.property_store(other, app_id)]
+        data = self.link.to_bytes(deterministic=True)
+        self.assertTrue(b("app.id") in data)
+        self.link.extra_data = [self.property_store(app_id, (other[0], list(reversed(other[1]))))]
+        self.assertEqual(self.link.to_bytes(deterministic=True), data)
+        self.assertEqual(winshell.ShellLink.from_bytes(data).to_bytes(deterministic=True), data)
+
+    def test_folder_blocks_kept_with_id_list(self):
+        known_folder = self.extra_data_block(winshell.LNK_KNOWN_FOLDER_DATA_BLOCK, 0x1C)
+        link = winshell.ShellLink()
+        link.id_list = b("\x14\x00") + b("\x1f") * 18 + b("\0\0")
+        link.extra_data = [known_folder]
+        self.assertTrue(known_folder in link.to_bytes(deterministic=True))
+        self.link.extra_data = [known_folder]
+        self.assertEqual(self.link.to_bytes(deterministic=True), self.golden)
+
+    def test_extra_data_ordered(self):
+        block1 = self.extra_data_block(0xA0000002)
+        block2 = self.extra_data_block(0xA0000004)
+        self.link.extra_data = [block2, block1]
+        data = self.link.to_bytes(deterministic=True)
+        self.assertTrue(data.index(block1) < data.index(block2))
+
+    def test_content_hash(self):
+        lnkpath1 = os.path.join(self.temppath, "1.lnk")
+        lnkpath2 = os.path.join(self.temppath, "2.lnk")
+        self.link.save(lnkpath1)
+        self.link.creation_time = 129000000000000000
+        self.link.save(lnkpath2)
+        shortcut1 = winshell.Shortcut(lnkpath1, backend="lnk")
+        shortcut2 = winshell.Shortcut(lnkpath2, backend="lnk")
+        self.assertEqual(shortcut1.content_hash(), shortcut2.content_hash())
+        shortcut2.arguments = "--other"
+        self.assertNotEqual(shortcut1.content_hash(), shortcut2.content_hash())
+
+    def test_deterministic_write(self):
+        lnkpath = os.path.join(self.temppath, "app.lnk")
+        self.link.creation_time = 129000000000000000
+        self.link.save(lnkpath)
+        winshell.Shortcut(lnkpath, backend="lnk").write(deterministic=True)
+        f = open(lnkpath, "rb")
+        try:
+            self.assertEqual(f.read(), self.golden)
+        finally:
+            f.close()
+        os.utime(lnkpath, (1000000000, 1000000000))
+        winshell.Shortcut(lnkpath, backend="lnk").write(deterministic=True)
+        self.assertEqual(os.stat(lnkpath).st_mtime, 1000000000)
+
+
+def filetime_from_datetime(dt):
+    return int(time.mktime(dt.timetuple())) * 10000000 + 116444736000000000
+
+def recycle_bin_info(version, original_filepath, size, deleted_at):
+    filetime = filetime_from_datetime(deleted_at)
+    header = struct.pack("<QQQ", version, size, filetime)
+    path = (original_filepath + u"\0").encode("utf-16-le")
+    if version == 1:
+        return header + path.ljust(520, b("\0"))
+    else:
+        return header + struct.pack("<I", len(path) // 2) + path
+
+def info2_record(original_filepath, index, drive, size, deleted_at, version=5):
+    filetime = filetime_from_datetime(deleted_at)
+    ansi_path = original_filepath.encode("ascii").ljust(260, b("\0"))
+    record = struct.pack("<260sIIQI", ansi_path, index, drive, filetime, size)
+    if version == 5:
+        record += original_filepath.encode("utf-16-le").ljust(520, b("\0"))
+    return record
+
+class TestOfflineRecycleBin(test_base.TestCase):
+
+    #
+    # Fixtures
+    #
+    def setUp(self):
+        self.temppath = tempfile.mkdtemp()
+        self.deleted_at = datetime.datetime(2013, 5, 7, 12, 30, 15)
+        self.user_bin = os.path.join(self.temppath, "$Recycle.Bin", "S-1-5-21-1-2-3-1001")
+        os.makedirs(self.user_bin)
+        self.write("$IABC123.txt", recycle_bin_info(1, u"C:\\Data\\report.txt", 5, self.deleted_at))
+        self.write("$RABC123.txt", b("12345"))
+        self.write("$IDEF456.txt", recycle_bin_info(2, u"C:\\Data\\report.txt", 3, self.deleted_at + datetime.timedelta(days=1)))
+        self.write("$RDEF456.txt", b("123"))
+        self.write("$IORPHAN.txt", recycle_bin_info(2, u"C:\\Data\\orphan.txt", 1, self.deleted_at))
+
+    def tearDown(self):
+        shutil.rmtree(self.temppath)
+
+    #
+    # Support Functions
+    #
+    def write(self, name, data, dirpath=None):
+        f = open(os.path.join(dirpath or self.user_bin, name), "wb")
+        try:
+            f.write(data)
+        finally:
+            f.close()
+
+    #
+    # Tests
+    #
+    def test_factory_function(self):
+        self.assertIsInstance(winshell.recycle_bin(self.temppath), winshell.OfflineRecycleBin)
+
+    def test_versions(self):
+        for root in (self.temppath, os.path.dirname(self.user_bin), self.user_bin):
+            recycle_bin = winshell.recycle_bin(root)
+            versions = sorted(recycle_bin.versions(u"c:\\data\\REPORT.txt"), key=lambda item: item.size())
+            self.assertEqual(
+                [(item.original_filename(), item.size(), item.recycle_date()) for item in versions],
+                [
+                    (u"C:\\Data\\report.txt", 3, self.deleted_at + datetime.timedelta(days=1)),
+                    (u"C:\\Data\\report.txt", 5, self.deleted_at),
+                ]
+            )
+
+    def test_versions_indexed(self):
+        recycle_bin = winshell.recycle_bin(self.temppath)
+        self.assertEqual(len(recycle_bin.versions(u"C:\\Data\\report.txt")), 2)
+        index = recycle_bin._index
+        self.assertFalse(recycle_bin.versions(u"C:\\Data\\other.txt"))
+        self.assertTrue(recycle_bin._index is index)
+
+        self.write("$IGHI789.txt", recycle_bin_info(2, u"C:\\Data\\report.txt", 1, self.deleted_at))
+        self.write("$RGHI789.txt", b("1"))
+        self.assertEqual(len(recycle_bin.versions(u"C:\\Data\\report.txt")), 3)
+        self.assertFalse(recycle_bin._index is index)
+
+    def test_orphans_ignored(self):
+        recycle_bin = winshell.recycle_bin(self.temppath)
+        self.assertEqual(len(recycle_bin), 2)
+        self.assertEqual(recycle_bin.get_size(), 8)
+        self.assertFalse(recycle_bin.versions(u"C:\\Data\\orphan.txt"))
+
+    def test_contents(self):
+        item, = [item for item in winshell.recycle_bin(self.temppath) if item.size() == 5]
+        self.assertEqualCI(item.real_filename(), os.path.join(self.user_bin, "$RABC123.txt"))
+        self.assertEqual(b("").join(item.contents(buffer_size=2)), b("12345"))
+
+    def test_open(self):
+        item, = [item for item in winshell.recycle_bin(self.temppath) if item.size() == 5]
+        f = item.open()
+        try:
+            buffer = bytearray(3)
+            self.assertEqual(f.readinto(buffer), 3)
+            self.assertEqual(buffer, bytearray(b("123")))
+            f.seek(-1, os.SEEK_END)
+            self.assertEqual(f.read(), b("5"))
+        finally:
+            f.close()
+
+        f = item.open(buffering=0)
+        try:
+            self.assertIsInstance(f, io.RawIOBase)
+            self.assertEqual(hashlib.sha256(f.read()).hexdigest(), hashlib.sha256(b("12345")).hexdigest())
+        finally:
+            f.close()
+
+    def test_istream(self):
+        class IStream(object):
+            def __init__(self, data):
+                self.f = io.BytesIO(data)
+            def Read(self, n_bytes):
+                return self.f.read(n_bytes)
+            def Seek(self, offset, origin):
+                return self.f.seek(offset, origin)
+
+        f = winshell._buffered(winshell._IStreamIO(IStream(b("0123456789"))), 4)
+        try:
+            self.assertEqual(f.read(6), b("012345"))
+            self.assertEqual(f.seek(-2, os.SEEK_END), 8)
+            buffer = bytearray(5)
+            self.assertEqual(f.readinto(buffer), 2)
+            self.assertEqual(buffer[:2], bytearray(b("89")))
+        finally:
+            f.close()
+
+    def test_info2(self):
+        recycler = os.path.join(self.temppath, "RECYCLER", "S-1-5-21-1-2-3-1001")
+        os.makedirs(recycler)
+        records = [
+            info2_record("C:\\Old\\a.doc", 1, 2, 4096, self.deleted_at),
+            info2_record("\0:\\Old\\restored.doc", 2, 2, 4096, self.deleted_at),
+            info2_record("C:\\Old\\b", 3, 2, 4096, self.deleted_at),
+        ]
+        self.write("INFO2", struct.pack("<IIIII", 5, 0, 0, 800, 0) + b("").join(records), recycler)
+        self.write("Dc1.doc", b("a"), recycler)
+        self.write("Dc2.doc", b("r"), recycler)
+        self.write("Dc3", b("b"), recycler)
+
+        items = sorted(winshell.recycle_bin(recycler), key=lambda item: item.original_filename())
+        self.assertEqual(
+            [(item.original_filename(), os.path.basename(item.real_filename()), item.recycle_date()) for item in items],
+            [("C:\\Old\\a.doc", "Dc1.doc", self.deleted_at), ("C:\\Old\\b", "Dc3", self.deleted_at)]
+        )
+
+    def test_bad_info2_ignored(self):
+        for name, data in (("RECYCLER", b("\0\0")), ("RECYCLED", struct.pack("<IIIII", 5, 0, 0, 10, 0))):
+            recycler = os.path.join(self.temppath, name)
+            os.makedirs(recycler)
+            self.write("INFO2", data, recycler)
+            self.write("Dc1.doc", b("a"), recycler)
+        self.assertEqual(len(winshell.recycle_bin(self.temppath)), 2)
+
+    def test_unknown_version_ignored(self):
+        self.write("$IBAD.txt", struct.pack("<QQQ", 99, 0, 0))
+        self.write("$RBAD.txt", b(""))
+        self.assertEqual(len(winshell.recycle_bin(self.temppath)), 2)
+
+    def test_query(self):
+        self.write("$IJKL.log", recycle_bin_info(2, u"C:\\Logs\\Old\\app.log", 500, self.deleted_at))
+        self.write("$RJKL.log", b(""))
+        recycle_bin = winshell.recycle_bin(self.temppath)
+        def query(**kwargs):
+            return sorted((item.original_filename(), item.size()) for item in recycle_bin.query(**kwargs))
+
+        self.assertEqual(len(query()), 3)
+        self.assertEqual(query(name_glob="*.LOG"), [(u"C:\\Logs\\Old\\app.log", 500)])
+        self.assertEqual(query(under_dir="c:/logs"), [(u"C:\\Logs\\Old\\app.log", 500)])
+        self.assertEqual(query(under_dir="C:\\Log"), [])
+        self.assertEqual(query(min_size=4), [(u"C:\\Data\\report.txt", 5), (u"C:\\Logs\\Old\\app.log", 500)])
+        self.assertEqual(
+            query(name_glob="report.*", deleted_after=self.deleted_at + datetime.timedelta(hours=1)),
+            [(u"C:\\Data\\report.txt", 3)]
+        )
+        self.assertEqual(
+            query(under_dir="C:\\Data", deleted_before=self.deleted_at + datetime.timedelta(hours=1)),
+            [(u"C:\\Data\\report.txt", 5)]
+        )
+
+    def test_undelete_many(self):
+        restore_to = os.path.join(self.temppath, "Data")
+        os.mkdir(restore_to)
+        self.write("a.txt", b("existing"), restore_to)
+        self.write("$IA1.txt", recycle_bin_info(2, os.path.join(restore_to, "a.txt"), 1, self.deleted_at))
+        self.write("$RA1.txt", b("1"))
+        self.write("$IA2.txt", recycle_bin_info(2, os.path.join(restore_to, "a.txt"), 1, self.deleted_at))
+        self.write("$RA2.txt", b("2"))
+        self.write("$IB1.txt", recycle_bin_info(2, os.path.join(restore_to, "b.txt"), 1, self.deleted_at))
+        self.write("$RB1.txt", b("3"))
+
+        calls = []
+        def move_file(source_paths, target_paths, **kwargs):
+            #
+            # Stand in for the shell by moving each file to its target
+            #
+            calls.append(source_paths)
+            for source_path, target_path in zip(source_paths, target_paths):
+                os.rename(source_path, target_path)
+            return {}
+
+        recycle_bin = winshell.recycle_bin(self.temppath)
+        a1, a2 = sorted(recycle_bin.versions(os.path.join(restore_to, "a.txt")), key=lambda item: item.real_filename())
+        b_filepath = os.path.join(restore_to, "b.txt")
+        winshell.move_file, original_move_file = move_file, winshell.move_file
+        try:
+            restored = recycle_bin.undelete_many([a1, a2, b_filepath])
+        finally:
+            winshell.move_file = original_move_file
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(restored, {
+            a1: os.path.join(restore_to, "a (2).txt"),
+            a2: os.path.join(restore_to, "a (3).txt"),
+            b_filepath: b_filepath,
+        })
+        self.assertEqual(open(os.path.join(restore_to, "a.txt"), "rb").read(), b("existing"))
+        self.assertEqual(open(os.path.join(restore_to, "a (3).txt"), "rb").read(), b("2"))
+        self.assertFalse(recycle_bin.versions(b_filepath))
+        self.assertRaises(winshell.x_not_found_in_recycle_bin, recycle_bin.undelete_many, [b_filepath])
+
+    def test_undelete_many_duplicates(self):
+        restore_to = os.path.join(self.temppath, "Data")
+        os.mkdir(restore_to)
+        b_filepath = os.path.join(restore_to, "b.txt")
+        self.write("$IB1.txt", recycle_bin_info(2, b_filepath, 1, self.deleted_at))
+        self.write("$RB1.txt", b("3"))
+        def move_file(source_paths, target_paths, **kwargs):
+            for source_path, target_path in zip(source_paths, target_paths):
+                os.rename(source_path, target_path)
+            return {}
+
+        recycle_bin = winshell.recycle_bin(self.temppath)
+        item, = recycle_bin.versions(b_filepath)
+        winshell.move_file, original_move_file = move_file, winshell.move_file
+        try:
+            restored = recycle_bin.undelete_many([item, b_filepath])
+        finally:
+            winshell.move_file = original_move_file
+        self.assertEqual(restored, {item: b_filepath, b_filepath: b_filepath})
+        self.assertFalse(os.path.exists(os.path.join(restore_to, "b (2).txt")))
+
+    def test_watch(self):
+        events = winshell.recycle_bin(self.temppath).watch(timeout=0.5, poll_interval=0.05)
+        self.write("$IGHI789.txt", recycle_bin_info(2, u"C:\\Data\\new.txt", 1, self.deleted_at))
+        self.write("$RGHI789.txt", b("1"))
+        os.remove(os.path.join(self.user_bin, "$RABC123.txt"))
+        self.assertEqual(
+            sorted((event.action, event.item.original_filename(), event.item.size()) for event in events),
+            [("added", u"C:\\Data\\new.txt", 1), ("removed", u"C:\\Data\\report.txt", 5)]
+        )
+
+    def test_watch_times_out(self):
+        t0 = time.time()
+        self.assertFalse(list(winshell.recycle_bin(self.temppath).watch(timeout=0.2, poll_interval=0.05)))
+        self.assertTrue(time.time() - t0 < 5)
+
+    def test_undelete_merge(self):
+        project = os.path.join(self.temppath, "Project")
+        os.makedirs(os.path.join(project, "sub"))
+        self.write("a.txt", b("existing"), project)
+        recycled = os.path.join(self.user_bin, "$RPROJ")
+        for dirpath in ("sub", "new"):
+            os.makedirs(os.path.join(recycled, dirpath))
+        self.write("a.txt", b("restored"), recycled)
+        self.write("b.txt", b("b"), os.path.join(recycled, "sub"))
+        self.write("c.txt", b("c"), os.path.join(recycled, "new"))
+        self.write("$IPROJ", recycle_bin_info(2, project, 0, self.deleted_at))
+
+        item, = winshell.recycle_bin(self.temppath).versions(project)
+        moves = []
+        self.assertEqual(item.undelete(merge=True, progress=lambda source, target: moves.append(target)), project)
+        self.assertEqual(
+            sorted(os.path.relpath(target, project) for target in moves),
+            ["a (2).txt", "new", os.path.join("sub", "b.txt")]
+        )
+        self.assertEqual(open(os.path.join(project, "a.txt"), "rb").read(), b("existing"))
+        self.assertEqual(open(os.path.join(project, "a (2).txt"), "rb").read(), b("restored"))
+        self.assertTrue(os.path.exists(os.path.join(project, "new", "c.txt")))
+        self.assertFalse(os.path.exists(recycled))
+        self.assertFalse(os.path.exists(os.path.join(self.user_bin, "$IPROJ")))
+
+    def test_undelete_folder_progress(self):
+        project = os.path.join(self.temppath, "Project")
+        recycled = os.path.join(self.user_bin, "$RPROJ")
+        os.makedirs(os.path.join(recycled, "sub"))
+        os.makedirs(os.path.join(recycled, "empty"))
+        self.write("a.txt", b("a"), recycled)
+        self.write("b.txt", b("b"), os.path.join(recycled, "sub"))
+        self.write("$IPROJ", recycle_bin_info(2, project, 2, self.deleted_at))
+
+        item, = winshell.recycle_bin(self.temppath).versions(project)
+        moves = []
+        self.assertEqual(item.undelete(progress=lambda source, target: moves.append(target)), project)
+        self.assertEqual(
+            sorted(os.path.relpath(target, project) for target in moves),
+            ["a.txt", os.path.join("sub", "b.txt")]
+        )
+        self.assertEqual(open(os.path.join(project, "sub", "b.txt"), "rb").read(), b("b"))
+        self.assertTrue(os.path.isdir(os.path.join(project, "empty")))
+        self.assertFalse(os.path.exists(recycled))
+        self.assertFalse(os.path.exists(os.path.join(self.user_bin, "$IPROJ")))
+
+    def test_undelete_renamed(self):
+        restore_to = os.path.join(self.temppath, "Data")
+        os.mkdir(restore_to)
+        self.write("report.txt", b("existing"), restore_to)
+        def move_file(source_path, target_path, **kwargs):
+            os.rename(source_path, target_path)
+            return {}
+
+        recycle_bin = winshell.recycle_bin(self.temppath)
+        item = max(recycle_bin.versions(u"C:\\Data\\report.txt"), key=lambda item: item.size())
+        winshell.move_file, original_move_file = move_file, winshell.move_file
+        try:
+            restored = item.undelete(target=os.path.join(restore_to, "report.txt"))
+        finally:
+            winshell.move_file = original_move_file
+        self.assertEqual(restored, os.path.join(restore_to, "report (2).txt"))
+        self.assertEqual(open(restored, "rb").read(), b("12345"))
+
+    def test_drive(self):
+        for drive in ("D", "d:", "D:\\"):
+            self.assertEqualCI(winshell.recycle_bin(drive=drive).root, "D:\\")
+
+    def test_parallel(self):
+        other_root = os.path.join(self.temppath, "other")
+        other_bin = os.path.join(other_root, "$Recycle.Bin", "S-1-5-21-1-2-3-1001")
+        os.makedirs(other_bin)
+        self.write("$IXYZ.txt", recycle_bin_info(2, u"D:\\x.txt", 1, self.deleted_at), other_bin)
+        self.write("$RXYZ.txt", b("x"), other_bin)
+        missing_root = os.path.join(self.temppath, "missing")
+
+        recycle_bin = winshell.ParallelRecycleBin([self.temppath, other_root, missing_root])
+        self.assertEqual(
+            sorted(item.original_filename() for item in recycle_bin),
+            [u"C:\\Data\\report.txt", u"C:\\Data\\report.txt", u"D:\\x.txt"]
+        )
+        self.assertEqual(recycle_bin.counts, {self.temppath: 2, other_root: 1, missing_root: 0})
+        self.assertEqual(recycle_bin.errors, {})
+        self.assertEqual(recycle_bin.timed_out, set())
+
+    def test_parallel_timeout(self):
+        slow_root = os.path.join(self.temppath, "slow")
+        failing_root = os.path.join(self.temppath, "failing")
+        original_recycle_bin_folders = winshell._recycle_bin_folders
+        def recycle_bin_folders(root):
+            if root == slow_root:
+                time.sleep(2)
+            elif root == failing_root:
+                raise RuntimeError(root)
+            return original_recycle_bin_folders(root)
+
+        recycle_bin = winshell.ParallelRecycleBin([self.temppath, slow_root, failing_root], timeout=0.5)
+        winshell._recycle_bin_folders = recycle_bin_folders
+        try:
+            self.assertEqual(len(list(recycle_bin)), 2)
+        finally:
+            winshell._recycle_bin_folders = original_recycle_bin_folders
+        self.assertEqual(recycle_bin.counts, {self.temppath: 2, slow_root: 0, failing_root: 0})
+        self.assertEqual(list(recycle_bin.errors), [failing_root])
+        self.assertEqual(recycle_bin.timed_out, set([slow_root]))
+
+    def test_parallel_timeout_per_volume(self):
+        #
+        # A consumer slower than the timeout doesn't make volumes which were
+        # scanned in time count as timed out
+        #
+        recycle_bin = winshell.ParallelRecycleBin([self.temppath], timeout=0.2)
+        for item in recycle_bin:
+            time.sleep(0.3)
+        self.assertEqual(recycle_bin.counts, {self.temppath: 2})
+        self.assertEqual(recycle_bin.timed_out, set())
+
+    def test_parallel_signature(self):
+        recycle_bin = winshell.ParallelRecycleBin([self.temppath])
+        signature = recycle_bin._signature()
+        self.assertEqual(signature, [winshell.OfflineRecycleBin(self.temppath)._signature()])
+        self.write("$IGHI789.txt", recycle_bin_info(2, u"C:\\Data\\other.txt", 1, self.deleted_at))
+        self.assertNotEqual(recycle_bin._signature(), signature)
+
+    def test_is_volume_root(self):
+        if os.name == "nt":
+            self.assertTrue(winshell._is_volume_root("C:\\"))
+            self.assertTrue(winshell._is_volume_root("\\\\server\\share\\"))
+        self.assertFalse(winshell._is_volume_root(self.temppath))
+
+    def test_purge_dry_run(self):
+        recycle_bin = winshell.recycle_bin(self.temppath)
+        def purged(**kwargs):
+            items, n_bytes = recycle_bin.purge(dry_run=True, **kwargs)
+            return [item.size() for item in items], n_bytes
+
+        self.assertEqual(purged(), ([], 0))
+        self.assertEqual(purged(older_than=self.deleted_at + datetime.timedelta(hours=1)), ([5], 5))
+        self.assertEqual(purged(older_than=datetime.timedelta(days=1)), ([5, 3], 8))
+        self.assertEqual(purged(max_total_bytes=4), ([5], 5))
+        self.assertEqual(purged(max_total_bytes=2), ([5, 3], 8))
+        self.assertEqual(purged(per_volume_budget=5, max_total_bytes=8), ([5], 5))
+        self.assertEqual(len(recycle_bin), 2)
+
+    def test_purge(self):
+        recycle_bin = winshell.recycle_bin(self.temppath)
+        items, n_bytes = recycle_bin.purge(max_total_bytes=4)
+        self.assertEqual(n_bytes, 5)
+        self.assertEqual(
+            sorted(os.listdir(self.user_bin)),
+            ["$IDEF456.txt", "$IORPHAN.txt", "$RDEF456.txt"]
+        )
+        self.assertEqual([item.size() for item in recycle_bin], [3])
+
+    def test_purge_folder(self):
+        self.write("$IFOLDER", recycle_bin_info(2, u"C:\\Data\\folder", 7, self.deleted_at - datetime.timedelta(days=1)))
+        os.makedirs(os.path.join(self.user_bin, "$RFOLDER", "sub"))
+        self.write(os.path.join("$RFOLDER", "sub", "a.txt"), b("1234567"))
+        recycle_bin = winshell.recycle_bin(self.temppath)
+        items, n_bytes = recycle_bin.purge(max_total_bytes=8)
+        self.assertEqual([item.original_filename() for item in items], [u"C:\\Data\\folder"])
+        self.assertEqual(n_bytes, 7)
+        self.assertFalse(os.path.exists(os.path.join(self.user_bin, "$RFOLDER")))
+
+    def test_shell_item_folder_size(self):
+        real_filename = os.path.join(self.user_bin, "$RFOLDER")
+        class RecycledFolder(winshell.ShellRecycledItem):
+            def real_filename(self):
+                return real_filename
+        os.makedirs(os.path.join(real_filename, "sub"))
+        self.write(os.path.join("$RFOLDER", "a.txt"), b("12"))
+        self.write(os.path.join("$RFOLDER", "sub", "b.txt"), b("345"))
+        self.assertEqual(RecycledFolder(None, None).size(), 5)
+        self.write("$IFOLDER", recycle_bin_info(2, u"C:\\Data\\folder", 4096, self.deleted_at))
+        self.assertEqual(RecycledFolder(None, None).size(), 4096)
+
+    def test_stats(self):
+        recycle_bin = winshell.recycle_bin(self.temppath)
+        stats = recycle_bin.stats()
+        self.assertEqual((stats.n_items, stats.n_bytes), (2, 8))
+        self.assertEqual(stats.by_volume, {self.temppath: (2, 8)})
+        self.assertEqual(stats.by_user, {"S-1-5-21-1-2-3-1001": (2, 8)})
+        self.assertEqual(stats.ages[-1], (None, 2))
+        self.assertEqual(sum(n for _, n in stats.ages), 2)
+
+        self.write("$IGHI789.txt", recycle_bin_info(2, u"C:\\Data\\new.txt", 10, datetime.datetime.now()))
+        self.write("$RGHI789.txt", b("1"))
+        os.remove(os.path.join(self.user_bin, "$RABC123.txt"))
+        self.assertEqual(recycle_bin.stats(max_age=3600).n_items, 2)
+        stats = recycle_bin.stats(max_age=0)
+        self.assertEqual((stats.n_items, stats.n_bytes), (2, 13))
+        self.assertEqual(stats.ages[0], (datetime.timedelta(hours=1), 1))
+        self.assertEqual(stats.ages[-1], (None, 1))
+
+    def test_empty(self):
+        recycle_bin = winshell.recycle_bin(self.temppath)
+        recycle_bin.empty()
+        self.assertFalse(list(recycle_bin))
+        self.assertEqual(os.listdir(self.user_bin), ["$IORPHAN.txt"])
+
+@needs_shell
 class TestRecycler(test_base.TestCase):
 
     #
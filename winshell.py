@@ -26,17 +26,61 @@ http://www.opensource.org/licenses/mit-license.php
 from __winshell_version__ import __VERSION__
 
 import os, sys
+import bisect
+import codecs
+import collections
+import csv
 import datetime
+import fnmatch
+import hashlib
+import heapq
+import io
+import json
+import mmap
+import multiprocessing
+import ntpath
+import operator
+import shutil
+import sqlite3
+import struct
 import tempfile
+import threading
+import time
 
-import win32con
-from win32com import storagecon
-from win32com.shell import shell, shellcon
-import win32api
-import win32clipboard
-import win32timezone
-import pythoncom
-import pywintypes
+class _Constants(object):
+    """Stand in for a pywin32 constants module"""
+
+    def __init__(self, **constants):
+        self.__dict__.update(constants)
+
+try:
+    import win32con
+    from win32com import storagecon
+    from win32com.shell import shell, shellcon
+    import win32api
+    import win32clipboard
+    import win32event
+    import win32file
+    import win32timezone
+    import pythoncom
+    import pywintypes
+except ImportError:
+    #
+    # Without pywin32 -- typically away from Windows -- only those parts
+    # which read and write files directly can be used: the .lnk parser and
+    # the "lnk" shortcut backend, the offline recycle bins and the "python"
+    # file operation backend. The few constants they need are given their
+    # Windows values here.
+    #
+    win32con = _Constants(
+        SW_SHOWNORMAL=1, SW_SHOWMAXIMIZED=3, SW_SHOWMINNOACTIVE=7,
+    )
+    shellcon = _Constants(
+        FO_MOVE=1, FO_COPY=2, FO_DELETE=3, FO_RENAME=4,
+        SHGDN_NORMAL=0, SHGDN_INFOLDER=1, SHGDN_FORPARSING=0x8000,
+    )
+    storagecon = shell = win32api = win32clipboard = win32event = None
+    win32file = win32timezone = pythoncom = pywintypes = None
 
 #
 # version compaibility workaround
@@ -49,12 +93,27 @@ try:
     unicode
 except NameError:
     unicode = str
+try:
+    from concurrent import futures
+except ImportError:
+    futures = None
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
 
 #
 # Constants & calculated types
 #
-_desktop_folder = shell.SHGetDesktopFolder()
-PyIShellFolder = type(_desktop_folder)
+if shell is None:
+    _desktop_folder = PyIShellFolder = None
+else:
+    _desktop_folder = shell.SHGetDesktopFolder()
+    PyIShellFolder = type(_desktop_folder)
 undelete_temp = tempfile.mkdtemp()
 
 #
@@ -69,6 +128,9 @@ class x_recycle_bin(x_winshell):
 class x_not_found_in_recycle_bin(x_recycle_bin):
     pass
 
+class x_shortcut(x_winshell):
+    pass
+
 
 #
 # Stolen from winsys
@@ -97,12 +159,115 @@ def dumped_dict(d, level, indent=2):
 def dumped_flags(f, lookups, level, indent=2):
     return dumped("\n".join(lookups.names_from_value(f)) or "None", level, indent)
 
+class _DirEntry(object):
+    """Just enough of os.DirEntry for versions of Python without os.scandir"""
+
+    def __init__(self, dirpath, name):
+        self.name = name
+        self.path = os.path.join(dirpath, name)
+
+    def is_dir(self, follow_symlinks=True):
+        if follow_symlinks:
+            return os.path.isdir(self.path)
+        else:
+            return os.path.isdir(self.path) and not os.path.islink(self.path)
+
+    def stat(self, follow_symlinks=True):
+        if follow_symlinks:
+            return os.stat(self.path)
+        else:
+            return os.lstat(self.path)
+
+def _scandir(dirpath):
+    if hasattr(os, "scandir"):
+        return os.scandir(dirpath)
+    else:
+        return [_DirEntry(dirpath, name) for name in os.listdir(dirpath)]
+
+def _walk_files(root, extension):
+    """Yield a directory entry for each file under root whose name has
+    extension, listing each directory exactly once.
+    """
+    extension = extension.lower()
+    dirpaths = [root]
+    while dirpaths:
+        dirpath = dirpaths.pop()
+        try:
+            entries = list(_scandir(dirpath))
+        except EnvironmentError:
+            continue
+        for entry in entries:
+            if entry.is_dir():
+                dirpaths.append(entry.path)
+            elif entry.name.lower().endswith(extension):
+                yield entry
+
+def _write_atomically(filepath, data):
+    """Write data to a temporary file alongside filepath and then move it
+    into place, so that filepath is never seen half-written.
+    """
+    handle, temp_filepath = tempfile.mkstemp(
+        prefix="~", suffix=".tmp", dir=os.path.dirname(os.path.abspath(filepath))
+    )
+    try:
+        try:
+            os.write(handle, data)
+        finally:
+            os.close(handle)
+        if hasattr(os, "replace"):
+            os.replace(temp_filepath, filepath)
+        else:
+            win32api.MoveFileEx(temp_filepath, filepath, win32con.MOVEFILE_REPLACE_EXISTING)
+    except:
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        raise
+
+def _default_workers():
+    return min(32, multiprocessing.cpu_count() + 4)
+
+def _parallel_map(function, iterable, workers=None):
+    """Yield function(item) for each item in iterable, spread across a
+    pool of worker threads and in whatever order they finish. Only a
+    couple of items per worker are in flight at any one time, so the
+    iterable can be as long as it likes.
+    """
+    workers = workers or _default_workers()
+    if futures is None or workers == 1:
+        for item in iterable:
+            yield function(item)
+        return
+
+    executor = futures.ThreadPoolExecutor(workers)
+    pending = set()
+    try:
+        for item in iterable:
+            pending.add(executor.submit(function, item))
+            if len(pending) >= 2 * workers:
+                done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in futures.as_completed(pending):
+            yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
 def datetime_from_pytime(pytime):
     if isinstance(pytime, datetime.datetime):
         return pytime
     else:
         return datetime.datetime.fromtimestamp(int(pytime))
 
+#
+# A FILETIME counts 100ns intervals since 1st January 1601
+#
+_FILETIME_UNIX_EPOCH = 116444736000000000
+
+def _datetime_from_filetime(filetime):
+    return datetime.datetime.fromtimestamp((filetime - _FILETIME_UNIX_EPOCH) / 10000000.0)
+
 #
 # Given a namespace(eg a module) and a pattern(eg "FMTID_%s")
 # allow a value from within that space to be specified by name
@@ -121,6 +286,8 @@ def from_constants(namespace, pattern, factory):
 
 class WinshellObject(object):
 
+    __slots__ = ()
+
     def __str__(self):
         return self.as_string()
 
@@ -203,13 +370,92 @@ def sendto():
     "What folder holds the SendTo shortcuts(from the Context Menu)?"
     return get_path(shellcon.CSIDL_SENDTO)
 
+class FileOperationResult(dict):
+    """The outcome of a file operation: a dictionary mapping any files
+    which were renamed on collision to their new names, together with
+    counts and timings. It's kept up to date as the operation goes, and
+    passed as it stands to any `progress` callback after each item.
+    """
+
+    def __init__(self, operation=None, progress=None):
+        dict.__init__(self)
+        self.operation = operation
+        self.n_files = 0
+        self.n_bytes = 0
+        self.n_aborted = 0
+        self.elapsed = 0.0
+        self._progress = progress
+        self._started = time.time()
+        self._n_items = 0
+        self._n_done = 0
+
+    def __repr__(self):
+        return "<%s: %d files, %d bytes in %.2fs>" % (
+            self.__class__.__name__, self.n_files, self.n_bytes, self.elapsed
+        )
+
+    @property
+    def n_renamed(self):
+        """How many items were renamed on collision"""
+        return len(self)
+
+    @property
+    def throughput(self):
+        """Bytes per second"""
+        if self.elapsed:
+            return self.n_bytes / self.elapsed
+        else:
+            return 0.0
+
+    def _expect(self, n_items):
+        self._n_items += n_items
+
+    def _done(self, source, target, n_files, n_bytes):
+        self._n_done += 1
+        self.n_files += n_files
+        self.n_bytes += n_bytes
+        self.elapsed = time.time() - self._started
+        if self._progress:
+            self._progress(source, target, self)
+
+    def _finish(self, failed=False):
+        if failed:
+            self.n_aborted = max(0, self._n_items - self._n_done)
+        self.elapsed = time.time() - self._started
+
+    def _add(self, other):
+        """Fold the mapping and counts of another operation's result into this one"""
+        self.update(other)
+        self.n_files += getattr(other, "n_files", 0)
+        self.n_bytes += getattr(other, "n_bytes", 0)
+        self.n_aborted += getattr(other, "n_aborted", 0)
+        self.elapsed += getattr(other, "elapsed", 0.0)
+
+def _tree_totals(path):
+    """Return the number of files and of bytes in a file or in all the
+    files under a folder, listing each folder once. On Windows the listing
+    carries each file's size, so no file is opened or stat-ed on its own.
+    """
+    if os.path.islink(path) or not os.path.isdir(path):
+        return 1, os.lstat(path).st_size
+    n_files = n_bytes = 0
+    dirpaths = [path]
+    while dirpaths:
+        for entry in _scandir(dirpaths.pop()):
+            if entry.is_dir(follow_symlinks=False):
+                dirpaths.append(entry.path)
+            else:
+                n_files += 1
+                n_bytes += entry.stat(follow_symlinks=False).st_size
+    return n_files, n_bytes
+
 #
 # Internally abstracted function to handle one of several shell-based file manipulation
 # routines. Not all the possible parameters are covered which might be passed to the
 # underlying SHFileOperation API call, but only those which seemed useful to me at
 # the time.
 #
-def _file_operation(
+def _shell_file_operation(
     operation,
     source_path,
     target_path=None,
@@ -218,8 +464,25 @@ def _file_operation(
     rename_on_collision=True,
     silent=False,
     extra_flags=0,
-    hWnd=None
+    hWnd=None,
+    result=None
 ):
+    if result is None:
+        result = FileOperationResult(operation)
+    #
+    # The shell says nothing about what it has done until it's finished,
+    # so what it's about to do is measured first, in one listing of each
+    # source: the sources may well be gone by the time it's finished.
+    #
+    try:
+        items = [
+            (source, target) + _tree_totals(source)
+            for source, target in _file_operation_pairs(source_path, target_path)
+        ]
+    except (EnvironmentError, x_winshell):
+        items = []
+    result._expect(len(items))
+
     flags = extra_flags
     #
     # At present the Python wrapper around SHFileOperation doesn't
@@ -253,15 +516,335 @@ def _file_operation(
         flags |= shellcon.FOF_SILENT
     flags |= extra_flags
 
-    result, n_aborted, mapping = shell.SHFileOperation(
+    error, n_aborted, mapping = shell.SHFileOperation(
        (hWnd or 0, operation, source_path, target_path, flags, None, None)
     )
-    if result != 0:
-        raise x_winshell(result)
+    if error != 0:
+        raise x_winshell(error)
     elif n_aborted:
         raise x_winshell("%d operations were aborted by the user" % n_aborted)
 
-    return dict(mapping)
+    result.update(mapping)
+    for source, target, n_files, n_bytes in items:
+        if target is not None:
+            target = result.get(os.path.abspath(target), target)
+        result._done(source, target, n_files, n_bytes)
+    return result
+
+#
+# The same operations can be carried out in Python, without the shell, for
+# unattended jobs which have no use for its user interface and for platforms
+# where it isn't available. This follows SHFileOperation as closely as it
+# can, but can't send files to the Recycle Bin or ask the user what to do
+# about a collision.
+#
+def _candidate_filenames(filename, copy=False):
+    """Yield filename and then, in the manner of the shell's rename-on-collision,
+    "name (2).ext", "name (3).ext" and so on -- or, for a copy, "name - Copy.ext",
+    "name - Copy (2).ext" and so on.
+    """
+    name, ext = os.path.splitext(filename)
+    yield filename
+    if copy:
+        name += " - Copy"
+        yield name + ext
+    n = 2
+    while True:
+        yield "%s (%d)%s" % (name, n, ext)
+        n += 1
+
+def _unused_filepath(dirpath, filename, taken=None, copy=False):
+    """Return a filepath in dirpath based on filename but whose name,
+    in the manner of the shell's rename-on-collision, is not in the set
+    of lowercase names `taken`, adding the name chosen to that set. If
+    no set is given, the name chosen is simply one not already in use.
+    """
+    for candidate in _candidate_filenames(filename, copy):
+        if taken is None:
+            if not os.path.exists(os.path.join(dirpath, candidate)):
+                break
+        elif candidate.lower() not in taken:
+            taken.add(candidate.lower())
+            break
+    return os.path.join(dirpath, candidate)
+
+def _expand_wildcard(source_path):
+    """Return the paths matching a wildcard source, or a list of just the
+    source if it has no wildcard.
+    """
+    dirpath, pattern = os.path.split(source_path)
+    if "*" not in pattern and "?" not in pattern:
+        if not os.path.lexists(source_path):
+            raise x_winshell("%s does not exist" % source_path)
+        return [source_path]
+    if pattern == "*.*":
+        pattern = "*"
+    return [os.path.join(dirpath, name) for name in sorted(os.listdir(dirpath)) if fnmatch.fnmatch(name, pattern)]
+
+def _file_operation_pairs(source_paths, target_paths):
+    """Return a list of (source, target) pairs from the sources and targets
+    passed to a file operation. As for SHFileOperation, a list of targets
+    gives the target of each source in turn; otherwise, all the sources go
+    into the single target folder unless there is just one source, without
+    a wildcard, and the target isn't an existing folder, in which case that
+    is the source's new name.
+    """
+    if isinstance(source_paths, basestring):
+        source_paths = [source_paths]
+    if target_paths is None:
+        return [(source, None) for source_path in source_paths for source in _expand_wildcard(source_path)]
+    if not isinstance(target_paths, basestring):
+        return list(zip(source_paths, target_paths))
+
+    sources = []
+    has_wildcard = False
+    for source_path in source_paths:
+        expanded = _expand_wildcard(source_path)
+        has_wildcard = has_wildcard or expanded != [source_path]
+        sources.extend(expanded)
+    if len(source_paths) == 1 and not has_wildcard and not os.path.isdir(target_paths):
+        return [(sources[0], target_paths)]
+    return [(source, os.path.join(target_paths, os.path.basename(source))) for source in sources]
+
+#
+# How much of a file to copy at a time where the copy isn't left entirely
+# to the system
+#
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+def _copy_file(source, target, chunk_size=COPY_CHUNK_SIZE):
+    """Copy a file's contents and metadata, letting the system copy the
+    data directly where it can: CopyFile on Windows, which can hand the copy
+    off to the storage or, over SMB, to the server; and copy_file_range,
+    `chunk_size` bytes at a time, elsewhere. CopyFile chooses its own
+    buffers, so `chunk_size` is only used off Windows.
+    """
+    if sys.platform == "win32":
+        try:
+            win32file.CopyFile(source, target, False)
+        except pywintypes.error:
+            error = sys.exc_info()[1]
+            raise EnvironmentError(error.winerror, error.strerror, source)
+        return
+    if hasattr(os, "copy_file_range"):
+        fsource = open(source, "rb")
+        try:
+            ftarget = open(target, "wb")
+            try:
+                try:
+                    while os.copy_file_range(fsource.fileno(), ftarget.fileno(), chunk_size):
+                        pass
+                    copied = True
+                except OSError:
+                    copied = False
+            finally:
+                ftarget.close()
+        finally:
+            fsource.close()
+        if copied:
+            shutil.copystat(source, target)
+            return
+    fsource = open(source, "rb")
+    try:
+        ftarget = open(target, "wb")
+        try:
+            shutil.copyfileobj(fsource, ftarget, chunk_size)
+        finally:
+            ftarget.close()
+    finally:
+        fsource.close()
+    shutil.copystat(source, target)
+
+def _copy_over(source, target):
+    """Copy a file or folder to target, merging a folder into any folder
+    already there and overwriting any files in the way. Return the number
+    of files and of bytes copied.
+    """
+    if os.path.isdir(source):
+        if os.path.lexists(target) and not os.path.isdir(target):
+            os.remove(target)
+        if not os.path.isdir(target):
+            os.makedirs(target)
+        n_files = n_bytes = 0
+        for name in os.listdir(source):
+            n, size = _copy_over(os.path.join(source, name), os.path.join(target, name))
+            n_files += n
+            n_bytes += size
+        shutil.copystat(source, target)
+        return n_files, n_bytes
+    else:
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        n_bytes = os.stat(source).st_size
+        _copy_file(source, target)
+        return 1, n_bytes
+
+def _move_over(source, target):
+    """Move a file or folder to target, merging a folder into any folder
+    already there and overwriting any files in the way. Return the number
+    of files and of bytes moved.
+    """
+    if os.path.isdir(source) and os.path.isdir(target):
+        n_files = n_bytes = 0
+        for name in os.listdir(source):
+            n, size = _move_over(os.path.join(source, name), os.path.join(target, name))
+            n_files += n
+            n_bytes += size
+        os.rmdir(source)
+        return n_files, n_bytes
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    elif os.path.lexists(target):
+        os.remove(target)
+    #
+    # A folder renamed in one piece is counted as the shell backend counts
+    # it, by listing it first, so both backends report the same figures
+    #
+    n_files, n_bytes = _tree_totals(source)
+    try:
+        os.rename(source, target)
+    except OSError:
+        shutil.move(source, target)
+    return n_files, n_bytes
+
+def _delete_over(source):
+    """Delete a file or a folder and everything in it, returning the number
+    of files and of bytes deleted.
+    """
+    if os.path.islink(source) or not os.path.isdir(source):
+        n_bytes = os.lstat(source).st_size
+        os.remove(source)
+        return 1, n_bytes
+    n_files = n_bytes = 0
+    for dirpath, dirnames, filenames in os.walk(source, topdown=False):
+        for dirname in dirnames:
+            subdirpath = os.path.join(dirpath, dirname)
+            if os.path.islink(subdirpath):
+                os.remove(subdirpath)
+            else:
+                os.rmdir(subdirpath)
+        for filename in filenames:
+            filepath = os.path.join(dirpath, filename)
+            n_files += 1
+            n_bytes += os.lstat(filepath).st_size
+            os.remove(filepath)
+    os.rmdir(source)
+    return n_files, n_bytes
+
+def _collision_target(source, target, copy, no_confirm, rename_on_collision, mapping):
+    """Return where source should go given that it's meant to go to target:
+    if something's already there, a new name is found and recorded in mapping
+    or, if it's to be overwritten, target as it stands.
+    """
+    if os.path.lexists(target):
+        if rename_on_collision:
+            renamed = _unused_filepath(*os.path.split(target), copy=copy)
+            mapping[target] = renamed
+            return renamed
+        elif not no_confirm:
+            raise x_winshell("%s already exists" % target)
+        elif os.path.normcase(source) == os.path.normcase(target):
+            raise x_winshell("Can't copy or move %s onto itself" % source)
+    return target
+
+def _python_file_operation(
+    operation,
+    source_path,
+    target_path=None,
+    allow_undo=True,
+    no_confirm=False,
+    rename_on_collision=True,
+    silent=False,
+    extra_flags=0,
+    hWnd=None,
+    result=None
+):
+    if operation == shellcon.FO_DELETE and allow_undo:
+        raise x_winshell("Files can only be sent to the Recycle Bin through the shell")
+
+    if result is None:
+        result = FileOperationResult(operation)
+    try:
+        pairs = _file_operation_pairs(source_path, target_path)
+        result._expect(len(pairs))
+        for source, target in pairs:
+            source = os.path.abspath(source)
+            if operation == shellcon.FO_DELETE:
+                result._done(source, None, *_delete_over(source))
+                continue
+
+            target = os.path.abspath(target)
+            if operation == shellcon.FO_RENAME and os.path.dirname(target) != os.path.dirname(source):
+                raise x_winshell("Can't rename %s to another folder" % source)
+            target = _collision_target(
+                source, target, operation == shellcon.FO_COPY, no_confirm, rename_on_collision, result
+            )
+
+            target_dirpath = os.path.dirname(target)
+            if not os.path.isdir(target_dirpath):
+                os.makedirs(target_dirpath)
+            if operation == shellcon.FO_COPY:
+                n_files, n_bytes = _copy_over(source, target)
+            else:
+                n_files, n_bytes = _move_over(source, target)
+            result._done(source, target, n_files, n_bytes)
+    except EnvironmentError:
+        raise x_winshell(sys.exc_info()[1])
+
+    return result
+
+file_operation_backends = {
+    "shell" : _shell_file_operation,
+    "python" : _python_file_operation,
+}
+
+#
+# The backend used by the file operation functions when none is passed
+#
+file_operation_backend = "python" if shell is None else "shell"
+
+def _file_operation(
+    operation,
+    source_path,
+    target_path=None,
+    allow_undo=True,
+    no_confirm=False,
+    rename_on_collision=True,
+    silent=False,
+    extra_flags=0,
+    hWnd=None,
+    backend=None,
+    progress=None
+):
+    backend = backend or file_operation_backend
+    try:
+        function = file_operation_backends[backend]
+    except KeyError:
+        raise x_winshell("No such file operation backend %s" % backend)
+    #
+    # Every backend reports what it has done through the same result object,
+    # which does the counting and timing and calls any progress callback
+    #
+    result = FileOperationResult(operation, progress)
+    try:
+        function(
+            operation,
+            source_path,
+            target_path,
+            allow_undo,
+            no_confirm,
+            rename_on_collision,
+            silent,
+            extra_flags,
+            hWnd,
+            result
+        )
+    except x_winshell:
+        result._finish(failed=True)
+        sys.exc_info()[1].result = result
+        raise
+    result._finish()
+    return result
 
 def copy_file(
     source_path,
@@ -271,7 +854,9 @@ def copy_file(
     rename_on_collision=True,
     silent=False,
     extra_flags=0,
-    hWnd=None
+    hWnd=None,
+    backend=None,
+    progress=None
 ):
     """Perform a shell-based file copy. Copying in
     this way allows the possibility of undo, auto-renaming,
@@ -280,6 +865,9 @@ def copy_file(
     The default options allow for undo, don't automatically
     clobber on a name clash, automatically rename on collision
     and display the animation.
+
+    Returns a :class:`FileOperationResult`. `progress`, if given, is called
+    with the source & target of each item as it's done and the result so far.
     """
     return _file_operation(
         shellcon.FO_COPY,
@@ -290,7 +878,9 @@ def copy_file(
         rename_on_collision,
         silent,
         extra_flags,
-        hWnd
+        hWnd,
+        backend,
+        progress
     )
 
 def move_file(
@@ -301,7 +891,9 @@ def move_file(
     rename_on_collision=True,
     silent=False,
     extra_flags=0,
-    hWnd=None
+    hWnd=None,
+    backend=None,
+    progress=None
 ):
     """Perform a shell-based file move. Moving in
     this way allows the possibility of undo, auto-renaming,
@@ -310,6 +902,9 @@ def move_file(
     The default options allow for undo, don't automatically
     clobber on a name clash, automatically rename on collision
     and display the animation.
+
+    Returns a :class:`FileOperationResult`. `progress`, if given, is called
+    with the source & target of each item as it's done and the result so far.
     """
     return _file_operation(
         shellcon.FO_MOVE,
@@ -320,7 +915,9 @@ def move_file(
         rename_on_collision,
         silent,
         extra_flags,
-        hWnd
+        hWnd,
+        backend,
+        progress
     )
 
 def rename_file(
@@ -331,7 +928,9 @@ def rename_file(
     rename_on_collision=True,
     silent=False,
     extra_flags=0,
-    hWnd=None
+    hWnd=None,
+    backend=None,
+    progress=None
 ):
     """Perform a shell-based file rename. Renaming in
     this way allows the possibility of undo, auto-renaming,
@@ -340,6 +939,9 @@ def rename_file(
     The default options allow for undo, don't automatically
     clobber on a name clash, automatically rename on collision
     and display the animation.
+
+    Returns a :class:`FileOperationResult`. `progress`, if given, is called
+    with the source & target of each item as it's done and the result so far.
     """
     return _file_operation(
         shellcon.FO_RENAME,
@@ -350,7 +952,9 @@ def rename_file(
         rename_on_collision,
         silent,
         extra_flags,
-        hWnd
+        hWnd,
+        backend,
+        progress
     )
 
 def delete_file(
@@ -359,7 +963,9 @@ def delete_file(
     no_confirm=False,
     silent=False,
     extra_flags=0,
-    hWnd=None
+    hWnd=None,
+    backend=None,
+    progress=None
 ):
     """Perform a shell-based file delete. Deleting in
     this way uses the system recycle bin, allows the
@@ -368,6 +974,10 @@ def delete_file(
 
     The default options allow for undo, don't automatically
     clobber on a name clash and display the animation.
+
+    Returns a :class:`FileOperationResult`. `progress`, if given, is called
+    with the source (and a target of None) of each item as it's done and
+    the result so far.
     """
     return _file_operation(
         shellcon.FO_DELETE,
@@ -378,18 +988,1121 @@ def delete_file(
         False,
         silent,
         extra_flags,
-        hWnd
+        hWnd,
+        backend,
+        progress
     )
 
-class Shortcut(WinshellObject):
+def _copy_tree(source_path, target_path, no_confirm, rename_on_collision, workers, chunk_size, result):
+    #
+    # Lay out the target folders first, gathering up the files as we go,
+    # and then copy the files biggest first so that the long copies aren't
+    # left running on their own at the end.
+    #
+    files = []
+    folders = []
+    links = []
+    for source, target in _file_operation_pairs(source_path, target_path):
+        source = os.path.abspath(source)
+        target = _collision_target(source, os.path.abspath(target), True, no_confirm, rename_on_collision, result)
+        if not os.path.isdir(source):
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            files.append((os.path.getsize(source), source, target))
+            continue
+        #
+        # A folder which is a link is copied as a tree, as the shell would
+        # copy it, unless it leads back to one of the folders it's in, when
+        # copying it would never end and it's copied as a link instead
+        #
+        real_ancestors = {source: frozenset([os.path.realpath(source)])}
+        for dirpath, dirnames, filenames in os.walk(source, followlinks=True):
+            relpath = os.path.relpath(dirpath, source)
+            target_dirpath = target if relpath == os.curdir else os.path.join(target, relpath)
+            if os.path.lexists(target_dirpath) and not os.path.isdir(target_dirpath):
+                os.remove(target_dirpath)
+            if not os.path.isdir(target_dirpath):
+                os.makedirs(target_dirpath)
+            folders.append((dirpath, target_dirpath))
+            ancestors = real_ancestors.pop(dirpath)
+            for dirname in list(dirnames):
+                subdirpath = os.path.join(dirpath, dirname)
+                real_subdirpath = os.path.realpath(subdirpath)
+                if real_subdirpath in ancestors:
+                    dirnames.remove(dirname)
+                    links.append((subdirpath, os.path.join(target_dirpath, dirname)))
+                else:
+                    real_ancestors[subdirpath] = ancestors | frozenset([real_subdirpath])
+            for filename in filenames:
+                filepath = os.path.join(dirpath, filename)
+                files.append((os.path.getsize(filepath), filepath, os.path.join(target_dirpath, filename)))
+    files.sort(key=operator.itemgetter(0), reverse=True)
+    result._expect(len(files))
+
+    def copy_one(item):
+        n_bytes, source, target = item
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        _copy_file(source, target, chunk_size)
+        return item
+
+    for n_bytes, source, target in _parallel_map(copy_one, files, workers):
+        result._done(source, target, 1, n_bytes)
+    for source, target in links:
+        if os.path.lexists(target):
+            if os.path.isdir(target) and not os.path.islink(target):
+                shutil.rmtree(target)
+            else:
+                os.remove(target)
+        if sys.platform == "win32":
+            os.symlink(os.readlink(source), target, True)
+        else:
+            os.symlink(os.readlink(source), target)
+    #
+    # Copying the files in has changed the folders' timestamps, so set them
+    # afterwards, innermost first
+    #
+    for source, target in reversed(folders):
+        shutil.copystat(source, target)
 
-    show_states = {
-        "normal" : win32con.SW_SHOWNORMAL,
-        "max" : win32con.SW_SHOWMAXIMIZED,
-        "min" : win32con.SW_SHOWMINNOACTIVE
+def copy_tree(
+    source_path,
+    target_path,
+    no_confirm=False,
+    rename_on_collision=True,
+    workers=None,
+    chunk_size=COPY_CHUNK_SIZE,
+    progress=None
+):
+    """Copy a folder, or anything else :func:`copy_file` can copy, with the
+    files spread across `workers` threads, the biggest first. Where to, what
+    happens on collision and the result returned are as for :func:`copy_file`;
+    the system copies each file's data directly where it can, otherwise it's
+    copied `chunk_size` bytes at a time -- on Windows, CopyFile always does
+    the copying and `chunk_size` is not used; and timestamps are kept.
+    `progress`, if given, is called with each file's source & target as it's
+    done and the :class:`FileOperationResult` so far.
+    """
+    result = FileOperationResult(shellcon.FO_COPY, progress)
+    try:
+        try:
+            _copy_tree(source_path, target_path, no_confirm, rename_on_collision, workers, chunk_size, result)
+        except EnvironmentError:
+            raise x_winshell(sys.exc_info()[1])
+    except x_winshell:
+        result._finish(failed=True)
+        sys.exc_info()[1].result = result
+        raise
+    result._finish()
+    return result
+
+class FileOperationBatch(object):
+    """Queue up copies, moves, renames and deletes and carry them out with
+    as few shell operations as possible. Successive requests for the same
+    operation with the same options are run together into one operation
+    with many sources (and targets); a request for something different
+    starts a new run, so everything is still done in the order asked for.
+
+    The queue is flushed whenever it reaches `max_files` requests or, as a
+    request is queued, its oldest request has been waiting for more than
+    `max_delay` seconds; and, finally, when the batch is used as a context
+    manager, on leaving the block without an exception. No one operation has
+    more than `max_files` files or more than `max_chars` characters of paths.
+
+    The mapping of any renamed files, and the counts and timings of every
+    operation, are gathered up in `mapping`, a :class:`FileOperationResult`;
+    `n_calls` counts the operations made so far. The operations are carried
+    out by `backend`, and report to `progress`, as for :func:`copy_file` and
+    the rest.
+    """
+
+    def __init__(self, max_files=512, max_chars=32767, max_delay=5.0, backend=None, progress=None):
+        self.max_files = max_files
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self.backend = backend
+        self.progress = progress
+        self.mapping = FileOperationResult()
+        self.n_calls = 0
+        self._pending = []
+        self._oldest = None
+        self._n_alone = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._pending = []
+
+    def _queue(self, key, source_paths, target_paths):
+        if isinstance(source_paths, basestring):
+            source_paths = [source_paths]
+            target_paths = [target_paths]
+        elif target_paths is None or isinstance(target_paths, basestring):
+            target_paths = [target_paths] * len(source_paths)
+        if not self._pending:
+            self._oldest = time.time()
+        for source_path, target_path in zip(source_paths, target_paths):
+            source_path = os.path.abspath(source_path)
+            if target_path is not None:
+                target_path = os.path.abspath(target_path)
+            if key[0] == shellcon.FO_RENAME or "*" in source_path or "?" in source_path:
+                #
+                # The shell renames only one file at a time, and a wildcard
+                # can't be one of several sources, each with its own target,
+                # so either gets an operation to itself
+                #
+                self._n_alone += 1
+                self._pending.append((key + (self._n_alone,), source_path, target_path))
+                continue
+            if target_path is not None and os.path.isdir(target_path):
+                target_path = os.path.join(target_path, os.path.basename(source_path))
+            self._pending.append((key, source_path, target_path))
+        if len(self._pending) >= self.max_files or (
+            self.max_delay is not None and time.time() - self._oldest > self.max_delay
+        ):
+            self.flush()
+
+    def _runs(self):
+        """Yield (key, sources, targets) for each successive run of requests
+        with the same key, split wherever the run would exceed max_files or
+        max_chars.
+        """
+        run_key, sources, targets, n_chars = None, [], [], 0
+        for key, source, target in self._pending:
+            size = max(len(source), len(target or "")) + 1
+            if sources and (key != run_key or len(sources) >= self.max_files or n_chars + size > self.max_chars):
+                yield run_key, sources, targets
+                sources, targets, n_chars = [], [], 0
+            run_key = key
+            sources.append(source)
+            targets.append(target)
+            n_chars += size
+        if sources:
+            yield run_key, sources, targets
+
+    def flush(self):
+        """Carry out everything queued so far, returning a :class:`FileOperationResult`
+        with the mapping of any files renamed along the way.
+        """
+        #
+        # Each run leaves the queue only once it has been carried out, so if
+        # one fails, what's left is still queued and what's been done so far
+        # is still added to the batch's mapping
+        #
+        runs = list(self._runs())
+        mapping = FileOperationResult()
+        try:
+            for key, sources, targets in runs:
+                n_requests = len(sources)
+                operation, allow_undo, no_confirm, rename_on_collision, silent, extra_flags, hWnd = key[:7]
+                if n_requests == 1:
+                    sources, targets = sources[0], targets[0]
+                mapping._add(_file_operation(
+                    operation,
+                    sources,
+                    None if operation == shellcon.FO_DELETE else targets,
+                    allow_undo,
+                    no_confirm,
+                    rename_on_collision,
+                    silent,
+                    extra_flags,
+                    hWnd,
+                    self.backend,
+                    self.progress
+                ))
+                self.n_calls += 1
+                del self._pending[:n_requests]
+        finally:
+            self.mapping._add(mapping)
+        return mapping
+
+    def copy_file(
+        self,
+        source_path,
+        target_path,
+        allow_undo=True,
+        no_confirm=False,
+        rename_on_collision=True,
+        silent=False,
+        extra_flags=0,
+        hWnd=None
+    ):
+        """Queue a copy, cf :func:`copy_file`"""
+        key = shellcon.FO_COPY, allow_undo, no_confirm, rename_on_collision, silent, extra_flags, hWnd
+        self._queue(key, source_path, target_path)
+
+    def move_file(
+        self,
+        source_path,
+        target_path,
+        allow_undo=True,
+        no_confirm=False,
+        rename_on_collision=True,
+        silent=False,
+        extra_flags=0,
+        hWnd=None
+    ):
+        """Queue a move, cf :func:`move_file`"""
+        key = shellcon.FO_MOVE, allow_undo, no_confirm, rename_on_collision, silent, extra_flags, hWnd
+        self._queue(key, source_path, target_path)
+
+    def rename_file(
+        self,
+        source_path,
+        target_path,
+        allow_undo=True,
+        no_confirm=False,
+        rename_on_collision=True,
+        silent=False,
+        extra_flags=0,
+        hWnd=None
+    ):
+        """Queue a rename, cf :func:`rename_file`. The shell can only rename
+        one file at a time, so each rename is an operation of its own.
+        """
+        key = shellcon.FO_RENAME, allow_undo, no_confirm, rename_on_collision, silent, extra_flags, hWnd
+        self._queue(key, source_path, target_path)
+
+    def delete_file(
+        self,
+        source_path,
+        allow_undo=True,
+        no_confirm=False,
+        silent=False,
+        extra_flags=0,
+        hWnd=None
+    ):
+        """Queue a delete, cf :func:`delete_file`"""
+        key = shellcon.FO_DELETE, allow_undo, no_confirm, False, silent, extra_flags, hWnd
+        self._queue(key, source_path, None)
+
+def _volumes_of(*paths):
+    """Return the set of volumes (eg "c:" or "\\\\server\\share") on which
+    any of paths, each a filepath, a list of them or None, lies.
+    """
+    volumes = set()
+    for path in paths:
+        if path is None:
+            continue
+        if isinstance(path, basestring):
+            path = [path]
+        for filepath in path:
+            volumes.add(os.path.splitdrive(os.path.abspath(filepath))[0].lower())
+    return volumes
+
+class FileOperationExecutor(object):
+    """Run file operations on a pool of up to `max_workers` threads, each of
+    them ready to use the shell, returning a :class:`concurrent.futures.Future`
+    for each. If `per_volume` is given, no more than that many operations at
+    a time touch any one volume, so that operations on different volumes can
+    run side by side without those on the same volume competing for it.
+    Operations use `backend` unless they say otherwise.
+    """
+
+    def __init__(self, max_workers=None, per_volume=None, backend=None):
+        if futures is None:
+            raise x_winshell("concurrent.futures is needed for a FileOperationExecutor")
+        self.per_volume = per_volume
+        self.backend = backend
+        self._executor = futures.ThreadPoolExecutor(max_workers or _default_workers())
+        #
+        # An operation on a volume which already has `per_volume` operations
+        # running waits in that volume's queue rather than on a worker thread,
+        # so that it can't hold up operations on other volumes. Each time an
+        # operation finishes, the operations queued on its volumes are tried again.
+        #
+        self._running = {}
+        self._queued = {}
+        self._outstanding = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def shutdown(self, wait=True):
+        """Stop taking operations. If `wait` is true, return once every
+        operation has finished; otherwise cancel those still queued.
+        """
+        if wait:
+            while True:
+                self._lock.acquire()
+                try:
+                    outstanding = list(self._outstanding)
+                finally:
+                    self._lock.release()
+                if not outstanding:
+                    break
+                futures.wait(outstanding)
+        else:
+            self._lock.acquire()
+            try:
+                queued = [job for jobs in self._queued.values() for job in jobs]
+                self._queued.clear()
+            finally:
+                self._lock.release()
+            for future, function, volumes, args, kwargs in queued:
+                future.cancel()
+                self._forget(future)
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, function, args, kwargs):
+        #
+        # The shell's file operations must be carried out on a thread which
+        # has initialised COM. The pool's threads aren't ours to wrap, so each
+        # operation initialises COM around itself, always paired with
+        # uninitialising it, rather than leaving it initialised on the thread.
+        #
+        if pythoncom is None:
+            return function(*args, **kwargs)
+        pythoncom.CoInitialize()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            pythoncom.CoUninitialize()
+
+    def _full(self, volumes):
+        """Return the first of `volumes` with no free slot, or None"""
+        for volume in sorted(volumes):
+            if self._running.get(volume, 0) >= self.per_volume:
+                return volume
+        return None
+
+    def _take(self, volumes):
+        for volume in volumes:
+            self._running[volume] = self._running.get(volume, 0) + 1
+
+    def _forget(self, future):
+        self._lock.acquire()
+        try:
+            self._outstanding.discard(future)
+        finally:
+            self._lock.release()
+
+    def _start(self, job):
+        """Hand `job` to the pool, its volumes' slots having been taken"""
+        future, function, volumes, args, kwargs = job
+        if not future.set_running_or_notify_cancel():
+            self._finished(job, None)
+            return
+        try:
+            inner = self._executor.submit(self._run, function, args, kwargs)
+        except Exception:
+            future.set_exception(sys.exc_info()[1])
+            self._finished(job, None)
+        else:
+            inner.add_done_callback(lambda inner: self._finished(job, inner))
+
+    def _finished(self, job, inner):
+        """Free the slots held by `job`, start whichever queued operations
+        can now run, and pass on the outcome of `inner` to the job's future.
+        """
+        future, function, volumes, args, kwargs = job
+        ready = []
+        self._lock.acquire()
+        try:
+            for volume in volumes:
+                self._running[volume] -= 1
+            for volume in sorted(volumes):
+                queue = self._queued.get(volume, [])
+                while queue:
+                    full = self._full(queue[0][2])
+                    if full == volume:
+                        break
+                    waiting = queue.pop(0)
+                    if full is None:
+                        self._take(waiting[2])
+                        ready.append(waiting)
+                    else:
+                        self._queued.setdefault(full, []).append(waiting)
+        finally:
+            self._lock.release()
+        for waiting in ready:
+            self._start(waiting)
+        if inner is not None:
+            exception = inner.exception()
+            if exception is None:
+                future.set_result(inner.result())
+            else:
+                future.set_exception(exception)
+        self._forget(future)
+
+    def _submit(self, function, volumes, args, kwargs):
+        if not self.per_volume or not volumes:
+            return self._executor.submit(self._run, function, args, kwargs)
+        future = futures.Future()
+        job = future, function, volumes, args, kwargs
+        self._lock.acquire()
+        try:
+            self._outstanding.add(future)
+            #
+            # Operations already waiting for one of these volumes go first
+            #
+            waiting_on = [volume for volume in sorted(volumes) if self._queued.get(volume)]
+            full = waiting_on[0] if waiting_on else self._full(volumes)
+            if full is None:
+                self._take(volumes)
+            else:
+                self._queued.setdefault(full, []).append(job)
+        finally:
+            self._lock.release()
+        if full is None:
+            self._start(job)
+        return future
+
+    def submit(self, function, *args, **kwargs):
+        """Run function(*args, **kwargs) on a worker thread, returning a future"""
+        return self._submit(function, set(), args, kwargs)
+
+    def _submit_operation(self, function, source_path, target_path, args, kwargs):
+        kwargs.setdefault("backend", self.backend)
+        return self._submit(function, _volumes_of(source_path, target_path), args, kwargs)
+
+    def copy_file(self, source_path, target_path, *args, **kwargs):
+        """Run :func:`copy_file` on a worker thread, returning a future"""
+        return self._submit_operation(copy_file, source_path, target_path, (source_path, target_path) + args, kwargs)
+
+    def move_file(self, source_path, target_path, *args, **kwargs):
+        """Run :func:`move_file` on a worker thread, returning a future"""
+        return self._submit_operation(move_file, source_path, target_path, (source_path, target_path) + args, kwargs)
+
+    def rename_file(self, source_path, target_path, *args, **kwargs):
+        """Run :func:`rename_file` on a worker thread, returning a future"""
+        return self._submit_operation(rename_file, source_path, target_path, (source_path, target_path) + args, kwargs)
+
+    def delete_file(self, source_path, *args, **kwargs):
+        """Run :func:`delete_file` on a worker thread, returning a future"""
+        return self._submit_operation(delete_file, source_path, None, (source_path,) + args, kwargs)
+
+class _AsyncFileOperations(object):
+    """The file operations as awaitables for asyncio code, each run by
+    `executor`, a :class:`FileOperationExecutor` created when first needed
+    and which can be replaced to change how many operations run at once.
+    """
+
+    def __init__(self):
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = FileOperationExecutor()
+        return self._executor
+
+    def _set_executor(self, executor):
+        self._executor = executor
+
+    executor = property(_get_executor, _set_executor)
+
+    def _wrapped(self, future):
+        if asyncio is None:
+            raise x_winshell("asyncio is needed for winshell.aio")
+        return asyncio.wrap_future(future)
+
+    def copy_file(self, *args, **kwargs):
+        return self._wrapped(self.executor.copy_file(*args, **kwargs))
+
+    def move_file(self, *args, **kwargs):
+        return self._wrapped(self.executor.move_file(*args, **kwargs))
+
+    def rename_file(self, *args, **kwargs):
+        return self._wrapped(self.executor.rename_file(*args, **kwargs))
+
+    def delete_file(self, *args, **kwargs):
+        return self._wrapped(self.executor.delete_file(*args, **kwargs))
+
+aio = _AsyncFileOperations()
+
+#
+# Shell Link (.lnk) files can be read and written directly, following the
+# [MS-SHLLINK] binary format, rather than via the IShellLink COM interface.
+# This is very much quicker when a great many shortcuts are involved, as the
+# whole file is decoded in one pass without a COM round-trip per attribute.
+#
+LNK_CLSID = b"\x01\x14\x02\x00\x00\x00\x00\x00\xc0\x00\x00\x00\x00\x00\x00\x46"
+
+LNK_HAS_LINK_TARGET_ID_LIST = 0x00000001
+LNK_HAS_LINK_INFO = 0x00000002
+LNK_HAS_NAME = 0x00000004
+LNK_HAS_RELATIVE_PATH = 0x00000008
+LNK_HAS_WORKING_DIR = 0x00000010
+LNK_HAS_ARGUMENTS = 0x00000020
+LNK_HAS_ICON_LOCATION = 0x00000040
+LNK_IS_UNICODE = 0x00000080
+LNK_FORCE_NO_LINK_INFO = 0x00000100
+LNK_HAS_EXP_STRING = 0x00000200
+LNK_HAS_EXP_ICON = 0x00004000
+
+LNK_ENVIRONMENT_VARIABLE_DATA_BLOCK = 0xA0000001
+LNK_TRACKER_DATA_BLOCK = 0xA0000003
+LNK_SPECIAL_FOLDER_DATA_BLOCK = 0xA0000005
+LNK_ICON_ENVIRONMENT_DATA_BLOCK = 0xA0000007
+LNK_PROPERTY_STORE_DATA_BLOCK = 0xA0000009
+LNK_KNOWN_FOLDER_DATA_BLOCK = 0xA000000B
+
+#
+# Extra data which changes from one machine or one moment to the next
+# without the link meaning anything different, and which is therefore
+# dropped from deterministic output; and extra data which only points
+# into the id list, dropped along with the id list when that's rebuilt.
+#
+_LNK_VOLATILE_BLOCKS = set([
+    LNK_TRACKER_DATA_BLOCK,
+])
+_LNK_ID_LIST_BLOCKS = set([
+    LNK_SPECIAL_FOLDER_DATA_BLOCK,
+    LNK_KNOWN_FOLDER_DATA_BLOCK,
+])
+
+_LNK_PROPERTY_STORAGE_VERSION = 0x53505331
+
+def _canonical_property_store(block):
+    """Return a property store data block -- which can carry such things as
+    the AppUserModel ID a pinned shortcut depends on -- with its property
+    storages in format id order and each storage's values in id order, or
+    None if it holds no values at all. A block which can't be parsed is
+    returned as it stands.
+    """
+    storages = []
+    try:
+        offset = 8
+        while True:
+            storage_size, = struct.unpack_from("<I", block, offset)
+            if storage_size == 0:
+                break
+            if storage_size < 28 or offset + storage_size > len(block):
+                return block
+            version, format_id = struct.unpack_from("<I16s", block, offset + 4)
+            if version != _LNK_PROPERTY_STORAGE_VERSION:
+                return block
+            values = []
+            value_offset = offset + 24
+            while True:
+                value_size, = struct.unpack_from("<I", block, value_offset)
+                if value_size == 0:
+                    break
+                if value_size < 9 or value_offset + value_size > offset + storage_size:
+                    return block
+                values.append(block[value_offset:value_offset + value_size])
+                value_offset += value_size
+            if values:
+                storages.append((format_id, sorted(values, key=lambda value: value[4:])))
+            offset += storage_size
+    except struct.error:
+        return block
+    if not storages:
+        return None
+
+    output = []
+    for format_id, values in sorted(storages):
+        body = b"".join(values) + b"\0\0\0\0"
+        output.append(struct.pack("<II16s", 24 + len(body), _LNK_PROPERTY_STORAGE_VERSION, format_id) + body)
+    output.append(b"\0\0\0\0")
+    body = b"".join(output)
+    return struct.pack("<II", 8 + len(body), LNK_PROPERTY_STORE_DATA_BLOCK) + body
+
+_LNK_HEADER = struct.Struct("<I16sIIQQQIiIHHII")
+_LNK_STRINGS = (
+    (LNK_HAS_NAME, "description"),
+    (LNK_HAS_RELATIVE_PATH, "relative_path"),
+    (LNK_HAS_WORKING_DIR, "working_directory"),
+    (LNK_HAS_ARGUMENTS, "arguments"),
+    (LNK_HAS_ICON_LOCATION, "icon_path"),
+)
+
+try:
+    codecs.lookup("mbcs")
+except LookupError:
+    _ansi_encoding = "cp1252"
+else:
+    _ansi_encoding = "mbcs"
+
+def _ansi_string_at(data, offset):
+    end = data.find(b"\0", offset)
+    if end == -1:
+        end = len(data)
+    return data[offset:end].decode(_ansi_encoding, "replace")
+
+def _unicode_string_at(data, offset):
+    end = data.find(b"\0\0", offset)
+    while end != -1 and (end - offset) % 2:
+        end = data.find(b"\0\0", end + 1)
+    if end == -1:
+        end = len(data) - (len(data) - offset) % 2
+    return data[offset:end].decode("utf-16-le", "replace")
+
+def _path_from_link_info(link_info):
+    size, header_size, flags, volume_id_offset, local_base_path_offset, \
+        network_offset, suffix_offset = struct.unpack_from("<7I", link_info, 0)
+    local_base_path_offset_unicode = suffix_offset_unicode = 0
+    if header_size >= 0x24:
+        local_base_path_offset_unicode, suffix_offset_unicode = struct.unpack_from("<2I", link_info, 0x1C)
+
+    if suffix_offset_unicode:
+        suffix = _unicode_string_at(link_info, suffix_offset_unicode)
+    elif suffix_offset:
+        suffix = _ansi_string_at(link_info, suffix_offset)
+    else:
+        suffix = ""
+
+    #
+    # Mirror SLGP_UNCPRIORITY: prefer the network path where there is one
+    #
+    if flags & 0x2 and network_offset:
+        _, _, net_name_offset, _, _ = struct.unpack_from("<5I", link_info, network_offset)
+        if net_name_offset > 0x14:
+            net_name_offset_unicode, = struct.unpack_from("<I", link_info, network_offset + 0x14)
+            base = _unicode_string_at(link_info, network_offset + net_name_offset_unicode)
+        else:
+            base = _ansi_string_at(link_info, network_offset + net_name_offset)
+        if suffix:
+            return base.rstrip("\\") + "\\" + suffix
+        return base
+    elif flags & 0x1:
+        if local_base_path_offset_unicode:
+            base = _unicode_string_at(link_info, local_base_path_offset_unicode)
+        else:
+            base = _ansi_string_at(link_info, local_base_path_offset)
+        return base + suffix
+    else:
+        return ""
+
+def _link_info_for_path(path):
+    if path.startswith("\\\\"):
+        parts = path[2:].split("\\", 2)
+        net_name = "\\\\" + "\\".join(parts[:2])
+        suffix = "\\".join(parts[2:])
+        net_name_ansi = net_name.encode(_ansi_encoding, "replace") + b"\0"
+        net_name_unicode = net_name.encode("utf-16-le") + b"\0\0"
+        network = struct.pack(
+            "<7I",
+            0x1C + len(net_name_ansi) + len(net_name_unicode), 0,
+            0x1C, 0, 0, 0x1C + len(net_name_ansi), 0
+        ) + net_name_ansi + net_name_unicode
+        flags = 0x2
+        blocks = [
+            ("network", network),
+            ("suffix", suffix.encode(_ansi_encoding, "replace") + b"\0"),
+            ("suffix_unicode", suffix.encode("utf-16-le") + b"\0\0"),
+        ]
+    else:
+        #
+        # A volume id is mandatory alongside a local base path but the
+        # shell only uses it to help track a link whose target has moved,
+        # so an anonymous fixed drive is enough.
+        #
+        flags = 0x1
+        blocks = [
+            ("volume_id", struct.pack("<4I", 0x11, 3, 0, 0x10) + b"\0"),
+            ("local_base_path", path.encode(_ansi_encoding, "replace") + b"\0"),
+            ("suffix", b"\0"),
+            ("local_base_path_unicode", path.encode("utf-16-le") + b"\0\0"),
+            ("suffix_unicode", b"\0\0"),
+        ]
+
+    offsets = {}
+    offset = 0x24
+    for name, block in blocks:
+        offsets[name] = offset
+        offset += len(block)
+    return struct.pack(
+        "<9I", offset, 0x24, flags,
+        offsets.get("volume_id", 0),
+        offsets.get("local_base_path", 0),
+        offsets.get("network", 0),
+        offsets["suffix"],
+        offsets.get("local_base_path_unicode", 0),
+        offsets["suffix_unicode"]
+    ) + b"".join(block for name, block in blocks)
+
+def _path_from_id_list(id_list):
+    """Decode the simple case of a filesystem item id list: a drive
+    followed by a series of folder & file entries. Anything else (network
+    locations, virtual folders and so on) is left to LinkInfo.
+    """
+    parts = []
+    offset = 0
+    while offset + 2 <= len(id_list):
+        size, = struct.unpack_from("<H", id_list, offset)
+        if size < 3:
+            break
+        item = id_list[offset + 2:offset + size]
+        offset += size
+        item_type = ord(item[0:1]) & 0x70
+        if item_type == 0x10:
+            continue
+        elif item_type == 0x20:
+            parts = [_ansi_string_at(item, 1).rstrip("\\")]
+        elif item_type == 0x30 and parts:
+            if ord(item[0:1]) & 0x04:
+                name = _unicode_string_at(item, 12)
+                extension_offset = 12 + 2 * len(name) + 2
+            else:
+                name = _ansi_string_at(item, 12)
+                extension_offset = 12 + len(name.encode(_ansi_encoding, "replace")) + 1
+            extension_offset += extension_offset % 2
+            if extension_offset + 8 <= len(item):
+                version, signature = struct.unpack_from("<HI", item, extension_offset + 2)
+                if signature == 0xBEEF0004:
+                    if version >= 9:
+                        name_offset = 0x2E
+                    elif version >= 8:
+                        name_offset = 0x2A
+                    elif version >= 7:
+                        name_offset = 0x26
+                    else:
+                        name_offset = 0x14
+                    name = _unicode_string_at(item, extension_offset + name_offset) or name
+            parts.append(name)
+        else:
+            return ""
+    return "\\".join(parts)
+
+#
+# The .lnk file is first walked to find where each section lies without
+# copying anything out of it, so that it can be parsed straight from a
+# memoryview or an mmap. Fields are then decoded -- and their bytes copied --
+# only as they're asked for.
+#
+_LnkLayout = collections.namedtuple("_LnkLayout", "header id_list link_info strings extra_data")
+
+def _lnk_layout(data):
+    size = len(data)
+    if size < _LNK_HEADER.size:
+        raise x_shortcut("Shell link is truncated")
+    header = _LNK_HEADER.unpack_from(data, 0)
+    if header[0] != _LNK_HEADER.size or header[1] != LNK_CLSID:
+        raise x_shortcut("Not a shell link")
+    flags = header[2]
+    offset = _LNK_HEADER.size
+    id_list = link_info = None
+    strings = {}
+    extra_data = []
+
+    try:
+        if flags & LNK_HAS_LINK_TARGET_ID_LIST:
+            n_bytes, = struct.unpack_from("<H", data, offset)
+            id_list = offset + 2, offset + 2 + n_bytes
+            offset += 2 + n_bytes
+
+        if flags & LNK_HAS_LINK_INFO:
+            n_bytes, = struct.unpack_from("<I", data, offset)
+            link_info = offset, offset + n_bytes
+            offset += n_bytes
+
+        char_size = (flags & LNK_IS_UNICODE) and 2 or 1
+        for flag, attribute in _LNK_STRINGS:
+            if flags & flag:
+                n_chars, = struct.unpack_from("<H", data, offset)
+                strings[attribute] = offset + 2, offset + 2 + char_size * n_chars
+                offset += 2 + char_size * n_chars
+
+        while offset + 4 <= size:
+            n_bytes, = struct.unpack_from("<I", data, offset)
+            if n_bytes < 8:
+                break
+            extra_data.append((offset, offset + n_bytes))
+            offset += n_bytes
+    except struct.error:
+        raise x_shortcut("Shell link is truncated")
+    if offset > size:
+        raise x_shortcut("Shell link is truncated")
+
+    return _LnkLayout(header, id_list, link_info, strings, extra_data)
+
+def _lnk_bytes(data, span):
+    start, end = span
+    chunk = data[start:end]
+    if isinstance(chunk, memoryview):
+        return chunk.tobytes()
+    elif not isinstance(chunk, bytes):
+        return bytes(chunk)
+    else:
+        return chunk
+
+def _lnk_string(data, layout, attribute):
+    span = layout.strings.get(attribute)
+    if span is None:
+        return ""
+    elif layout.header[2] & LNK_IS_UNICODE:
+        return _lnk_bytes(data, span).decode("utf-16-le", "replace")
+    else:
+        return _lnk_bytes(data, span).decode(_ansi_encoding, "replace")
+
+def _lnk_path(data, layout):
+    if layout.link_info:
+        path = _path_from_link_info(_lnk_bytes(data, layout.link_info))
+        if path:
+            return path
+    for start, end in layout.extra_data:
+        if struct.unpack_from("<I", data, start + 4)[0] == LNK_ENVIRONMENT_VARIABLE_DATA_BLOCK:
+            block = _lnk_bytes(data, (start, end))
+            path = _unicode_string_at(block, 268) or _ansi_string_at(block, 8)
+            return win32api.ExpandEnvironmentStrings(path) if win32api else path
+    if layout.id_list:
+        return _path_from_id_list(_lnk_bytes(data, layout.id_list))
+    return ""
+
+_LNK_FIELDS = set(["path", "icon_location", "show_cmd", "hotkey"] + [a for (f, a) in _LNK_STRINGS])
+
+def _lnk_fields(data, layout, fields):
+    """Decode the named Shortcut attributes from a .lnk file, returning a
+    dictionary. Any field not asked for is never decoded.
+    """
+    header = layout.header
+    values = {}
+    for field in fields:
+        if field == "path":
+            values[field] = _lnk_path(data, layout)
+        elif field == "icon_location":
+            values[field] = _lnk_string(data, layout, "icon_path"), header[8]
+        elif field == "show_cmd":
+            values[field] = header[9]
+        elif field == "hotkey":
+            values[field] = header[10]
+        elif field in _LNK_FIELDS:
+            values[field] = _lnk_string(data, layout, field)
+        else:
+            raise x_shortcut("No such shortcut field %s" % field)
+    return values
+
+class ShellLink(WinshellObject):
+    """A shell link held entirely in Python, read from and written to
+    the .lnk binary format without going through the shell. The target
+    id list, link info and extra data blocks which aren't otherwise
+    interpreted are carried through unchanged so that an unmodified
+    link is written back byte-for-byte as it was read.
+    """
+
+    __slots__ = (
+        "link_flags", "file_attributes",
+        "creation_time", "access_time", "write_time", "file_size",
+        "icon_index", "show_cmd", "hotkey",
+        "id_list", "link_info",
+        "description", "relative_path", "working_directory", "arguments", "icon_path",
+        "extra_data", "_path", "lnk_filepath",
+    )
+
+    def __init__(self):
+        self.link_flags = LNK_IS_UNICODE
+        self.file_attributes = 0
+        self.creation_time = self.access_time = self.write_time = 0
+        self.file_size = 0
+        self.icon_index = 0
+        self.show_cmd = win32con.SW_SHOWNORMAL
+        self.hotkey = 0
+        self.id_list = None
+        self.link_info = None
+        self.description = ""
+        self.relative_path = ""
+        self.working_directory = ""
+        self.arguments = ""
+        self.icon_path = ""
+        self.extra_data = []
+        self._path = ""
+        self.lnk_filepath = None
+
+    def as_string(self):
+        return self.path or "-no-target-"
+
+    @classmethod
+    def from_bytes(cls, data):
+        link = cls()
+        link.load_bytes(data)
+        return link
+
+    @classmethod
+    def from_file(cls, lnk_filepath):
+        link = cls()
+        link.load(lnk_filepath)
+        return link
+
+    def load(self, lnk_filepath):
+        f = open(lnk_filepath, "rb")
+        try:
+            self.load_bytes(f.read())
+        finally:
+            f.close()
+        self.lnk_filepath = lnk_filepath
+
+    def load_bytes(self, data):
+        layout = _lnk_layout(data)
+        _, _, self.link_flags, self.file_attributes, \
+            self.creation_time, self.access_time, self.write_time, \
+            self.file_size, self.icon_index, self.show_cmd, self.hotkey, \
+            _, _, _ = layout.header
+        self.id_list = layout.id_list and _lnk_bytes(data, layout.id_list)
+        self.link_info = layout.link_info and _lnk_bytes(data, layout.link_info)
+        for attribute, value in _lnk_fields(data, layout, [a for (f, a) in _LNK_STRINGS]).items():
+            setattr(self, attribute, value)
+        self.extra_data = [_lnk_bytes(data, span) for span in layout.extra_data]
+        self._path = _lnk_path(data, layout)
+
+    def extra_data_block(self, signature):
+        for block in self.extra_data:
+            if struct.unpack_from("<I", block, 4)[0] == signature:
+                return block
+        return None
+
+    def _drop_extra_data_block(self, signature):
+        self.extra_data = [b for b in self.extra_data if struct.unpack_from("<I", b, 4)[0] != signature]
+
+    def _get_path(self):
+        return self._path
+
+    def _set_path(self, path):
+        #
+        # Whatever identified the old target -- id list, link info or
+        # environment-variable path -- is now stale and is regenerated
+        # from the new path when the link is written.
+        #
+        self._path = path
+        self.id_list = None
+        self.link_info = None
+        self.link_flags &= ~(LNK_HAS_EXP_STRING | LNK_FORCE_NO_LINK_INFO)
+        self._drop_extra_data_block(LNK_ENVIRONMENT_VARIABLE_DATA_BLOCK)
+
+    path = property(_get_path, _set_path)
+
+    def _get_icon_location(self):
+        return self.icon_path, self.icon_index
+
+    def _set_icon_location(self, icon_location):
+        self.icon_path, self.icon_index = icon_location
+        self.link_flags &= ~LNK_HAS_EXP_ICON
+        self._drop_extra_data_block(LNK_ICON_ENVIRONMENT_DATA_BLOCK)
+
+    icon_location = property(_get_icon_location, _set_icon_location)
+
+    def to_bytes(self, deterministic=False):
+        """Return the contents of a .lnk file for this link. If `deterministic`
+        is true, the result depends only on what the link means, not on when
+        or where it was made: the target's timestamps, size and attributes
+        are zeroed; the id list and link info are rebuilt from the path,
+        along with the blocks which point into the id list; tracking data
+        is dropped; the property store is put into a canonical order; and
+        the extra data blocks are put in signature order.
+        """
+        flags = self.link_flags & ~(
+            LNK_HAS_LINK_TARGET_ID_LIST | LNK_HAS_LINK_INFO |
+            LNK_HAS_NAME | LNK_HAS_RELATIVE_PATH | LNK_HAS_WORKING_DIR |
+            LNK_HAS_ARGUMENTS | LNK_HAS_ICON_LOCATION
+        )
+        id_list = self.id_list
+        link_info = self.link_info
+        extra_data = self.extra_data
+        file_attributes = self.file_attributes
+        times = self.creation_time, self.access_time, self.write_time
+        file_size = self.file_size
+        if deterministic:
+            dropped = set(_LNK_VOLATILE_BLOCKS)
+            if self._path and not flags & LNK_HAS_EXP_STRING:
+                id_list = link_info = None
+                dropped.update(_LNK_ID_LIST_BLOCKS)
+            blocks = []
+            for block in extra_data:
+                signature, = struct.unpack_from("<I", block, 4)
+                if signature in dropped:
+                    continue
+                if signature == LNK_PROPERTY_STORE_DATA_BLOCK:
+                    block = _canonical_property_store(block)
+                    if block is None:
+                        continue
+                blocks.append(block)
+            extra_data = sorted(blocks, key=lambda b: struct.unpack_from("<I", b, 4)[0])
+            file_attributes = file_size = 0
+            times = 0, 0, 0
+        #
+        # Link info is only made up for a link which has lost both its id
+        # list and its link info, eg because its path was changed; a link
+        # which was read with an id list alone is written back that way.
+        #
+        if link_info is None and id_list is None and self._path and \
+                not flags & (LNK_HAS_EXP_STRING | LNK_FORCE_NO_LINK_INFO):
+            link_info = _link_info_for_path(self._path)
+
+        strings = []
+        for flag, attribute in _LNK_STRINGS:
+            value = getattr(self, attribute) or ""
+            if value or (not deterministic and self.link_flags & flag):
+                flags |= flag
+                strings.append(value)
+        if not flags & LNK_IS_UNICODE:
+            try:
+                strings = [s.encode(_ansi_encoding, "strict") for s in strings]
+                strings = [struct.pack("<H", len(s)) + s for s in strings]
+            except UnicodeError:
+                flags |= LNK_IS_UNICODE
+        if flags & LNK_IS_UNICODE:
+            strings = [s.encode("utf-16-le") for s in strings]
+            strings = [struct.pack("<H", len(s) // 2) + s for s in strings]
+
+        output = []
+        if id_list is not None:
+            flags |= LNK_HAS_LINK_TARGET_ID_LIST
+            output.append(struct.pack("<H", len(id_list)) + id_list)
+        if link_info:
+            flags |= LNK_HAS_LINK_INFO
+            output.append(link_info)
+        output.extend(strings)
+        output.extend(extra_data)
+        output.append(b"\0\0\0\0")
+
+        header = _LNK_HEADER.pack(
+            _LNK_HEADER.size, LNK_CLSID, flags, file_attributes,
+            times[0], times[1], times[2],
+            file_size, self.icon_index, self.show_cmd, self.hotkey,
+            0, 0, 0
+        )
+        return header + b"".join(output)
+
+    def save(self, lnk_filepath=None, remember=True):
+        """Write this link to `lnk_filepath` or, if that isn't given, to
+        the file it was last loaded from or saved to. If `remember` is
+        true, `lnk_filepath` becomes the file which a later save writes to.
+        """
+        if lnk_filepath is None:
+            lnk_filepath = self.lnk_filepath
+            if lnk_filepath is None:
+                raise x_shortcut("No filepath to save the link to")
+        data = self.to_bytes()
+        f = open(lnk_filepath, "wb")
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        if remember:
+            self.lnk_filepath = lnk_filepath
+
+class _ComShellLink(object):
+    """Present the IShellLink COM interface with the same attributes
+    and load/save methods as the pure-Python :class:`ShellLink` so
+    that either can sit behind a :class:`Shortcut`. The first time any
+    attribute is asked for, all of them are fetched from the shell
+    together and kept, so later reads make no further COM calls.
+    """
+
+    __slots__ = ("_shell_link", "_fields")
+
+    #
+    # How each attribute is got from and set on an IShellLink
+    #
+    _accessors = {
+        "arguments" : (lambda link: link.GetArguments(), lambda link, value: link.SetArguments(value)),
+        "description" : (lambda link: link.GetDescription(), lambda link, value: link.SetDescription(value)),
+        "hotkey" : (lambda link: link.GetHotkey(), lambda link, value: link.SetHotkey(value)),
+        "icon_location" : (lambda link: tuple(link.GetIconLocation()), lambda link, value: link.SetIconLocation(*value)),
+        "path" : (lambda link: link.GetPath(shell.SLGP_UNCPRIORITY)[0], lambda link, value: link.SetPath(value)),
+        "show_cmd" : (lambda link: link.GetShowCmd(), lambda link, value: link.SetShowCmd(value)),
+        "working_directory" : (lambda link: link.GetWorkingDirectory(), lambda link, value: link.SetWorkingDirectory(value)),
     }
 
-    def __init__(self, lnk_filepath=None, **kwargs):
+    def __init__(self):
         self._shell_link = wrapped(
             pythoncom.CoCreateInstance,
             shell.CLSID_ShellLink,
@@ -397,17 +2110,154 @@ class Shortcut(WinshellObject):
             pythoncom.CLSCTX_INPROC_SERVER,
             shell.IID_IShellLink
         )
-        self.lnk_filepath = lnk_filepath
-        if self.lnk_filepath and os.path.exists(self.lnk_filepath):
-            wrapped(
-                self._shell_link.QueryInterface,
-                pythoncom.IID_IPersistFile
-            ).Load(
-                self.lnk_filepath
+        self._fields = None
+
+    def load(self, lnk_filepath):
+        wrapped(
+            self._shell_link.QueryInterface,
+            pythoncom.IID_IPersistFile
+        ).Load(
+            lnk_filepath
+        )
+        self._fields = None
+
+    def save(self, lnk_filepath=None, remember=True):
+        wrapped(
+            self._shell_link.QueryInterface,
+            pythoncom.IID_IPersistFile
+        ).Save(
+            lnk_filepath,
+            remember
+        )
+
+    def _get(self, attribute):
+        if self._fields is None:
+            self._fields = dict(
+                (name, getter(self._shell_link)) for name, (getter, setter) in self._accessors.items()
             )
+        return self._fields[attribute]
+
+    def _set(self, attribute, value):
+        getter, setter = self._accessors[attribute]
+        setter(self._shell_link, value)
+        if self._fields is not None:
+            #
+            # The shell may tidy up what it's given, eg a path, so keep
+            # what it now holds rather than what was passed in
+            #
+            self._fields[attribute] = getter(self._shell_link)
+
+    def _get_arguments(self):
+        return self._get("arguments")
+
+    def _set_arguments(self, arguments):
+        self._set("arguments", arguments)
+
+    arguments = property(_get_arguments, _set_arguments)
+
+    def _get_description(self):
+        return self._get("description")
+
+    def _set_description(self, description):
+        self._set("description", description)
+
+    description = property(_get_description, _set_description)
+
+    def _get_hotkey(self):
+        return self._get("hotkey")
+
+    def _set_hotkey(self, hotkey):
+        self._set("hotkey", hotkey)
+
+    hotkey = property(_get_hotkey, _set_hotkey)
+
+    def _get_icon_location(self):
+        return self._get("icon_location")
+
+    def _set_icon_location(self, icon_location):
+        self._set("icon_location", icon_location)
+
+    icon_location = property(_get_icon_location, _set_icon_location)
+
+    def _get_path(self):
+        return self._get("path")
+
+    def _set_path(self, path):
+        self._set("path", path)
+
+    path = property(_get_path, _set_path)
+
+    def _get_show_cmd(self):
+        return self._get("show_cmd")
+
+    def _set_show_cmd(self, show_cmd):
+        self._set("show_cmd", show_cmd)
+
+    show_cmd = property(_get_show_cmd, _set_show_cmd)
+
+    def _get_working_directory(self):
+        return self._get("working_directory")
+
+    def _set_working_directory(self, working_directory):
+        self._set("working_directory", working_directory)
+
+    working_directory = property(_get_working_directory, _set_working_directory)
+
+shortcut_backends = {
+    "com" : _ComShellLink,
+    "lnk" : ShellLink,
+}
+
+class Shortcut(WinshellObject):
+
+    show_states = {
+        "normal" : win32con.SW_SHOWNORMAL,
+        "max" : win32con.SW_SHOWMAXIMIZED,
+        "min" : win32con.SW_SHOWMINNOACTIVE
+    }
+
+    #
+    # A Shortcut holds no more than its location and, once any attribute
+    # has been asked for, the backend link holding all its fields: the
+    # .lnk file isn't read until then. Attributes which are set to a
+    # different value are remembered so that writing back a shortcut
+    # which hasn't changed leaves the file alone.
+    #
+    __slots__ = ("lnk_filepath", "backend", "_link", "_dirty")
+
+    def __init__(self, lnk_filepath=None, backend="com", **kwargs):
+        self.lnk_filepath = lnk_filepath
+        self.backend = backend
+        self._link = None
+        self._dirty = set()
         for k, v in kwargs.items():
             setattr(self, k, v)
 
+    def _loaded(self):
+        if self._link is None:
+            link = shortcut_backends[self.backend]()
+            if self.lnk_filepath and os.path.exists(self.lnk_filepath):
+                link.load(self.lnk_filepath)
+            self._link = link
+        return self._link
+
+    def _get(self, attribute):
+        return getattr(self._loaded(), attribute)
+
+    def _get_shell_link(self):
+        #
+        # Code written against earlier versions reached the IShellLink
+        # interface directly; only the "com" backend has one
+        #
+        return self._loaded()._shell_link
+    _shell_link = property(_get_shell_link)
+
+    def _set(self, attribute, value):
+        link = self._loaded()
+        if getattr(link, attribute) != value:
+            setattr(link, attribute, value)
+            self._dirty.add(attribute)
+
     def as_string(self):
         return "%s -> %s" % (self.lnk_filepath or "-unsaved-", self.path or "-no-target-")
 
@@ -421,8 +2271,8 @@ class Shortcut(WinshellObject):
         return dumped("\n".join(output), level)
 
     @classmethod
-    def from_lnk(cls, lnk_filepath):
-        return cls(lnk_filepath)
+    def from_lnk(cls, lnk_filepath, backend="com"):
+        return cls(lnk_filepath, backend=backend)
 
     @classmethod
     def from_target(cls, target_filepath, lnk_filepath=UNSET, **kwargs):
@@ -443,99 +2293,607 @@ class Shortcut(WinshellObject):
             self.write()
 
     def _get_arguments(self):
-        return self._shell_link.GetArguments()
+        return self._get("arguments")
 
     def _set_arguments(self, arguments):
-        self._shell_link.SetArguments(arguments)
+        self._set("arguments", arguments)
     arguments = property(_get_arguments, _set_arguments)
 
     def _get_description(self):
-        return self._shell_link.GetDescription()
+        return self._get("description")
 
     def _set_description(self, description):
-        self._shell_link.SetDescription(description)
+        self._set("description", description)
 
     description = property(_get_description, _set_description)
 
     def _get_hotkey(self):
-        return self._shell_link.GetHotkey()
+        return self._get("hotkey")
 
     def _set_hotkey(self, hotkey):
-        self._shell_link.SetHotkey(hotkey)
+        self._set("hotkey", hotkey)
 
     hotkey = property(_get_hotkey, _set_hotkey)
 
     def _get_icon_location(self):
-        path, index = self._shell_link.GetIconLocation()
+        path, index = self._get("icon_location")
         return path, index
 
     def _set_icon_location(self, icon_location):
-        self._shell_link.SetIconLocation(*icon_location)
+        self._set("icon_location", tuple(icon_location))
+
+    icon_location = property(_get_icon_location, _set_icon_location)
+
+    def _get_path(self):
+        return self._get("path")
+
+    def _set_path(self, path):
+        self._set("path", path)
+
+    path = property(_get_path, _set_path)
+
+    def _get_show_cmd(self):
+        show_cmd = self._get("show_cmd")
+        for k, v in self.show_states.items():
+            if v == show_cmd:
+                return k
+        else:
+            return None
+
+    def _set_show_cmd(self, show_cmd):
+        try:
+            show_cmd = int(show_cmd)
+        except ValueError:
+            show_cmd = self.show_states[show_cmd]
+        self._set("show_cmd", show_cmd)
+
+    show_cmd = property(_get_show_cmd, _set_show_cmd)
+
+    def _get_working_directory(self):
+        return self._get("working_directory")
+
+    def _set_working_directory(self, working_directory):
+        self._set("working_directory", working_directory)
+
+    working_directory = property(_get_working_directory, _set_working_directory)
+
+    def _as_link(self):
+        """Return the pure-Python ShellLink behind this shortcut or, for
+        the COM backend, a ShellLink with the same attributes.
+        """
+        link = self._loaded()
+        if not isinstance(link, ShellLink):
+            com_link, link = link, ShellLink()
+            for attribute in SHORTCUT_ATTRIBUTES:
+                setattr(link, attribute, getattr(com_link, attribute))
+        return link
+
+    def content_hash(self):
+        """Return a hash of what this shortcut means -- its target, arguments
+        and so on -- which is the same for two shortcuts with the same
+        attributes however, whenever and wherever they were written.
+        """
+        link = ShellLink()
+        source = self._loaded()
+        for attribute in SHORTCUT_ATTRIBUTES:
+            setattr(link, attribute, getattr(source, attribute))
+        return hashlib.sha256(link.to_bytes(deterministic=True)).hexdigest()
+
+    def write(self, lnk_filepath=None, deterministic=False):
+        """Write the shortcut to `lnk_filepath` or to its own location. If
+        `deterministic` is true, the .lnk file is written directly (whichever
+        the backend) so that the same shortcut always gives the same bytes
+        (cf :meth:`ShellLink.to_bytes`), and a file which already holds
+        those bytes is left alone.
+        """
+        if not lnk_filepath:
+            lnk_filepath = self.lnk_filepath
+        if lnk_filepath is None:
+            raise x_shortcut("Must specify a lnk_filepath for an unsaved shortcut")
+
+        if deterministic:
+            data = self._as_link().to_bytes(deterministic=True)
+            try:
+                f = open(lnk_filepath, "rb")
+            except EnvironmentError:
+                existing = None
+            else:
+                try:
+                    existing = f.read(len(data) + 1)
+                finally:
+                    f.close()
+            if existing != data:
+                _write_atomically(lnk_filepath, data)
+            self._dirty.clear()
+        else:
+            is_unchanged = (
+                lnk_filepath == self.lnk_filepath and
+                not self._dirty and
+                os.path.exists(lnk_filepath)
+            )
+            if not is_unchanged:
+                self._loaded().save(lnk_filepath, lnk_filepath == self.lnk_filepath)
+                self._dirty.clear()
+
+        self.lnk_filepath = lnk_filepath
+        return self
+
+ShortcutRecord = collections.namedtuple(
+    "ShortcutRecord",
+    "lnk_filepath root path arguments working_directory icon_location mtime"
+)
+
+def read_shortcuts(lnk_filepaths, fields=None, buffer_size=8192):
+    """Read a series of .lnk files, yielding a (filepath, dictionary) pair
+    for each with just the `fields` asked for (by default, all of
+    :data:`SHORTCUT_ATTRIBUTES`). Every file is read into the same buffer
+    and decoded from there, with none but the requested fields decoded;
+    any file too big for the buffer is memory-mapped instead. Files which
+    can't be read as shortcuts are skipped.
+    """
+    if fields is None:
+        fields = SHORTCUT_ATTRIBUTES
+    for field in fields:
+        if field not in _LNK_FIELDS:
+            raise x_shortcut("No such shortcut field %s" % field)
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    for lnk_filepath in lnk_filepaths:
+        try:
+            f = open(lnk_filepath, "rb")
+            try:
+                n_bytes = f.readinto(buffer)
+                if n_bytes < len(buffer) or os.fstat(f.fileno()).st_size == n_bytes:
+                    data = view[:n_bytes]
+                    values = _lnk_fields(data, _lnk_layout(data), fields)
+                else:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    try:
+                        values = _lnk_fields(data, _lnk_layout(data), fields)
+                    finally:
+                        data.close()
+            finally:
+                f.close()
+        except (x_shortcut, EnvironmentError):
+            continue
+        yield lnk_filepath, values
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _shortcut_records(chunk):
+    entries = dict((entry.path, (root, entry)) for root, entry in chunk)
+    records = []
+    for lnk_filepath, values in read_shortcuts(entries, ("path", "arguments", "working_directory", "icon_location")):
+        root, entry = entries[lnk_filepath]
+        try:
+            mtime = entry.stat().st_mtime
+        except EnvironmentError:
+            continue
+        records.append(ShortcutRecord(
+            lnk_filepath, root,
+            values["path"], values["arguments"], values["working_directory"], values["icon_location"],
+            mtime
+        ))
+    return records
+
+def scan_shortcuts(roots=None, workers=None):
+    """Walk one or more folders, yielding a :class:`ShortcutRecord` for
+    each shortcut found beneath them. The .lnk files are read directly,
+    in batches, by a pool of `workers` threads and the records come back
+    as soon as they are ready, in no particular order. Files which can't be read
+    as shortcuts are skipped.
+
+    By default the user and common Programs folders are scanned, giving
+    the shortcuts which make up the Start Menu.
+    """
+    if roots is None:
+        roots = [programs(), programs(common=1)]
+    elif isinstance(roots, basestring):
+        roots = [roots]
+    entries = ((root, entry) for root in roots for entry in _walk_files(root, ".lnk"))
+    for records in _parallel_map(_shortcut_records, _chunked(entries, 64), workers):
+        for record in records:
+            yield record
+
+class _BufferedWriter(object):
+    """Gather up writes to a stream and pass them on in large blocks"""
+
+    def __init__(self, stream, buffer_size):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._n_buffered = 0
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._n_buffered += len(text)
+        if self._n_buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.stream.write("".join(self._buffer))
+            self._buffer = []
+            self._n_buffered = 0
+
+def _read_shortcuts_chunk(chunk_and_fields):
+    chunk, fields = chunk_and_fields
+    return list(read_shortcuts(chunk, fields))
+
+def export_shortcuts(roots=None, fmt="jsonl", out=None, fields=None, workers=None, buffer_size=65536):
+    """Write a record for each shortcut under `roots` (cf :func:`scan_shortcuts`)
+    to the text stream `out` -- by default, sys.stdout -- either as JSON Lines
+    or as CSV with a header row. Records are written as they're read, in
+    blocks of roughly `buffer_size` characters, so that however many shortcuts
+    there are only a few are ever held at once. Only the `fields` asked for
+    are decoded: these can be "lnk_filepath" and any of the fields which
+    :func:`read_shortcuts` accepts. Returns the number of records written.
+    """
+    if roots is None:
+        roots = [programs(), programs(common=1)]
+    elif isinstance(roots, basestring):
+        roots = [roots]
+    if out is None:
+        out = sys.stdout
+    if fields is None:
+        fields = ("lnk_filepath",) + SHORTCUT_ATTRIBUTES
+    lnk_fields = [field for field in fields if field != "lnk_filepath"]
+    for field in lnk_fields:
+        if field not in _LNK_FIELDS:
+            raise x_shortcut("No such shortcut field %s" % field)
+    if fmt not in ("jsonl", "csv"):
+        raise x_shortcut("Unknown export format %s" % fmt)
+
+    writer = _BufferedWriter(out, buffer_size)
+    if fmt == "csv":
+        csv_writer = csv.writer(writer, lineterminator="\n")
+        csv_writer.writerow(fields)
+
+    lnk_filepaths = (entry.path for root in roots for entry in _walk_files(root, ".lnk"))
+    chunks = ((chunk, lnk_fields) for chunk in _chunked(lnk_filepaths, 64))
+    n_records = 0
+    for results in _parallel_map(_read_shortcuts_chunk, chunks, workers):
+        for lnk_filepath, values in results:
+            values["lnk_filepath"] = lnk_filepath
+            if fmt == "jsonl":
+                writer.write(json.dumps(collections.OrderedDict((f, values[f]) for f in fields)) + "\n")
+            else:
+                row = []
+                for field in fields:
+                    if field == "icon_location":
+                        row.append("%s,%d" % values[field])
+                    else:
+                        row.append(values[field])
+                csv_writer.writerow(row)
+            n_records += 1
+    writer.flush()
+    return n_records
+
+def _folder_listing(dirpath):
+    try:
+        return dirpath, frozenset(name.lower() for name in os.listdir(dirpath))
+    except EnvironmentError:
+        return dirpath, None
+
+def _broken_in_batch(records, listings, workers):
+    unlisted = set(os.path.dirname(record.path) for record in records)
+    unlisted = [dirpath for dirpath in unlisted if os.path.normcase(dirpath) not in listings]
+    for dirpath, names in _parallel_map(_folder_listing, unlisted, workers):
+        listings[os.path.normcase(dirpath)] = names
+
+    for record in records:
+        dirpath, filename = os.path.split(record.path)
+        names = listings[os.path.normcase(dirpath)]
+        if names is None or not filename:
+            #
+            # Either the target's folder couldn't be listed -- it may
+            # not exist or it may not be readable -- or the target is
+            # itself the root of a drive or share: look it up directly.
+            #
+            exists = os.path.exists(record.path)
+        else:
+            exists = filename.lower() in names
+        if not exists:
+            yield record
+
+def find_broken_shortcuts(roots=None, workers=None, batch_size=256):
+    """Yield a :class:`ShortcutRecord` for each shortcut under `roots`
+    (cf :func:`scan_shortcuts`) whose target no longer exists. Targets
+    are checked in batches of `batch_size`: the folders holding them are
+    listed by a pool of `workers` threads and each folder's listing is
+    cached so that it's read no more than once however many shortcuts
+    point into it. Shortcuts with no filesystem target are ignored.
+    """
+    listings = {}
+    batch = []
+    for record in scan_shortcuts(roots, workers):
+        if not record.path:
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            for broken in _broken_in_batch(batch, listings, workers):
+                yield broken
+            batch = []
+    for broken in _broken_in_batch(batch, listings, workers):
+        yield broken
+
+def _outermost_folders(folders):
+    """Drop any folder which lies within another folder of the list"""
+    keyed = sorted((os.path.normcase(os.path.abspath(f)).rstrip(os.sep) + os.sep, f) for f in folders)
+    result = []
+    previous = None
+    for key, folder in keyed:
+        if previous is None or not key.startswith(previous):
+            result.append(folder)
+            previous = key
+    return result
+
+def _indexed_record(item):
+    lnk_filepath, root = item
+    try:
+        link = ShellLink.from_file(lnk_filepath)
+    except (x_shortcut, EnvironmentError):
+        return lnk_filepath, None
+    return lnk_filepath, link
+
+class ShortcutIndex(WinshellObject):
+    """A persistent index of the shortcuts under a set of folders, held
+    in an SQLite database. Each shortcut is stored against the mtime &
+    size of its .lnk file, so that :meth:`refresh` need only re-read the
+    files which have changed since the last time: refreshing an index
+    of an unchanged tree lists the folders and opens no files at all.
+
+    By default the index covers the user and common Start Menu, Desktop
+    and Startup folders (the Programs folders being within the Start Menu).
+    """
+
+    def __init__(self, index_filepath=":memory:", roots=None):
+        if roots is None:
+            roots = [f(common) for f in (start_menu, programs, startup, desktop) for common in (0, 1)]
+        elif isinstance(roots, basestring):
+            roots = [roots]
+        self.index_filepath = index_filepath
+        self.roots = _outermost_folders(roots)
+        self._db = sqlite3.connect(index_filepath)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS shortcuts (
+                lnk_filepath TEXT PRIMARY KEY,
+                root TEXT,
+                mtime REAL,
+                size INTEGER,
+                path TEXT,
+                path_key TEXT,
+                arguments TEXT,
+                working_directory TEXT,
+                icon_path TEXT,
+                icon_index INTEGER
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS shortcuts_path_key ON shortcuts (path_key)")
+        self._db.commit()
+
+    def as_string(self):
+        return "%d shortcuts in %s" % (len(self), self.index_filepath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM shortcuts WHERE path IS NOT NULL").fetchone()[0]
 
-    icon_location = property(_get_icon_location, _set_icon_location)
+    def __iter__(self):
+        for row in self._db.execute(
+            "SELECT lnk_filepath, root, path, arguments, working_directory, icon_path, icon_index, mtime "
+            "FROM shortcuts WHERE path IS NOT NULL ORDER BY lnk_filepath"
+        ):
+            yield self._record(row)
+
+    def __getitem__(self, lnk_filepath):
+        row = self._db.execute(
+            "SELECT lnk_filepath, root, path, arguments, working_directory, icon_path, icon_index, mtime "
+            "FROM shortcuts WHERE lnk_filepath = ? AND path IS NOT NULL", (lnk_filepath,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(lnk_filepath)
+        return self._record(row)
 
-    def _get_path(self):
-        lnk_filepath, data = self._shell_link.GetPath(shell.SLGP_UNCPRIORITY)
-        return lnk_filepath
+    @staticmethod
+    def _record(row):
+        lnk_filepath, root, path, arguments, working_directory, icon_path, icon_index, mtime = row
+        return ShortcutRecord(lnk_filepath, root, path, arguments, working_directory, (icon_path, icon_index), mtime)
 
-    def _set_path(self, path):
-        self._shell_link.SetPath(path)
+    def close(self):
+        self._db.close()
 
-    path = property(_get_path, _set_path)
+    def refresh(self, workers=None):
+        """Bring the index up to date with the folders it covers, reading
+        only those .lnk files which are new or whose mtime or size has
+        changed. Returns a list of the shortcuts which were (re-)read
+        and a list of those which have disappeared.
+        """
+        on_disk = {}
+        for root in self.roots:
+            for entry in _walk_files(root, ".lnk"):
+                try:
+                    stat = entry.stat()
+                except EnvironmentError:
+                    continue
+                on_disk[entry.path] = root, stat.st_mtime, stat.st_size
+
+        indexed = dict(
+            (lnk_filepath, (mtime, size))
+            for lnk_filepath, mtime, size in self._db.execute("SELECT lnk_filepath, mtime, size FROM shortcuts")
+        )
+        removed = [lnk_filepath for lnk_filepath in indexed if lnk_filepath not in on_disk]
+        changed = [
+            (lnk_filepath, root) for lnk_filepath, (root, mtime, size) in on_disk.items()
+            if indexed.get(lnk_filepath) != (mtime, size)
+        ]
+
+        updated = []
+        for lnk_filepath, link in _parallel_map(_indexed_record, changed, workers):
+            root, mtime, size = on_disk[lnk_filepath]
+            if link is None:
+                values = (lnk_filepath, root, mtime, size, None, None, None, None, None, None)
+            else:
+                icon_path, icon_index = link.icon_location
+                values = (
+                    lnk_filepath, root, mtime, size,
+                    link.path, link.path.lower(), link.arguments, link.working_directory, icon_path, icon_index
+                )
+            self._db.execute("INSERT OR REPLACE INTO shortcuts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", values)
+            updated.append(lnk_filepath)
+        self._db.executemany("DELETE FROM shortcuts WHERE lnk_filepath = ?", [(r,) for r in removed])
+        self._db.commit()
+        return updated, removed
+
+    def shortcuts_to(self, target_filepath):
+        """Return a list of the .lnk files in the index whose target is
+        `target_filepath`, compared case-insensitively.
+        """
+        return [
+            lnk_filepath for (lnk_filepath,) in self._db.execute(
+                "SELECT lnk_filepath FROM shortcuts WHERE path_key = ? ORDER BY lnk_filepath",
+                (target_filepath.lower(),)
+            )
+        ]
 
-    def _get_show_cmd(self):
-        show_cmd = self._shell_link.GetShowCmd()
-        for k, v in self.show_states.items():
-            if v == show_cmd:
-                return k
-        else:
-            return None
+SHORTCUT_ATTRIBUTES = (
+    "path", "arguments", "description", "icon_location",
+    "hotkey", "show_cmd", "working_directory"
+)
 
-    def _set_show_cmd(self, show_cmd):
-        try:
-            show_cmd = int(show_cmd)
-        except ValueError:
-            show_cmd = self.show_states[show_cmd]
-        self._shell_link.SetShowCmd(show_cmd)
+def _link_from_spec(spec):
+    """Build a ShellLink from a dictionary of Shortcut attributes, converting
+    values such as show_cmd="max" exactly as a Shortcut would.
+    """
+    return Shortcut(backend="lnk", **dict((str(k), v) for (k, v) in spec.items()))._loaded()
 
-    show_cmd = property(_get_show_cmd, _set_show_cmd)
+def _link_attributes(link):
+    return tuple(getattr(link, attribute) for attribute in SHORTCUT_ATTRIBUTES)
 
-    def _get_working_directory(self):
-        return self._shell_link.GetWorkingDirectory()
+ShortcutSyncReport = collections.namedtuple(
+    "ShortcutSyncReport",
+    "created updated deleted unchanged"
+)
 
-    def _set_working_directory(self, working_directory):
-        self._shell_link.SetWorkingDirectory(working_directory)
+def sync_shortcuts(manifest, directory, prune=False):
+    """Bring the shortcuts in `directory` into line with `manifest`, a
+    dictionary mapping shortcut name (eg "Python.lnk") to a dictionary
+    of :class:`Shortcut` attributes, writing only what has changed.
+
+    Shortcuts which are missing are created and those whose attributes
+    differ are rewritten, in each case via a temporary file which is then
+    moved into place. Only if `prune` is true is any other .lnk file directly
+    in `directory` deleted. Shortcuts which already match are not written
+    at all. Returns a :class:`ShortcutSyncReport` listing the .lnk
+    filepaths created, updated, deleted and left unchanged.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    created, updated, deleted, unchanged = [], [], [], []
+
+    wanted = set()
+    for name, spec in sorted(manifest.items()):
+        if not name.lower().endswith(".lnk"):
+            name += ".lnk"
+        lnk_filepath = os.path.join(directory, name)
+        wanted.add(name.lower())
+        link = _link_from_spec(spec)
+
+        if os.path.exists(lnk_filepath):
+            try:
+                existing = _link_attributes(ShellLink.from_file(lnk_filepath))
+            except x_shortcut:
+                existing = None
+            if existing == _link_attributes(link):
+                unchanged.append(lnk_filepath)
+                continue
+            updated.append(lnk_filepath)
+        else:
+            created.append(lnk_filepath)
+        _write_atomically(lnk_filepath, link.to_bytes(deterministic=True))
 
-    working_directory = property(_get_working_directory, _set_working_directory)
+    if prune:
+        for entry in _scandir(directory):
+            name = entry.name.lower()
+            if name.endswith(".lnk") and name not in wanted and not entry.is_dir():
+                os.remove(entry.path)
+                deleted.append(entry.path)
 
-    def write(self, lnk_filepath=None):
-        if not lnk_filepath:
-            lnk_filepath = self.lnk_filepath
-        if lnk_filepath is None:
-            raise x_shell(errmsg="Must specify a lnk_filepath for an unsaved shortcut")
+    return ShortcutSyncReport(created, updated, sorted(deleted), unchanged)
 
-        ipersistfile = wrapped(
-            self._shell_link.QueryInterface,
-            pythoncom.IID_IPersistFile
-        ).Save(
-            lnk_filepath,
-            lnk_filepath == self.lnk_filepath
-        )
+ShortcutWriteResult = collections.namedtuple(
+    "ShortcutWriteResult",
+    "lnk_filepath action error"
+)
 
-        self.lnk_filepath = lnk_filepath
-        return self
+def _create_shortcut(spec):
+    lnk_filepath, attributes = spec
+    try:
+        data = _link_from_spec(attributes).to_bytes(deterministic=True)
+        try:
+            f = open(lnk_filepath, "rb")
+        except EnvironmentError:
+            action = "created"
+            dirpath = os.path.dirname(os.path.abspath(lnk_filepath))
+            if not os.path.isdir(dirpath):
+                try:
+                    os.makedirs(dirpath)
+                except OSError:
+                    if not os.path.isdir(dirpath):
+                        raise
+        else:
+            try:
+                existing = f.read(len(data) + 1)
+            finally:
+                f.close()
+            if existing == data:
+                return ShortcutWriteResult(lnk_filepath, "unchanged", None)
+            action = "updated"
+        _write_atomically(lnk_filepath, data)
+    except Exception:
+        return ShortcutWriteResult(lnk_filepath, "failed", sys.exc_info()[1])
+    return ShortcutWriteResult(lnk_filepath, action, None)
+
+def create_shortcuts(specs, workers=None):
+    """Create many shortcuts at once, yielding a :class:`ShortcutWriteResult`
+    for each as it's done. `specs` is a dictionary -- or an iterable of pairs --
+    mapping .lnk filepath to a dictionary of :class:`Shortcut` attributes.
+
+    The shortcuts are built and written by a pool of `workers` threads,
+    each via a temporary file which is then moved into place. A shortcut
+    whose file already holds exactly the same bytes is left alone. A
+    shortcut which can't be created is reported as "failed" along with
+    the exception raised, and the rest carry on regardless.
+    """
+    if hasattr(specs, "items"):
+        specs = specs.items()
+    for result in _parallel_map(_create_shortcut, specs, workers):
+        yield result
 
-def shortcut(source=UNSET):
+def shortcut(source=UNSET, backend="com"):
     if source is None:
         return None
     elif source is UNSET:
-        return Shortcut()
+        return Shortcut(backend=backend)
     elif isinstance(source, Shortcut):
         return source
     elif source.endswith(".lnk"):
-        return Shortcut.from_lnk(source)
+        return Shortcut.from_lnk(source, backend=backend)
     else:
-        return Shortcut.from_target(source)
+        return Shortcut.from_target(source, backend=backend)
 
 #
 # Constants for structured storage
@@ -833,6 +3191,54 @@ class ShellFolder(ShellItem):
         else:
             return self.item_factory(rpidl)
 
+#
+# Recycled files are often read from end to end -- to be hashed, copied or
+# archived -- so they're read through a buffer big enough to keep the
+# number of reads down.
+#
+RECYCLED_BUFFER_SIZE = 1024 * 1024
+
+class _IStreamIO(io.RawIOBase):
+    """Present an IStream as a read-only, seekable raw file object"""
+
+    def __init__(self, istream):
+        io.RawIOBase.__init__(self)
+        self._istream = istream
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._istream.Read(len(buffer))
+        n_bytes = len(data)
+        memoryview(buffer)[:n_bytes] = data
+        return n_bytes
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        #
+        # The STREAM_SEEK_* constants match the io.SEEK_* ones
+        #
+        return self._istream.Seek(offset, whence)
+
+    def tell(self):
+        return self.seek(0, io.SEEK_CUR)
+
+    def close(self):
+        self._istream = None
+        io.RawIOBase.close(self)
+
+def _buffered(raw, buffering):
+    """Wrap raw in a reader with a buffer of `buffering` bytes, or return
+    it as it is if buffering is 0.
+    """
+    if buffering:
+        return io.BufferedReader(raw, buffering)
+    else:
+        return raw
+
 class ShellRecycledItem(ShellItem):
 
     PID_DISPLACED_FROM = 2 # Location that file was deleted from.
@@ -842,10 +3248,13 @@ class ShellRecycledItem(ShellItem):
         return "%s recycled at %s" % (self.original_filename(), self.recycle_date())
 
     def original_filename(self):
-        return os.path.join(
-            self.detail(shell.FMTID_Displaced, self.PID_DISPLACED_FROM),
-            self.name(shellcon.SHGDN_INFOLDER)
-        )
+        return os.path.join(self.original_dirpath(), self.original_basename())
+
+    def original_dirpath(self):
+        return self.detail(shell.FMTID_Displaced, self.PID_DISPLACED_FROM)
+
+    def original_basename(self):
+        return self.name(shellcon.SHGDN_INFOLDER)
 
     def recycle_date(self):
         return datetime_from_pytime(self.detail(shell.FMTID_Displaced, self.PID_DISPLACED_DATE))
@@ -853,53 +3262,405 @@ class ShellRecycledItem(ShellItem):
     def real_filename(self):
         return self.parent._folder.GetDisplayNameOf(self.rpidl, shellcon.SHGDN_FORPARSING)
 
-    def undelete(self):
-        original_filename = self.original_filename()
-        tempdir = tempfile.mkdtemp()
+    def size(self):
+        """Return the size in bytes of the file -- or of everything in the
+        folder -- when it was deleted. This is the size recorded in the
+        item's $I file where there is one; otherwise a folder's files are
+        added up and a file's size is asked of the shell.
+        """
+        real_filename = self.real_filename()
+        dirpath, filename = os.path.split(real_filename)
+        if filename[:2].lower() == "$r":
+            try:
+                f = open(os.path.join(dirpath, "$I" + filename[2:]), "rb")
+                try:
+                    data = f.read()
+                finally:
+                    f.close()
+                return _parse_recycle_bin_info(data)[1]
+            except (x_recycle_bin, struct.error, UnicodeDecodeError, EnvironmentError):
+                pass
+        if os.path.isdir(real_filename):
+            return _tree_totals(real_filename)[1]
+        stream = self.parent._folder.BindToStorage(self.rpidl, None, pythoncom.IID_IStream)
+        return stream.Stat()[2]
+
+    def _forget(self):
+        #
+        # The shell tidies away the details of an item whose file has gone
+        #
+        pass
+
+    def undelete(self, target=None, merge=False, progress=None):
+        """Restore the item to `target` (by default, where it was deleted
+        from), returning the filepath it was restored to. If something is
+        already there, the item is renamed or, if both are folders and
+        `merge` is true, merged into it. `progress`, if given, is called
+        with the source & target of each file or folder moved.
+        """
+        return _restore_recycled_file(self.real_filename(), self.original_filename(), target, merge, progress)
+
+    def open(self, buffering=RECYCLED_BUFFER_SIZE):
+        """Return a read-only, seekable file object over the item's contents.
+        The recycled file itself is opened if it can be; otherwise its
+        contents are read through the shell.
+        """
+        try:
+            raw = io.FileIO(self.real_filename(), "rb")
+        except EnvironmentError:
+            raw = _IStreamIO(self.parent._folder.BindToStorage(self.rpidl, None, pythoncom.IID_IStream))
+        return _buffered(raw, buffering)
+
+    def contents(self, buffer_size=8192):
+        f = self.open(buffering=0)
+        try:
+            while True:
+                contents = f.read(buffer_size)
+                if contents:
+                    yield contents
+                else:
+                    break
+        finally:
+            f.close()
+
+def _merge_tree(source_dirpath, target_dirpath, progress=None):
+    """Move everything from source_dirpath into the existing folder
+    target_dirpath, leaving whatever is already there in place. Any
+    folder not already in the target is moved across whole; a file (or
+    folder) which would collide with something of the same name is
+    renamed. `progress`, if given, is called with the source & target
+    of each move as it is made.
+    """
+    for dirpath, dirnames, filenames in os.walk(source_dirpath):
+        target = os.path.join(target_dirpath, os.path.relpath(dirpath, source_dirpath))
+        for dirname in list(dirnames):
+            if os.path.isdir(os.path.join(target, dirname)):
+                continue
+            dirnames.remove(dirname)
+            _move_with_progress([(os.path.join(dirpath, dirname), _unused_filepath(target, dirname))], progress)
+        _move_with_progress(
+            ((os.path.join(dirpath, filename), _unused_filepath(target, filename)) for filename in filenames),
+            progress
+        )
+    shutil.rmtree(source_dirpath)
+
+def _move_with_progress(moves, progress):
+    #
+    # moves may be a generator, so that each target is chosen only
+    # once the moves before it have been made
+    #
+    for source, target in moves:
+        shutil.move(source, target)
+        if progress:
+            progress(source, target)
+
+def _restore_recycled_file(real_filename, original_filename, target=None, merge=False, progress=None):
+    """Move a file or folder out of a recycle bin to `target`, by default
+    its original filepath, and return the filepath it ended up at. If
+    something is already at the target, the restored item is renamed
+    or, if both are folders and `merge` is true, merged into it.
+    """
+    target = target or original_filename
+    if merge and os.path.isdir(target) and os.path.isdir(real_filename):
+        _merge_tree(real_filename, target, progress)
+        return target
+
+    #
+    # Choosing a free name here, rather than leaving it to the shell, means
+    # the item can be moved straight into place and any renaming will be
+    # based on its original name rather than on its name in the bin.
+    #
+    target = _unused_filepath(*os.path.split(target))
+    if progress and os.path.isdir(real_filename):
+        #
+        # The shell would move a folder in one go, with nothing to report
+        # until it was done, so move its files one by one instead
+        #
+        for dirpath, dirnames, filenames in os.walk(real_filename):
+            target_dirpath = os.path.normpath(os.path.join(target, os.path.relpath(dirpath, real_filename)))
+            if not os.path.isdir(target_dirpath):
+                os.makedirs(target_dirpath)
+            _move_with_progress(
+                ((os.path.join(dirpath, filename), os.path.join(target_dirpath, filename)) for filename in filenames),
+                progress
+            )
+        shutil.rmtree(real_filename)
+        return target
+
+    remapping = move_file(
+        real_filename,
+        target,
+        allow_undo=False,
+        no_confirm=True,
+        rename_on_collision=True,
+        silent=True
+    )
+    for k, v in remapping.items():
+        if k.lower() == target.lower():
+            target = v
+            break
+    if progress:
+        progress(real_filename, target)
+    return target
+
+class _RecycleBinMixin(object):
+    """Lookups common to every kind of recycle bin, relying only on
+    iterating over the bin's recycled items and on a cheap signature
+    which changes whenever the bin's contents do. Lookups go through
+    an index of the bin's items by original filepath, built in one
+    pass and rebuilt only when the signature changes.
+    """
+
+    __slots__ = ()
+
+    def _signature(self):
+        raise NotImplementedError
+
+    def _versions_index(self):
+        signature = self._signature()
+        if self._index is None or signature != self._index_signature:
+            index = {}
+            for entry in self:
+                index.setdefault(entry.original_filename().lower(), []).append((entry, entry.recycle_date()))
+            self._index, self._index_signature = index, signature
+        return self._index
+
+    def undelete(self, original_filepath, target=None, merge=False, progress=None):
+        """Restore the most recent version of a filepath, returning
+        the filepath it was restored to(as rename-on-collision will
+        apply if a file already exists at that path). cf
+        :meth:`ShellRecycledItem.undelete` for the other parameters.
+        """
+        candidates = self._versions_index().get(original_filepath.lower())
+        if not candidates:
+            raise x_not_found_in_recycle_bin("%s not found in the Recycle Bin" % original_filepath)
+        newest, _ = max(candidates, key=operator.itemgetter(1))
+        self._index = None
+        return newest.undelete(target, merge, progress)
+
+    def versions(self, original_filepath):
+        return [entry for entry, _ in self._versions_index().get(original_filepath.lower(), [])]
+
+    def query(self, name_glob=None, deleted_after=None, deleted_before=None, min_size=None, under_dir=None):
+        """Yield, as they're found, those items in the bin which meet every
+        criterion given: the original name matches `name_glob`; the item was
+        deleted at or after `deleted_after` and before `deleted_before`; the
+        item is at least `min_size` bytes; and it was deleted from `under_dir`
+        or from somewhere beneath it.
+
+        The criteria are checked from the cheapest to the most expensive to
+        find out, so an item's more costly details are only fetched once it
+        has passed the cheaper checks.
+        """
+        predicates = []
+        if name_glob is not None:
+            name_glob = name_glob.lower()
+            predicates.append(lambda entry: fnmatch.fnmatchcase(entry.original_basename().lower(), name_glob))
+        if under_dir is not None:
+            under_dir = ntpath.join(ntpath.normcase(under_dir), "")
+            predicates.append(lambda entry: ntpath.join(ntpath.normcase(entry.original_dirpath()), "").startswith(under_dir))
+        if deleted_after is not None or deleted_before is not None:
+            def deleted_between(entry):
+                recycle_date = entry.recycle_date()
+                if deleted_after is not None and recycle_date < deleted_after:
+                    return False
+                if deleted_before is not None and recycle_date >= deleted_before:
+                    return False
+                return True
+            predicates.append(deleted_between)
+        if min_size is not None:
+            predicates.append(lambda entry: entry.size() >= min_size)
+
+        for entry in self:
+            for predicate in predicates:
+                if not predicate(entry):
+                    break
+            else:
+                yield entry
+
+    def _watched_roots(self):
+        raise NotImplementedError
+
+    def stats(self, max_age=5.0):
+        """Return a :class:`RecycleBinStats` giving the number and total size
+        of the items in the bin, broken down by volume and by user, and how
+        long ago they were deleted. The figures are kept from one call to the
+        next and brought up to date, by reading only those $I files which have
+        appeared since, if they're more than `max_age` seconds old.
+        """
+        if self._tally is None:
+            self._tally = _RecycleBinTally(self._watched_roots())
+        if self._tally.refreshed_at is None or time.time() - self._tally.refreshed_at > max_age:
+            self._tally.refresh()
+        return self._tally.stats()
+
+    def _delete_items(self, items):
+        """Permanently delete each of items, and the bin's record of it"""
+        for item in items:
+            if os.path.isdir(item.real_filename()):
+                shutil.rmtree(item.real_filename())
+            else:
+                os.remove(item.real_filename())
+            item._forget()
+
+    def purge(self, older_than=None, max_total_bytes=None, per_volume_budget=None, dry_run=False):
+        """Permanently delete the items in the bin which fall outside a
+        retention policy, returning a :class:`RecycleBinPurge` of the items
+        deleted, oldest first, and the number of bytes reclaimed. With
+        `dry_run`, nothing is deleted and the result is what would have been.
+
+        Items deleted longer ago than `older_than` (a timedelta, or a datetime
+        before which everything goes) are purged; then the oldest items on each
+        volume until that volume's items take up no more than `per_volume_budget`
+        bytes; and then the oldest items overall until they take up no more than
+        `max_total_bytes`.
+        """
+        if isinstance(older_than, datetime.timedelta):
+            older_than = datetime.datetime.now() - older_than
+
+        evicted = []
+        by_volume = {}
+        for n, entry in enumerate(self):
+            recycle_date = entry.recycle_date()
+            candidate = recycle_date, n, entry.size(), entry
+            if older_than is not None and recycle_date < older_than:
+                evicted.append(candidate)
+            else:
+                volume = ntpath.splitdrive(entry.real_filename())[0].lower()
+                by_volume.setdefault(volume, []).append(candidate)
+
+        kept = []
+        for candidates in by_volume.values():
+            heapq.heapify(candidates)
+            if per_volume_budget is not None:
+                n_bytes = sum(size for _, _, size, _ in candidates)
+                while n_bytes > per_volume_budget:
+                    candidate = heapq.heappop(candidates)
+                    evicted.append(candidate)
+                    n_bytes -= candidate[2]
+            kept.extend(candidates)
+
+        if max_total_bytes is not None:
+            heapq.heapify(kept)
+            n_bytes = sum(size for _, _, size, _ in kept)
+            while n_bytes > max_total_bytes:
+                candidate = heapq.heappop(kept)
+                evicted.append(candidate)
+                n_bytes -= candidate[2]
+
+        evicted.sort()
+        items = [entry for _, _, _, entry in evicted]
+        if not dry_run:
+            for chunk in _chunked(items, 256):
+                self._delete_items(chunk)
+            self._index = None
+        return RecycleBinPurge(items, sum(size for _, _, size, _ in evicted))
+
+    def watch(self, timeout=None, poll_interval=1.0):
+        """Return an iterator of :class:`RecycleBinEvent` objects, one for each
+        item recycled ("added") or restored or purged ("removed") from now on.
+        The bins' $I files are read once, straightaway, and after that only
+        those which are new are read, so each change costs very little however
+        big the bins are. The iterator stops once `timeout` seconds have passed
+        without a change or, if `timeout` is None, carries on indefinitely.
+        """
+        roots = self._watched_roots()
+        snapshots = dict((root, {}) for root in roots)
+        for root in roots:
+            _refresh_snapshot(root, snapshots[root])
+        return self._watch(snapshots, timeout, poll_interval)
+
+    def _watch(self, snapshots, timeout, poll_interval):
+        changes = _RecycleBinChanges(list(snapshots), poll_interval)
         try:
-            temp_filepath = os.path.join(tempdir, os.path.basename(original_filename))
+            last_changed = time.time()
+            while True:
+                if timeout is None:
+                    remaining = None
+                else:
+                    remaining = timeout - (time.time() - last_changed)
+                    if remaining <= 0:
+                        break
+                for root in changes.wait(remaining):
+                    added, removed = _refresh_snapshot(root, snapshots[root])
+                    if added or removed:
+                        last_changed = time.time()
+                    for item in removed:
+                        yield RecycleBinEvent("removed", item)
+                    for item in added:
+                        yield RecycleBinEvent("added", item)
+        finally:
+            changes.close()
+
+    def undelete_many(self, sources):
+        """Restore a number of recycled items, each given either as a
+        :class:`ShellRecycledItem` (or similar) or as an original filepath
+        whose most recent version is meant, returning a dictionary mapping
+        each source to the filepath it was restored to.
+
+        The items are moved back with one shell operation per original
+        folder. Each is given a name which collides neither with what's
+        already in its folder nor with anything else restored there, along
+        the lines of the shell's own rename-on-collision. A source which
+        comes to the same item as one before it is mapped to wherever that
+        item was restored to.
+        """
+        restores = []
+        real_filenames = {}
+        duplicates = []
+        for source in sources:
+            if isinstance(source, basestring):
+                candidates = self._versions_index().get(source.lower())
+                if not candidates:
+                    raise x_not_found_in_recycle_bin("%s not found in the Recycle Bin" % source)
+                entry, _ = max(candidates, key=operator.itemgetter(1))
+            else:
+                entry = source
+            real_filename = entry.real_filename()
+            if real_filename.lower() in real_filenames:
+                duplicates.append((source, real_filenames[real_filename.lower()]))
+            else:
+                real_filenames[real_filename.lower()] = source
+                restores.append((source, entry, real_filename, entry.original_filename()))
+
+        by_dirpath = collections.OrderedDict()
+        for restore in restores:
+            by_dirpath.setdefault(os.path.dirname(restore[3]).lower(), []).append(restore)
+
+        restored = {}
+        for group in by_dirpath.values():
+            dirpath = os.path.dirname(group[0][3])
+            try:
+                taken = set(name.lower() for name in os.listdir(dirpath))
+            except EnvironmentError:
+                taken = set()
+            target_filepaths = [
+                _unused_filepath(dirpath, os.path.basename(original_filename), taken)
+                for _, _, _, original_filename in group
+            ]
             #
-            # Move the undelete file into a working directory, ensuring that
-            # the original filename is retained, regardless of the temporary
-            # filename used in the Recycle Bin. Then move that file into the
-            # original directory, allowing rename on collision. This ensures
-            # that the final, possiby renamed, filename will be related to
-            # the original name and not to the temporary recycled name.
+            # Anything which appears in the folder between its being listed
+            # and the move will still be renamed around, rather than overwritten.
             #
-            move_file(
-                self.real_filename(),
-                temp_filepath,
-                allow_undo=False,
-                no_confirm=True,
-                rename_on_collision=True,
-                silent=True
-            )
             remapping = move_file(
-                temp_filepath,
-                original_filename,
+                [real_filename for _, _, real_filename, _ in group],
+                target_filepaths,
                 allow_undo=False,
                 no_confirm=True,
                 rename_on_collision=True,
-                silent=False
+                silent=True
             )
-            for k, v in remapping.items():
-                if k.lower() == original_filename.lower():
-                    return v
-            else:
-                return original_filename
-        finally:
-            delete_file(tempdir, allow_undo=False, no_confirm=True, silent=True)
+            remapping = dict((k.lower(), v) for k, v in remapping.items())
+            for (source, entry, _, _), target_filepath in zip(group, target_filepaths):
+                entry._forget()
+                restored[source] = remapping.get(target_filepath.lower(), target_filepath)
+        for source, first_source in duplicates:
+            restored[source] = restored[first_source]
 
-    def contents(self, buffer_size=8192):
-        istream = self.parent._folder.BindToStorage(self.rpidl, None, pythoncom.IID_IStream)
-        while True:
-            contents = istream.Read(buffer_size)
-            if contents:
-                yield contents
-            else:
-                break
+        self._index = None
+        return restored
 
-class ShellRecycleBin(ShellFolder):
+class ShellRecycleBin(_RecycleBinMixin, ShellFolder):
     """Wrap the shell object which represents the union of all the
     recycle bins on this system.
     """
@@ -910,6 +3671,15 @@ class ShellRecycleBin(ShellFolder):
             ShellDesktop(),
             shell.SHGetSpecialFolderLocation(0, shellcon.CSIDL_BITBUCKET)
         )
+        self._index = None
+        self._index_signature = None
+        self._tally = None
+
+    def _signature(self):
+        return shell.SHQueryRecycleBin(None)
+
+    def _watched_roots(self):
+        return _fixed_drives()
 
     def __len__(self):
         _, n_items = shell.SHQueryRecycleBin(None)
@@ -923,6 +3693,23 @@ class ShellRecycleBin(ShellFolder):
         return ShellRecycledItem(self, rpidl)
     folder_factory = item_factory
 
+    def _delete_items(self, items):
+        #
+        # Delete the items' recycled files, with the $I files which go with
+        # them, in one shell operation
+        #
+        filepaths = []
+        for item in items:
+            real_filename = item.real_filename()
+            filepaths.append(real_filename)
+            dirpath, filename = os.path.split(real_filename)
+            if filename[:2].lower() == "$r":
+                info_filepath = os.path.join(dirpath, "$I" + filename[2:])
+                if os.path.exists(info_filepath):
+                    filepaths.append(info_filepath)
+        if filepaths:
+            delete_file(filepaths, allow_undo=False, no_confirm=True, silent=True)
+
     @staticmethod
     def empty(confirm=True, show_progress=True, sound=True):
         flags = 0
@@ -934,29 +3721,550 @@ class ShellRecycleBin(ShellFolder):
             flags |= shellcon.SHERB_NOSOUND
         shell.SHEmptyRecycleBin(None, None, flags)
 
-    def undelete(self, original_filepath):
-        """Restore the most recent version of a filepath, returning
-        the filepath it was restored to(as rename-on-collision will
-        apply if a file already exists at that path).
+#
+# Each recycle bin folder -- $Recycle.Bin\<SID> on Vista and later,
+# RECYCLER\<SID> on 2000/XP and RECYCLED on 9x -- can be read directly
+# without going through the shell at all. From Vista, each deleted file
+# is renamed to $R<random><ext> and alongside it is written a $I<random><ext>
+# file holding its original path, size and deletion time; earlier versions
+# rename it to D<drive><n><ext> and keep a record for it in a single INFO2 file.
+#
+RECYCLE_BIN_FOLDERS = ("$Recycle.Bin", "RECYCLER", "RECYCLED")
+
+_RECYCLE_BIN_INFO = struct.Struct("<QQQ")
+_INFO2_HEADER = struct.Struct("<IIIII")
+_INFO2_RECORD = struct.Struct("<260sIIQI")
+
+def _fixed_drives():
+    """Return the root of each fixed drive on this system, eg "C:\\" """
+    return [
+        drive for drive in win32api.GetLogicalDriveStrings().split("\0")
+        if drive and win32file.GetDriveType(drive) == win32con.DRIVE_FIXED
+    ]
+
+def _recycle_bin_folders(root):
+    """Yield each folder beneath root -- a volume, a recycle bin or one
+    user's part of a recycle bin -- which holds $I files or an INFO2 file.
+    Folders which can't be listed, typically those belonging to other
+    users, are passed over.
+    """
+    bin_names = set(name.lower() for name in RECYCLE_BIN_FOLDERS)
+    dirpaths = [root]
+    while dirpaths:
+        dirpath = dirpaths.pop()
+        in_bin = os.path.basename(os.path.normpath(dirpath)).lower() in bin_names
+        holds_items = False
+        try:
+            for entry in _scandir(dirpath):
+                name = entry.name.lower()
+                if name.startswith("$i") or name == "info2":
+                    holds_items = True
+                elif (in_bin or name in bin_names) and entry.is_dir():
+                    dirpaths.append(entry.path)
+        except EnvironmentError:
+            continue
+        if holds_items:
+            yield dirpath
+
+def _parse_recycle_bin_info(data):
+    """Return the (original filepath, size, deletion FILETIME) held in the
+    contents of a $I file: version 1 (Vista to 8) has a fixed, 260-character
+    path; version 2 (10 onwards) has a counted one.
+    """
+    version, size, filetime = _RECYCLE_BIN_INFO.unpack_from(data, 0)
+    if version == 1:
+        path = data[_RECYCLE_BIN_INFO.size:_RECYCLE_BIN_INFO.size + 520]
+    elif version == 2:
+        n_chars, = struct.unpack_from("<I", data, _RECYCLE_BIN_INFO.size)
+        path = data[_RECYCLE_BIN_INFO.size + 4:_RECYCLE_BIN_INFO.size + 4 + 2 * n_chars]
+    else:
+        raise x_recycle_bin("Unknown $I file version %d" % version)
+    return bytes(path).decode("utf-16-le").split("\0", 1)[0], size, filetime
+
+def _parse_info2(data):
+    """Yield (offset, original filepath, size, deletion FILETIME, recycled
+    name) for each live record in the contents of an INFO2 file. Version 5
+    (2000/XP) records follow their ANSI path with a unicode one; version 4
+    (9x) records have only the ANSI path. A record whose path has been
+    blanked out belongs to a file which has since been restored or purged.
+    """
+    version, _, _, record_size, _ = _INFO2_HEADER.unpack_from(data, 0)
+    if record_size < _INFO2_RECORD.size:
+        raise x_recycle_bin("Unknown INFO2 record size %d" % record_size)
+    for offset in range(_INFO2_HEADER.size, len(data) - record_size + 1, record_size):
+        ansi_path, index, drive, filetime, size = _INFO2_RECORD.unpack_from(data, offset)
+        if not ansi_path[:1].strip(b"\0"):
+            continue
+        if record_size >= _INFO2_RECORD.size + 520:
+            unicode_path = data[offset + _INFO2_RECORD.size:offset + _INFO2_RECORD.size + 520]
+            try:
+                path = bytes(unicode_path).decode("utf-16-le").split("\0", 1)[0]
+            except UnicodeDecodeError:
+                continue
+        else:
+            path = ansi_path.split(b"\0", 1)[0].decode(_ansi_encoding, "replace")
+        recycled_name = "D%s%d%s" % (chr(ord("a") + drive), index, ntpath.splitext(path)[1])
+        yield offset, path, size, filetime, recycled_name
+
+class OfflineRecycledItem(WinshellObject):
+    """One version of a file held in a recycle bin folder which has been
+    read directly from its $I file or INFO2 record. It offers the same
+    methods as :class:`ShellRecycledItem`.
+    """
+
+    __slots__ = ("_original_filename", "_size", "_filetime", "_real_filename", "_info_filepath", "_info_offset")
+
+    def __init__(self, original_filename, size, filetime, real_filename, info_filepath, info_offset=None):
+        self._original_filename = original_filename
+        self._size = size
+        self._filetime = filetime
+        self._real_filename = real_filename
+        self._info_filepath = info_filepath
+        self._info_offset = info_offset
+
+    def as_string(self):
+        return "%s recycled at %s" % (self.original_filename(), self.recycle_date())
+
+    def original_filename(self):
+        return self._original_filename
+
+    def original_dirpath(self):
+        return ntpath.dirname(self._original_filename)
+
+    def original_basename(self):
+        return ntpath.basename(self._original_filename)
+
+    def recycle_date(self):
+        return _datetime_from_filetime(self._filetime)
+
+    def real_filename(self):
+        return self._real_filename
+
+    def size(self):
+        """Return the size in bytes of the file when it was deleted"""
+        return self._size
+
+    def _forget(self):
+        """Remove the bin's record of this item once it has been restored"""
+        if self._info_offset is None:
+            os.remove(self._info_filepath)
+        else:
+            f = open(self._info_filepath, "r+b")
+            try:
+                f.seek(self._info_offset)
+                f.write(b"\0")
+            finally:
+                f.close()
+
+    def undelete(self, target=None, merge=False, progress=None):
+        restored_filename = _restore_recycled_file(self._real_filename, self._original_filename, target, merge, progress)
+        self._forget()
+        return restored_filename
+
+    def open(self, buffering=RECYCLED_BUFFER_SIZE):
+        """Return a read-only, seekable file object over the item's contents"""
+        return _buffered(io.FileIO(self._real_filename, "rb"), buffering)
+
+    def contents(self, buffer_size=8192):
+        f = self.open(buffering=0)
+        try:
+            while True:
+                contents = f.read(buffer_size)
+                if contents:
+                    yield contents
+                else:
+                    break
+        finally:
+            f.close()
+
+def _offline_recycled_items(dirpath, known=None):
+    """Yield a (key, :class:`OfflineRecycledItem`) pair for each deleted file
+    whose details are held in the recycle bin folder dirpath. $I files and
+    INFO2 records which can't be read, or whose $R file has gone, are
+    passed over. Items already
+    in `known`, a mapping of key to item from an earlier pass, are used as
+    they are rather than being read again.
+    """
+    known = known or {}
+    entries = dict((entry.name.lower(), entry) for entry in _scandir(dirpath))
+    for name, entry in entries.items():
+        if name.startswith("$i"):
+            if "$r" + name[2:] not in entries:
+                continue
+            if name in known:
+                yield name, known[name]
+                continue
+            try:
+                f = open(entry.path, "rb")
+                try:
+                    data = f.read()
+                finally:
+                    f.close()
+                original_filename, size, filetime = _parse_recycle_bin_info(data)
+            except (x_recycle_bin, struct.error, UnicodeDecodeError, EnvironmentError):
+                continue
+            real_filename = os.path.join(dirpath, entries["$r" + name[2:]].name)
+            yield name, OfflineRecycledItem(original_filename, size, filetime, real_filename, entry.path)
+
+        elif name == "info2":
+            try:
+                f = open(entry.path, "rb")
+                try:
+                    data = f.read()
+                finally:
+                    f.close()
+                records = list(_parse_info2(data))
+            except (x_recycle_bin, struct.error, EnvironmentError):
+                continue
+            for offset, original_filename, size, filetime, recycled_name in records:
+                if recycled_name.lower() in entries:
+                    key = recycled_name.lower(), filetime
+                    if key in known:
+                        yield key, known[key]
+                    else:
+                        real_filename = os.path.join(dirpath, entries[recycled_name.lower()].name)
+                        yield key, OfflineRecycledItem(original_filename, size, filetime, real_filename, entry.path, offset)
+
+RecycleBinEvent = collections.namedtuple("RecycleBinEvent", "action item")
+RecycleBinPurge = collections.namedtuple("RecycleBinPurge", "items n_bytes")
+
+def _refresh_snapshot(root, snapshot):
+    """Bring snapshot, a mapping of each recycle bin folder beneath root to
+    the items in it, up to date and return the lists of items added and
+    removed since it was last refreshed. Only new $I files are read.
+    """
+    added, removed = [], []
+    dirpaths = set()
+    for dirpath in _recycle_bin_folders(root):
+        dirpaths.add(dirpath)
+        known = snapshot.get(dirpath, {})
+        try:
+            current = dict(_offline_recycled_items(dirpath, known))
+        except EnvironmentError:
+            current = {}
+        added.extend(item for key, item in current.items() if key not in known)
+        removed.extend(item for key, item in known.items() if key not in current)
+        snapshot[dirpath] = current
+    for dirpath in set(snapshot) - dirpaths:
+        removed.extend(snapshot.pop(dirpath).values())
+    return added, removed
+
+RecycleBinStats = collections.namedtuple("RecycleBinStats", "n_items n_bytes by_volume by_user ages")
+
+#
+# The upper bounds of the deletion ages counted in RecycleBinStats.ages;
+# the last count is of everything older than the last bound.
+#
+RECYCLE_AGE_BOUNDS = (
+    datetime.timedelta(hours=1),
+    datetime.timedelta(days=1),
+    datetime.timedelta(days=7),
+    datetime.timedelta(days=30),
+    datetime.timedelta(days=90),
+    datetime.timedelta(days=365),
+)
+
+class _RecycleBinTally(object):
+    """Running totals of the items in the recycle bins beneath a number
+    of roots by volume (ie root) and by user (ie SID folder), adjusted for
+    each item added or removed as the bins' snapshots are refreshed. The
+    items' deletion times are kept in order so that they can be counted
+    by age without going through them all.
+    """
+
+    def __init__(self, roots):
+        self.snapshots = dict((root, {}) for root in roots)
+        self.by_volume = dict((root, [0, 0]) for root in roots)
+        self.by_user = {}
+        self.filetimes = []
+        self.refreshed_at = None
+
+    def refresh(self):
+        for root, snapshot in self.snapshots.items():
+            added, removed = _refresh_snapshot(root, snapshot)
+            for item in removed:
+                self._count(root, item, -1)
+            for item in added:
+                self._count(root, item, 1)
+        self.refreshed_at = time.time()
+
+    def _count(self, root, item, sign):
+        user = os.path.basename(os.path.dirname(item._info_filepath))
+        for counts in self.by_volume[root], self.by_user.setdefault(user, [0, 0]):
+            counts[0] += sign
+            counts[1] += sign * item.size()
+        if sign > 0:
+            bisect.insort(self.filetimes, item._filetime)
+        else:
+            del self.filetimes[bisect.bisect_left(self.filetimes, item._filetime)]
+
+    def stats(self):
+        now = int(time.time() * 10000000) + _FILETIME_UNIX_EPOCH
+        ages = []
+        newer = len(self.filetimes)
+        for bound in RECYCLE_AGE_BOUNDS:
+            cutoff = now - (bound.days * 86400 + bound.seconds) * 10000000
+            older = bisect.bisect_left(self.filetimes, cutoff)
+            ages.append((bound, newer - older))
+            newer = older
+        ages.append((None, newer))
+        return RecycleBinStats(
+            len(self.filetimes),
+            sum(n_bytes for _, n_bytes in self.by_volume.values()),
+            dict((root, tuple(counts)) for root, counts in self.by_volume.items()),
+            dict((user, tuple(counts)) for user, counts in self.by_user.items() if counts[0]),
+            ages
+        )
+
+class _RecycleBinChanges(object):
+    """Wait for something to change in the recycle bins beneath any of a
+    number of roots: on Windows, by way of a change notification on each
+    root's recycle bin folders; elsewhere, by looking every `poll_interval`
+    seconds.
+    """
+
+    def __init__(self, roots, poll_interval):
+        self.roots = roots
+        self.poll_interval = poll_interval
+        self.handles = {}
+        if sys.platform == "win32":
+            for root in roots:
+                dirpaths = [os.path.join(root, name) for name in RECYCLE_BIN_FOLDERS]
+                dirpaths = [dirpath for dirpath in dirpaths if os.path.isdir(dirpath)] or [root]
+                for dirpath in dirpaths:
+                    handle = win32file.FindFirstChangeNotification(
+                        dirpath, True,
+                        win32con.FILE_NOTIFY_CHANGE_FILE_NAME | win32con.FILE_NOTIFY_CHANGE_DIR_NAME
+                    )
+                    self.handles[handle] = root
+
+    def wait(self, seconds):
+        """Return those roots which may have changed in the next `seconds`
+        seconds (or for as long as it takes if `seconds` is None), returning
+        as soon as any has.
         """
-        candidates = self.versions(original_filepath)
-        if not candidates:
-            raise x_not_found_in_recycle_bin("%s not found in the Recycle Bin" % original_filepath)
+        if not self.handles:
+            if seconds is not None and seconds < self.poll_interval:
+                time.sleep(seconds)
+            else:
+                time.sleep(self.poll_interval)
+            return self.roots
+
+        handles = list(self.handles)
+        milliseconds = win32event.INFINITE if seconds is None else int(1000 * seconds)
+        result = win32event.WaitForMultipleObjects(handles, False, milliseconds)
+        if result == win32event.WAIT_TIMEOUT:
+            return []
+        handle = handles[result - win32event.WAIT_OBJECT_0]
+        win32file.FindNextChangeNotification(handle)
         #
-        # NB Can't use max(key=...) until Python 2.6+
+        # Files are recycled and restored in pairs, so give the second
+        # file of the pair a moment to follow the first
         #
-        newest = sorted(candidates, key=lambda entry: entry.recycle_date())[-1]
-        return newest.undelete()
+        time.sleep(0.1)
+        return [self.handles[handle]]
 
-    def versions(self, original_filepath):
-        original_filepath = original_filepath.lower()
-        return [entry for entry in self if entry.original_filename().lower() == original_filepath]
+    def close(self):
+        for handle in self.handles:
+            win32file.FindCloseChangeNotification(handle)
+        self.handles.clear()
+
+class OfflineRecycleBin(_RecycleBinMixin, WinshellObject):
+    """The recycle bins beneath a given root -- a volume, a mounted image
+    of one, a recycle bin folder or one user's part of it -- read directly
+    from their $I and INFO2 files rather than through the shell. This is
+    very much quicker for large bins and works where the shell can't reach,
+    but sees only those parts of the bins which the caller can list.
+    """
+
+    __slots__ = ("root", "_index", "_index_signature", "_tally")
+
+    def __init__(self, root):
+        self.root = root
+        self._index = None
+        self._index_signature = None
+        self._tally = None
+
+    def _signature(self):
+        """Every $I & INFO2 file changes or goes when an item is recycled,
+        restored or purged, so their names and mtimes serve to tell when
+        the bins' contents have changed.
+        """
+        signature = []
+        for dirpath in _recycle_bin_folders(self.root):
+            for entry in _scandir(dirpath):
+                name = entry.name.lower()
+                if name.startswith("$i") or name == "info2":
+                    stat = entry.stat()
+                    signature.append((entry.path, stat.st_mtime, stat.st_size))
+        return sorted(signature)
+
+    def _watched_roots(self):
+        return [self.root]
+
+    def as_string(self):
+        return "Recycle Bin at %s" % self.root
+
+    def __iter__(self):
+        for dirpath in _recycle_bin_folders(self.root):
+            for _, item in _offline_recycled_items(dirpath):
+                yield item
 
-def recycle_bin():
+    def __len__(self):
+        return sum(1 for item in self)
+
+    def get_size(self):
+        return sum(item.size() for item in self)
+
+    def empty(self):
+        """Permanently delete everything in these recycle bins"""
+        self._delete_items(list(self))
+        self._index = None
+
+class _ScanFailed(object):
+
+    def __init__(self, exception):
+        self.exception = exception
+
+_SCAN_FINISHED = object()
+
+class ParallelRecycleBin(_RecycleBinMixin, WinshellObject):
+    """The union of the recycle bins on a number of volumes -- by default,
+    every fixed drive -- each of which is read directly, as for
+    :class:`OfflineRecycleBin`, by its own thread. Items are yielded as
+    soon as any volume produces them so one slow volume doesn't hold up
+    the others, and a volume which hasn't finished within `timeout`
+    seconds is given up on. After each pass over the bin, `counts` holds
+    the number of items found on each volume, `errors` any exception which
+    stopped a volume from being read, and `timed_out` those volumes which
+    were given up on.
+    """
+
+    __slots__ = ("roots", "timeout", "counts", "errors", "timed_out", "_index", "_index_signature", "_tally")
+
+    def __init__(self, roots=None, timeout=None):
+        self.roots = roots
+        self.timeout = timeout
+        self.counts = {}
+        self.errors = {}
+        self.timed_out = set()
+        self._index = None
+        self._index_signature = None
+        self._tally = None
+
+    def as_string(self):
+        return "Recycle Bins on %s" % ", ".join(self._watched_roots())
+
+    def _watched_roots(self):
+        if self.roots is None:
+            return _fixed_drives()
+        else:
+            return list(self.roots)
+
+    def _signature(self):
+        #
+        # The shell can only report on a volume's bin as a whole, so any root
+        # which is somewhere below a volume's root is signed by its $I & INFO2
+        # files instead, as for an OfflineRecycleBin
+        #
+        signature = []
+        for root in self._watched_roots():
+            if _is_volume_root(root):
+                signature.append(shell.SHQueryRecycleBin(root))
+            else:
+                signature.append(OfflineRecycleBin(root)._signature())
+        return signature
+
+    def __iter__(self):
+        roots = self._watched_roots()
+        results = queue.Queue()
+        stopped = threading.Event()
+        #
+        # Each volume has `timeout` seconds from the start of its own scan.
+        # The scanning threads never wait for the consumer, so the time taken
+        # over the items already yielded doesn't count against a volume: it's
+        # given up on only if its thread is still scanning at its deadline.
+        #
+        started_at = {}
+        finished = set()
+
+        def scan(root):
+            try:
+                for item in OfflineRecycleBin(root):
+                    if stopped.is_set() or root in self.timed_out:
+                        break
+                    results.put((root, item))
+            except Exception:
+                results.put((root, _ScanFailed(sys.exc_info()[1])))
+            finished.add(root)
+            results.put((root, _SCAN_FINISHED))
+
+        self.counts = dict((root, 0) for root in roots)
+        self.errors = {}
+        self.timed_out = set()
+        for root in roots:
+            thread = threading.Thread(target=scan, args=(root,))
+            thread.daemon = True
+            started_at[root] = time.time()
+            thread.start()
+
+        unfinished = set(roots)
+        try:
+            while unfinished:
+                scanning = [root for root in unfinished if root not in finished]
+                if self.timeout is None or not scanning:
+                    remaining = None
+                else:
+                    now = time.time()
+                    overdue = set(root for root in scanning if now - started_at[root] >= self.timeout)
+                    if overdue:
+                        self.timed_out.update(overdue)
+                        unfinished.difference_update(overdue)
+                        continue
+                    remaining = min(started_at[root] for root in scanning) + self.timeout - now
+                try:
+                    root, result = results.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if result is _SCAN_FINISHED:
+                    unfinished.discard(root)
+                elif isinstance(result, _ScanFailed):
+                    self.errors[root] = result.exception
+                elif root in unfinished:
+                    self.counts[root] += 1
+                    yield result
+        finally:
+            stopped.set()
+
+    def __len__(self):
+        return sum(1 for item in self)
+
+    def get_size(self):
+        return sum(item.size() for item in self)
+
+def _is_volume_root(root):
+    """Return whether root is the root of a volume, eg "C:\\" or "\\\\server\\share\\" """
+    drive, path = os.path.splitdrive(root)
+    return bool(drive) and path in ("", "\\", "/")
+
+def _drive_root(drive):
+    """Return the root of a drive given as "D", "D:" or "D:\\" """
+    return drive.rstrip("\\/").rstrip(":") + ":\\"
+
+def recycle_bin(root=None, drive=None):
     """Return an object representing all the recycle bins on the
-    system.
+    system or, if `root` is given, one which reads directly the
+    recycle bins beneath that root. If `drive` is given instead,
+    the bin is that of the drive's root.
     """
-    return ShellRecycleBin()
+    if drive is not None:
+        if root is not None:
+            raise x_recycle_bin("Specify a root or a drive, not both")
+        root = _drive_root(drive)
+    if root is None:
+        return ShellRecycleBin()
+    else:
+        return OfflineRecycleBin(root)
 
 def undelete(filepath):
     return recycle_bin().undelete(filepath)